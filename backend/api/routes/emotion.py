@@ -23,6 +23,9 @@ def resolve_path(file_path: str):
     return Path(p).as_posix()
 
 from emotion_detection_module import EmotionAnalyzer
+from analysis_proxy import AnalysisProxy
+# Cheap to build: the recognizer is acquired from the shared model registry
+# on the first analysis
 analyzer = EmotionAnalyzer()
 
 @router.get("/emotion")
@@ -44,7 +47,9 @@ async def analyze_emotion(file_path: str = Query(None), path_form: str = Form(No
 
         print(f"API: Analyzing Emotion for {physical_path}")
         
-        frame_data = analyzer.process_video(physical_path, output_path=output_path, verbose=False)
+        proxy = AnalysisProxy.for_video(physical_path)
+        frame_data = analyzer.process_video(proxy.video_path if proxy else physical_path,
+                                            output_path=output_path, verbose=False)
         summary = analyzer.get_summary(frame_data)
         
         return {
@@ -54,7 +59,7 @@ async def analyze_emotion(file_path: str = Query(None), path_form: str = Form(No
             "timestamp": datetime.now().isoformat(),
             "video_url": f"/data/results/{output_filename}",
             "summary": summary,
-            "frames": frame_data  # This gives you the frame-by-frame data for graphs
+            "frames": frame_data.to_records()  # This gives you the frame-by-frame data for graphs
         }
     except Exception as e:
         return {"success": False, "message": str(e)}
@@ -4,8 +4,8 @@ import sys
 import uuid
 from pathlib import Path
 from datetime import datetime
+import threading
 import traceback
-import cv2
 
 # Setup paths
 BASE_DIR = Path(__file__).resolve().parent.parent.parent # Points to 'backend'
@@ -18,6 +18,7 @@ router = APIRouter(prefix="/analyze", tags=["Forensics - Vision"])
 # Persistence paths
 DATA_DIR = Path.home() / ".deceptron"
 RESULTS_DIR = DATA_DIR / "results"
+SESSIONS_DIR = DATA_DIR / "sessions"
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 
 import urllib.parse
@@ -27,8 +28,15 @@ from lip_jaw_module import LipJawAnalyzer
 from asymmetry_module import AsymmetryAnalyzer
 from hand_face_touch_module import HandFaceTouchAnalyzer
 from emotion_detection_module import EmotionAnalyzer
+from frame_source import FrameSource
+from analysis_proxy import AnalysisProxy
+from session_store import SessionStore
+from overlay_renderer import render_overlays
+from frame_workers import AnalyzerProcessPool
+from frame_sampling import parse_sampling, make_policy
 
-# Pre-load analyzers once at startup
+# Analyzers built once at startup (the emotion recognizer itself is acquired
+# from the shared model registry on first use)
 eye_analyzer = EyeGazeAnalyzer()
 pose_analyzer = HeadPoseAnalyzer()
 lip_analyzer = LipJawAnalyzer()
@@ -36,6 +44,18 @@ asym_analyzer = AsymmetryAnalyzer()
 touch_analyzer = HandFaceTouchAnalyzer()
 emotion_analyzer = EmotionAnalyzer()
 
+# Cached module name -> (analyzer that draws its overlay, video filename prefix).
+# 'hand_face' is the pipeline's name for the touch module.
+RENDER_MODULES = {
+    "eye_gaze": (eye_analyzer, "gaze"),
+    "head_pose": (pose_analyzer, "pose"),
+    "lip_jaw": (lip_analyzer, "lipjaw"),
+    "asymmetry": (asym_analyzer, "asym"),
+    "hand_touch": (touch_analyzer, "touch"),
+    "hand_face": (touch_analyzer, "touch"),
+    "emotion": (emotion_analyzer, "emotion"),
+}
+
 def resolve_path(file_path: str):
     if not file_path: return ""
     if file_path.startswith("/data/"):
@@ -46,98 +66,165 @@ def resolve_path(file_path: str):
     p = urllib.parse.unquote(p.strip('"').strip("'"))
     return Path(p).as_posix()
 
-def run_analysis(analyzer, file_path, prefix, orig_name, u_id):
+def video_url(video):
+    return f"/data/results/{video}" if video else None
+
+# "process" runs each analyzer in a warm worker process (see frame_workers.py)
+FACE_BACKEND = os.environ.get("DECEPTRON_FACE_BACKEND", "thread")
+# Per-module frame sampling (see frame_sampling.py), e.g. "emotion=3"
+FACE_SAMPLING = parse_sampling(os.environ.get("DECEPTRON_FACE_SAMPLING", ""))
+_face_pool = None
+_face_pool_lock = threading.Lock()
+
+def face_pool():
+    """Worker pool shared by all face routes, started on first use."""
+    global _face_pool
+    with _face_pool_lock:
+        if _face_pool is None:
+            _face_pool = AnalyzerProcessPool(dict(FULL_MODULES))
+        return _face_pool
+
+def analyze_session(file_path, modules, u_id):
+    """Run {key: analyzer} over one decode (no video encoding) and save the session cache."""
+    # Decode the cached analysis proxy of the upload when one can be made
+    proxy = AnalysisProxy.for_video(file_path)
+    source = FrameSource(proxy.video_path if proxy else file_path)
+    if FACE_BACKEND == "process":
+        pool = face_pool()
+        for key, analyzer in modules.items():
+            source.register(key, pool.proxy(analyzer), sampling=make_policy(FACE_SAMPLING, key))
+        # The workers and their frame ring serve one run at a time
+        with pool.run_lock:
+            raw = source.run(verbose=False)
+    else:
+        for key, analyzer in modules.items():
+            source.register(key, analyzer, sampling=make_policy(FACE_SAMPLING, key))
+        raw = source.run(verbose=False, workers=len(modules))
+    if source.errors:
+        raise next(iter(source.errors.values()))
+    store = SessionStore.from_source(source, raw)
+    store.source_path = file_path
+    store.save(str(SESSIONS_DIR / u_id))
+    return store
+
+def render_videos(store, keys, u_id):
+    """Render (or reuse) the annotated videos of cached modules; returns {key: filename}."""
+    orig_name = os.path.basename(store.source_path).split('.')[0]
+    videos, outputs = {}, {}
+    for key in keys:
+        videos[key] = f"{RENDER_MODULES[key][1]}_{u_id}_{orig_name}.mp4"
+        if not (RESULTS_DIR / videos[key]).exists():
+            outputs[key] = str(RESULTS_DIR / videos[key])
+    if outputs:
+        rendered = render_overlays(store, {key: RENDER_MODULES[key][0] for key in outputs}, outputs)
+        missing = [key for key in outputs if key not in rendered]
+        if missing:
+            raise RuntimeError(f"Rendering failed for: {', '.join(missing)}")
+    return videos
+
+def run_analysis(analyzer, file_path, key, u_id, render=False):
     try:
-        out_filename = f"{prefix}_{u_id}_{orig_name}.mp4"
-        output_path = str(RESULTS_DIR / out_filename)
-        # Calculate 720p scale
-        cap = cv2.VideoCapture(file_path)
-        h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        cap.release()
-        scale = min(720.0 / h, 1.0) if h > 0 else 1.0
-        data = analyzer.process_video(file_path, output_path=output_path, verbose=False, scale=scale)
-        summary = analyzer.get_summary(data)
-        return summary, out_filename
+        store = analyze_session(file_path, {key: analyzer}, u_id)
+        summary = analyzer.get_summary(store.get(key))
+        video = render_videos(store, [key], u_id)[key] if render else None
+        return summary, video
     except Exception as e:
-        print(f"Error in {prefix} analysis: {str(e)}")
+        print(f"Error in {key} analysis: {str(e)}")
         traceback.print_exc()
         raise e
 
+FULL_MODULES = [
+    ("eye_gaze", eye_analyzer),
+    ("head_pose", pose_analyzer),
+    ("lip_jaw", lip_analyzer),
+    ("asymmetry", asym_analyzer),
+    ("hand_touch", touch_analyzer),
+    ("emotion", emotion_analyzer),
+]
+
+def run_full_analysis(file_path, u_id, render=False):
+    # One decode of the video shared by all six analyzers
+    store = analyze_session(file_path, dict(FULL_MODULES), u_id)
+    videos = render_videos(store, [key for key, _ in FULL_MODULES], u_id) if render else {}
+    return {key: (analyzer.get_summary(store.get(key)), videos.get(key)) for key, analyzer in FULL_MODULES}
+
+def render_session_video(session_id, key):
+    """Load a saved session and render one module's annotated video from it."""
+    schemas = {name: type(analyzer).FRAME_SCHEMA for name, (analyzer, _) in RENDER_MODULES.items()}
+    store = SessionStore.load(str(SESSIONS_DIR / session_id), schemas)
+    if not store.has(key):
+        raise ValueError(f"Module '{key}' was not analyzed in session {session_id}")
+    return render_videos(store, [key], session_id)[key]
+
 @router.get("/face/gaze")
 @router.post("/face/gaze")
-async def analyze_gaze(file_path: str = Query(None), path_form: str = Form(None)):
+async def analyze_gaze(file_path: str = Query(None), path_form: str = Form(None), render: bool = Query(True)):
     path = resolve_path(file_path or path_form)
     if not os.path.exists(path): return {"success": False, "message": f"File not found: {path}"}
     try:
         u_id = str(uuid.uuid4())[:6]
-        orig_name = os.path.basename(path).split('.')[0]
-        summary, video = run_analysis(eye_analyzer, path, "gaze", orig_name, u_id)
-        return {"success": True, "type": "gaze", "summary": summary, "video_url": f"/data/results/{video}"}
+        summary, video = run_analysis(eye_analyzer, path, "eye_gaze", u_id, render)
+        return {"success": True, "type": "gaze", "session_id": u_id, "summary": summary, "video_url": video_url(video)}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 @router.get("/face/pose")
 @router.post("/face/pose")
-async def analyze_pose(file_path: str = Query(None), path_form: str = Form(None)):
+async def analyze_pose(file_path: str = Query(None), path_form: str = Form(None), render: bool = Query(True)):
     path = resolve_path(file_path or path_form)
     if not os.path.exists(path): return {"success": False, "message": f"File not found: {path}"}
     try:
         u_id = str(uuid.uuid4())[:6]
-        orig_name = os.path.basename(path).split('.')[0]
-        summary, video = run_analysis(pose_analyzer, path, "pose", orig_name, u_id)
-        return {"success": True, "type": "pose", "summary": summary, "video_url": f"/data/results/{video}"}
+        summary, video = run_analysis(pose_analyzer, path, "head_pose", u_id, render)
+        return {"success": True, "type": "pose", "session_id": u_id, "summary": summary, "video_url": video_url(video)}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 @router.get("/face/touch")
 @router.post("/face/touch")
-async def analyze_touch(file_path: str = Query(None), path_form: str = Form(None)):
+async def analyze_touch(file_path: str = Query(None), path_form: str = Form(None), render: bool = Query(True)):
     path = resolve_path(file_path or path_form)
     if not os.path.exists(path): return {"success": False, "message": f"File not found: {path}"}
     try:
         u_id = str(uuid.uuid4())[:6]
-        orig_name = os.path.basename(path).split('.')[0]
-        summary, video = run_analysis(touch_analyzer, path, "touch", orig_name, u_id)
-        return {"success": True, "type": "touch", "summary": summary, "video_url": f"/data/results/{video}"}
+        summary, video = run_analysis(touch_analyzer, path, "hand_touch", u_id, render)
+        return {"success": True, "type": "touch", "session_id": u_id, "summary": summary, "video_url": video_url(video)}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 @router.get("/face/lipjaw")
 @router.post("/face/lipjaw")
-async def analyze_lipjaw(file_path: str = Query(None), path_form: str = Form(None)):
+async def analyze_lipjaw(file_path: str = Query(None), path_form: str = Form(None), render: bool = Query(True)):
     path = resolve_path(file_path or path_form)
     if not os.path.exists(path): return {"success": False, "message": f"File not found: {path}"}
     try:
         u_id = str(uuid.uuid4())[:6]
-        orig_name = os.path.basename(path).split('.')[0]
-        summary, video = run_analysis(lip_analyzer, path, "lipjaw", orig_name, u_id)
-        return {"success": True, "type": "lipjaw", "summary": summary, "video_url": f"/data/results/{video}"}
+        summary, video = run_analysis(lip_analyzer, path, "lip_jaw", u_id, render)
+        return {"success": True, "type": "lipjaw", "session_id": u_id, "summary": summary, "video_url": video_url(video)}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 @router.get("/face/asymmetry")
 @router.post("/face/asymmetry")
-async def analyze_asymmetry(file_path: str = Query(None), path_form: str = Form(None)):
+async def analyze_asymmetry(file_path: str = Query(None), path_form: str = Form(None), render: bool = Query(True)):
     path = resolve_path(file_path or path_form)
     if not os.path.exists(path): return {"success": False, "message": f"File not found: {path}"}
     try:
         u_id = str(uuid.uuid4())[:6]
-        orig_name = os.path.basename(path).split('.')[0]
-        summary, video = run_analysis(asym_analyzer, path, "asym", orig_name, u_id)
-        return {"success": True, "type": "asymmetry", "summary": summary, "video_url": f"/data/results/{video}"}
+        summary, video = run_analysis(asym_analyzer, path, "asymmetry", u_id, render)
+        return {"success": True, "type": "asymmetry", "session_id": u_id, "summary": summary, "video_url": video_url(video)}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 @router.get("/face/emotion")
 @router.post("/face/emotion")
-async def analyze_emotion(file_path: str = Query(None), path_form: str = Form(None)):
+async def analyze_emotion(file_path: str = Query(None), path_form: str = Form(None), render: bool = Query(True)):
     path = resolve_path(file_path or path_form)
     if not os.path.exists(path): return {"success": False, "message": f"File not found: {path}"}
     try:
         u_id = str(uuid.uuid4())[:6]
-        orig_name = os.path.basename(path).split('.')[0]
-        summary, video = run_analysis(emotion_analyzer, path, "emotion", orig_name, u_id)
-        return {"success": True, "type": "emotion", "summary": summary, "video_url": f"/data/results/{video}"}
+        summary, video = run_analysis(emotion_analyzer, path, "emotion", u_id, render)
+        return {"success": True, "type": "emotion", "session_id": u_id, "summary": summary, "video_url": video_url(video)}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
@@ -145,44 +232,63 @@ import asyncio
 
 @router.get("/face")
 @router.post("/face")
-async def analyze_face_full(file_path: str = Query(None), path_form: str = Form(None)):
+async def analyze_face_full(file_path: str = Query(None), path_form: str = Form(None), render: bool = Query(True)):
     path = resolve_path(file_path or path_form)
     if not os.path.exists(path): return {"success": False, "message": f"File not found: {path}"}
     
     try:
         u_id = str(uuid.uuid4())[:6]
-        orig_name = os.path.basename(path).split('.')[0]
-        
-        # Run the six analyzers in parallel
-        tasks = [
-            asyncio.to_thread(run_analysis, eye_analyzer, path, "gaze", orig_name, u_id),
-            asyncio.to_thread(run_analysis, pose_analyzer, path, "pose", orig_name, u_id),
-            asyncio.to_thread(run_analysis, lip_analyzer, path, "lipjaw", orig_name, u_id),
-            asyncio.to_thread(run_analysis, asym_analyzer, path, "asym", orig_name, u_id),
-            asyncio.to_thread(run_analysis, touch_analyzer, path, "touch", orig_name, u_id),
-            asyncio.to_thread(run_analysis, emotion_analyzer, path, "emotion", orig_name, u_id)
-        ]
         
-        # Run all modules simultaneously
-        results_list = await asyncio.gather(*tasks)
-        
-        # Unpack results
-        (g_sum, g_vid), (p_sum, p_vid), (l_sum, l_vid), (a_sum, a_vid), (h_sum, h_vid), (e_sum, e_vid) = results_list
+        # Run the six analyzers over a single decode of the video; annotated
+        # videos are rendered from the cached session unless render=false
+        # (then see /analyze/render)
+        results = await asyncio.to_thread(run_full_analysis, path, u_id, render)
+        (g_sum, g_vid), (p_sum, p_vid), (l_sum, l_vid), (a_sum, a_vid), (h_sum, h_vid), (e_sum, e_vid) = (
+            results["eye_gaze"], results["head_pose"], results["lip_jaw"],
+            results["asymmetry"], results["hand_touch"], results["emotion"])
 
         return {
             "success": True,
             "session_id": u_id,
             "timestamp": datetime.now().isoformat(),
             "results": {
-                "eye_gaze": {"summary": g_sum, "video": f"/data/results/{g_vid}"},
-                "head_pose": {"summary": p_sum, "video": f"/data/results/{p_vid}"},
-                "lip_jaw": {"summary": l_sum, "video": f"/data/results/{l_vid}"},
-                "asymmetry": {"summary": a_sum, "video": f"/data/results/{a_vid}"},
-                "hand_touch": {"summary": h_sum, "video": f"/data/results/{h_vid}"},
-                "emotion": {"summary": e_sum, "video": f"/data/results/{e_vid}"}
+                "eye_gaze": {"summary": g_sum, "video": video_url(g_vid)},
+                "head_pose": {"summary": p_sum, "video": video_url(p_vid)},
+                "lip_jaw": {"summary": l_sum, "video": video_url(l_vid)},
+                "asymmetry": {"summary": a_sum, "video": video_url(a_vid)},
+                "hand_touch": {"summary": h_sum, "video": video_url(h_vid)},
+                "emotion": {"summary": e_sum, "video": video_url(e_vid)}
             }
         }
     except Exception as e:
         print(f"Full Analysis Error: {str(e)}")
         traceback.print_exc()
         return {"success": False, "message": str(e)}
+
+@router.get("/render")
+@router.post("/render")
+async def render_module_video(session_id: str = Query(None), module: str = Query(None),
+                              session_form: str = Form(None), module_form: str = Form(None)):
+    """Render one module's annotated video from a saved analysis session."""
+    session_id = session_id or session_form
+    module = module or module_form
+    if not session_id or not module:
+        return {"success": False, "message": "session_id and module are required"}
+    if module not in RENDER_MODULES:
+        return {"success": False, "message": f"Unknown module: {module}"}
+    if Path(session_id).name != session_id or not (SESSIONS_DIR / session_id / "session.json").exists():
+        return {"success": False, "message": f"Session not found: {session_id}"}
+
+    try:
+        video = await asyncio.to_thread(render_session_video, session_id, module)
+        return {
+            "success": True,
+            "type": "render",
+            "session_id": session_id,
+            "module": module,
+            "video_url": video_url(video)
+        }
+    except Exception as e:
+        print(f"Render Error: {str(e)}")
+        traceback.print_exc()
+        return {"success": False, "message": str(e)}
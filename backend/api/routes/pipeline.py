@@ -5,6 +5,7 @@ import uuid
 import io
 from pathlib import Path
 import traceback
+import threading
 
 # Disable tqdm progress bars for all sub-processes (child processes inherit env)
 os.environ.setdefault("TQDM_DISABLE", "1")
@@ -30,6 +31,21 @@ def resolve_path(file_path: str):
     p = urllib.parse.unquote(p.strip('"').strip("'"))
     return Path(p).as_posix()
 
+FACE_BACKEND = os.environ.get("DECEPTRON_FACE_BACKEND", "thread")
+
+# Face worker processes shared by every pipeline request (process backend)
+_face_pool = None
+_face_pool_lock = threading.Lock()
+
+def face_pool():
+    """Worker pool shared by all pipeline requests, started on first use."""
+    global _face_pool
+    from deception_pipeline import DeceptionPipeline
+    with _face_pool_lock:
+        if _face_pool is None:
+            _face_pool = DeceptionPipeline.start_face_pool()
+        return _face_pool
+
 @router.get("/pipeline")
 @router.post("/pipeline")
 async def analyze_pipeline(
@@ -56,12 +72,21 @@ async def analyze_pipeline(
         # Ensure output directories exist
         report_dir = DATA_DIR / "reports"
         video_dir = DATA_DIR / "results"
+        session_dir = DATA_DIR / "sessions"
         report_dir.mkdir(parents=True, exist_ok=True)
         video_dir.mkdir(parents=True, exist_ok=True)
         
-        # Run the full deception pipeline
-        pipeline = DeceptionPipeline(report_dir=str(report_dir), video_dir=str(video_dir))
-        report_path = pipeline.process(physical_video, physical_audio, question_context="")
+        # Run the full deception pipeline (analysis cache kept for /analyze/render).
+        # Building one per request is cheap: its Whisper, emotion and diarization
+        # models come warm from the shared model registry and its face workers
+        # from the shared pool.
+        pipeline = DeceptionPipeline(report_dir=str(report_dir), video_dir=str(video_dir),
+                                     session_dir=str(session_dir), face_backend=FACE_BACKEND,
+                                     face_pool=face_pool() if FACE_BACKEND == "process" else None)
+        try:
+            report_path = pipeline.process(physical_video, physical_audio, question_context="")
+        finally:
+            pipeline.close()
         
         if report_path and os.path.exists(report_path):
             with open(report_path, "r", encoding="utf-8") as f:
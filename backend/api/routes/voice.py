@@ -11,11 +11,22 @@ DATA_DIR = Path.home() / ".deceptron"
 import urllib.parse
 import subprocess
 import tempfile
+import threading
 from forensic_voice_analyzer import ForensicVoiceAnalyzer
-import soundfile as sf
+from analysis_proxy import AnalysisProxy
+from session_audio import SessionAudio
 
-# Pre-load analyzer once at startup
-analyzer = ForensicVoiceAnalyzer()
+# Created on the first request; its Whisper model is the registry's shared
+# instance, so the pipeline and this route hold one copy between them
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+def get_analyzer():
+    global _analyzer
+    with _analyzer_lock:
+        if _analyzer is None:
+            _analyzer = ForensicVoiceAnalyzer()
+        return _analyzer
 
 def resolve_path(file_path: str):
     if file_path.startswith("/data/"):
@@ -37,7 +48,13 @@ async def analyze_voice(file_path: str = Query(None), path_form: str = Form(None
         physical_path = resolve_path(path)
         
         # Check if it's a video file - soundfile can't read mp4 directly
-        if physical_path.lower().endswith(('.mp4', '.avi', '.mov', '.mkv')):
+        is_video = physical_path.lower().endswith(('.mp4', '.avi', '.mov', '.mkv'))
+        proxy = AnalysisProxy.for_video(physical_path) if is_video else None
+        if proxy and proxy.audio_path:
+            # 16 kHz mono WAV cached with the video's analysis proxy
+            wav_to_analyze = proxy.audio_path
+            is_temp = False
+        elif is_video:
             print(f"Voice: Video detected. Extracting audio from {physical_path}")
             temp_wav = tempfile.NamedTemporaryFile(suffix=".wav", delete=False).name
             subprocess.run([
@@ -51,9 +68,9 @@ async def analyze_voice(file_path: str = Query(None), path_form: str = Form(None
             wav_to_analyze = physical_path
             is_temp = False
 
-        data, samplerate = sf.read(wav_to_analyze)
-        duration = len(data) / samplerate
-        metrics = analyzer.analyze_segment(wav_to_analyze, 0, duration)
+        # Decode once; the analyzer slices the loaded samples
+        audio = SessionAudio.load(wav_to_analyze)
+        metrics = get_analyzer().analyze_segment(audio, 0, audio.duration)
         
         # Cleanup temp file
         if is_temp and os.path.exists(temp_wav):
@@ -38,6 +38,7 @@ $cmd = "& `"$pythonExe`" -m PyInstaller --onefile " + `
        "--collect-all torch " + `
        "--collect-all hsemotion " + `
        "--collect-all mediapipe " + `
+       "--collect-all onnxruntime " + `
        "--collect-all pyannote.audio " + `
        "--collect-all pytorch_lightning " + `
        "--collect-all lightning_fabric " + `
@@ -6,7 +6,7 @@ datas = [('.env', '.'), ('modules', 'modules'), ('api', 'api'), ('myenv/local_mo
 binaries = []
 hiddenimports = [
     'torch', 'hsemotion', 'pyannote.audio', 'whisper', 'fastapi',
-    'groq', 'dotenv', 'numpy', 'cv2', 'pydub', 'librosa',
+    'groq', 'dotenv', 'numpy', 'cv2', 'librosa',
     'uvicorn.logging', 'mediapipe', 'parselmouth', 'soundfile',
     'uvicorn.loops', 'uvicorn.loops.auto',
     'uvicorn.protocols', 'uvicorn.protocols.http', 'uvicorn.protocols.http.auto',
@@ -28,6 +28,8 @@ tmp_ret = collect_all('hsemotion')
 datas += tmp_ret[0]; binaries += tmp_ret[1]; hiddenimports += tmp_ret[2]
 tmp_ret = collect_all('mediapipe')
 datas += tmp_ret[0]; binaries += tmp_ret[1]; hiddenimports += tmp_ret[2]
+tmp_ret = collect_all('onnxruntime')
+datas += tmp_ret[0]; binaries += tmp_ret[1]; hiddenimports += tmp_ret[2]
 tmp_ret = collect_all('pyannote.audio')
 datas += tmp_ret[0]; binaries += tmp_ret[1]; hiddenimports += tmp_ret[2]
 tmp_ret = collect_all('pytorch_lightning')
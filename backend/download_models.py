@@ -83,6 +83,17 @@ def download_and_patch_models():
     except Exception as e:
         print(f"[ERROR] Whisper download failed: {e}")
 
+    # 6. Export the emotion model to ONNX (fp32 + int8) for the CPU backend
+    print("\n--- Exporting emotion model to ONNX ---")
+    try:
+        sys.path.insert(0, str(current_dir / "modules"))
+        from emotion_onnx import export_onnx
+        export_onnx("enet_b0_8_best_vgaf", models_dir=models_dir / "emotion")
+        print(f"[OK] Emotion ONNX models saved in: {models_dir / 'emotion'}")
+        print("     Check label parity with: python modules/emotion_onnx.py --video <sample.mp4>")
+    except Exception as e:
+        print(f"[ERROR] Emotion ONNX export failed: {e}")
+
     print("\n" + "="*60)
     print("DOWNLOAD COMPLETE! Your app is now 100% OFFLINE capable.")
     print("You can now safely delete your Hugging Face API key from .env.")
@@ -0,0 +1,215 @@
+"""
+analysis_proxy.py
+
+Cached analysis proxy of an uploaded video.
+Every analysis pass (pipeline, face/voice/emotion routes, re-runs) reads a
+normalized copy of the upload instead of the original: constant frame rate,
+at most 720 lines on the short side, a keyframe every half second (so segment
+seeks decode only a few frames) and no B-frames, plus the audio track as a
+16 kHz mono WAV. The proxy is built once per file content and cached under
+"~/.deceptron/proxies/<sha256 of the file>/", so renaming or re-uploading the
+same recording reuses it.
+
+DECEPTRON_PROXY=0 disables proxies (analysis then reads the original file);
+DECEPTRON_PROXY_DIR moves the cache.
+
+Class:
+    AnalysisProxy
+        for_video(video_path) -> AnalysisProxy or None
+        video_path, audio_path (None if the video has no audio), digest
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+
+PROXY_VERSION = 1
+MAX_SHORT_SIDE = 720
+KEYFRAME_INTERVAL_SEC = 0.5
+AUDIO_RATE = 16000
+
+_memo = {}
+_locks = {}
+_memo_lock = threading.Lock()
+
+
+def proxy_dir():
+    return os.environ.get("DECEPTRON_PROXY_DIR") or os.path.join(os.path.expanduser("~"), ".deceptron", "proxies")
+
+
+def proxies_enabled():
+    return os.environ.get("DECEPTRON_PROXY", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+class AnalysisProxy:
+    """Paths of the normalized video and audio of one source file."""
+
+    def __init__(self, source_path, digest, video_path, audio_path, fps):
+        self.source_path = source_path
+        self.digest = digest
+        self.video_path = video_path
+        self.audio_path = audio_path
+        self.fps = fps
+
+    @classmethod
+    def for_video(cls, video_path):
+        """Return the proxy of video_path, transcoding it on first use.
+
+        Returns None when proxies are disabled or the transcode fails (e.g.
+        ffmpeg missing); callers then analyze the original file.
+        """
+        if not proxies_enabled():
+            return None
+        source = os.path.abspath(video_path)
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return None
+        stamp = (stat.st_size, stat.st_mtime_ns)
+
+        with _memo_lock:
+            cached = _memo.get(source)
+        if cached and cached[0] == stamp and os.path.exists(cached[1].video_path):
+            return cached[1]
+
+        try:
+            digest = cls._hash(source)
+        except OSError as e:
+            print(f"Analysis proxy unavailable for {video_path}: {e}")
+            return None
+
+        # One transcode per content, also when several requests upload it at once
+        with _memo_lock:
+            lock = _locks.setdefault(digest, threading.Lock())
+        with lock:
+            target = os.path.join(proxy_dir(), digest)
+            proxy = cls._load(target, source, digest)
+            if proxy is None:
+                proxy = cls._build(target, source, digest)
+        if proxy is None:
+            return None
+
+        with _memo_lock:
+            _memo[source] = (stamp, proxy)
+        return proxy
+
+    @staticmethod
+    def _hash(path):
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @classmethod
+    def _load(cls, target, source, digest):
+        try:
+            with open(os.path.join(target, "proxy.json"), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != PROXY_VERSION:
+            return None
+        video = os.path.join(target, "video.mp4")
+        audio = os.path.join(target, "audio.wav") if data.get('has_audio') else None
+        if not os.path.exists(video) or (audio and not os.path.exists(audio)):
+            return None
+        return cls(source, digest, video, audio, data.get('fps'))
+
+    @classmethod
+    def _build(cls, target, source, digest):
+        """Transcode into a scratch directory next to target, then move it into place."""
+        rate = cls._probe_rate(source)
+        if rate is None:
+            return None
+        num, _, den = rate.partition('/')
+        fps = float(num) / float(den or 1)
+        gop = max(1, round(fps * KEYFRAME_INTERVAL_SEC))
+
+        scratch = f"{target}.tmp-{uuid.uuid4().hex[:8]}"
+        os.makedirs(scratch, exist_ok=True)
+        # Cap the short side (portrait recordings keep their face resolution);
+        # both sides stay even for yuv420p
+        scale = (f"scale='if(gte(iw,ih),-2,trunc(min({MAX_SHORT_SIDE},iw)/2)*2)'"
+                 f":'if(gte(iw,ih),trunc(min({MAX_SHORT_SIDE},ih)/2)*2,-2)'")
+        video_cmd = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-i", source,
+            "-map", "0:v:0", "-an", "-sn", "-dn",
+            "-vf", f"fps={rate},{scale}",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "18",
+            "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0", "-bf", "0",
+            "-pix_fmt", "yuv420p",
+            os.path.join(scratch, "video.mp4")
+        ]
+        audio_cmd = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-i", source,
+            "-map", "0:a:0", "-vn",
+            "-acodec", "pcm_s16le", "-ar", str(AUDIO_RATE), "-ac", "1",
+            os.path.join(scratch, "audio.wav")
+        ]
+        print(f"Creating analysis proxy for {os.path.basename(source)}...")
+        try:
+            subprocess.run(video_cmd, check=True, capture_output=True, text=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"Analysis proxy failed for {source}: {getattr(e, 'stderr', None) or e}")
+            shutil.rmtree(scratch, ignore_errors=True)
+            return None
+        try:
+            subprocess.run(audio_cmd, check=True, capture_output=True, text=True)
+            has_audio = True
+        except (OSError, subprocess.CalledProcessError):
+            # No audio stream: the proxy is video-only
+            has_audio = False
+
+        with open(os.path.join(scratch, "proxy.json"), 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': PROXY_VERSION,
+                'source': source,
+                'fps': fps,
+                'frame_rate': rate,
+                'keyframe_interval': gop,
+                'has_audio': has_audio
+            }, f, indent=2)
+
+        try:
+            if os.path.isdir(target):
+                # Outdated proxy (or a half-written one from a crash)
+                shutil.rmtree(target)
+            os.replace(scratch, target)
+        except OSError:
+            # Another process moved its copy into place first
+            shutil.rmtree(scratch, ignore_errors=True)
+        return cls._load(target, source, digest)
+
+    @staticmethod
+    def _probe_rate(path):
+        """Average frame rate of the first video stream as an ffmpeg rational ("30000/1001")."""
+        cmd = [
+            "ffprobe", "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries", "stream=avg_frame_rate,r_frame_rate",
+            "-of", "json",
+            path
+        ]
+        try:
+            proc = subprocess.run(cmd, check=True, capture_output=True, text=True)
+            streams = json.loads(proc.stdout).get('streams') or []
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+            print(f"Analysis proxy unavailable for {path}: {e}")
+            return None
+        if not streams:
+            return None
+        for key in ('avg_frame_rate', 'r_frame_rate'):
+            num, _, den = (streams[0].get(key) or '').partition('/')
+            try:
+                if float(num) > 0 and float(den or 1) > 0:
+                    return streams[0][key]
+            except ValueError:
+                continue
+        return "30"
@@ -7,9 +7,11 @@ runs all analyzers per segment, fuses results, and generates a
 full JSON report with natural‑language reasoning.
 
 Output:
-    - Full annotated videos (one per module) in the "results" directory.
-    - A 2x2 combined presentation video (eye, emotion, hand, lip) with audio.
+    - A 2x2 combined presentation video (eye, emotion, hand, lip) with audio
+      in the "results" directory.
     - Per‑segment deception report JSON in the "reports" directory.
+    - Optionally the cached per-frame analysis of the session (session_dir),
+      from which any module's annotated video can be rendered on demand.
 """
 
 import os
@@ -46,13 +48,12 @@ import json
 import subprocess
 import tempfile
 import traceback
+from functools import partial
 import cv2
 import numpy as np
-from collections import Counter
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Import project modules (assumed to be in the same directory)
 try:
@@ -65,6 +66,14 @@ try:
     from hand_face_touch_module import HandFaceTouchAnalyzer
     from asymmetry_module import AsymmetryAnalyzer
     from emotion_detection_module import EmotionAnalyzer
+    from frame_source import FrameSource
+    from analysis_proxy import AnalysisProxy
+    from session_audio import SessionAudio
+    from session_store import SessionStore
+    from overlay_renderer import render_composite
+    from frame_workers import AnalyzerProcessPool
+    from segment_scheduler import TaskGraph
+    from frame_sampling import parse_sampling, make_policy
     from nlp_deception_module import NLPDeceptionAnalyzer
     from fusion_engine import FusionEngine
     from reasoning_engine import ReasoningEngine
@@ -77,9 +86,32 @@ except ImportError as e:
 class DeceptionPipeline:
     """Orchestrates the full multi‑modal deception detection workflow."""
 
-    def __init__(self, report_dir: str = "reports", video_dir: str = "results"):
+    # Segment module name -> name of its result in the full-video pass
+    FULL_PASS_NAMES = {
+        'eye': 'eye_gaze',
+        'lip': 'lip_jaw',
+        'head': 'head_pose',
+        'asym': 'asymmetry',
+        'hand': 'hand_face',
+        'emotion': 'emotion',
+    }
+
+    def __init__(self, report_dir: str = "reports", video_dir: str = "results",
+                 session_dir: Optional[str] = None, face_backend: str = "thread",
+                 cpu_budget: Optional[int] = None, face_sampling: Optional[str] = None,
+                 face_pool: Optional[AnalyzerProcessPool] = None):
         self.report_dir = report_dir
         self.video_dir = video_dir
+        self.session_dir = session_dir
+        self.cpu_budget = cpu_budget  # CPU slots for concurrent segment stages (None = all cores)
+        # Per-module frame sampling, e.g. "emotion=3,head_pose=adaptive" (default: full rate)
+        self.face_sampling = parse_sampling(face_sampling if face_sampling is not None
+                                            else os.environ.get("DECEPTRON_FACE_SAMPLING", ""))
+        # Face worker pool: a shared one passed in by the caller stays open
+        # after close(); with face_backend="process" and none given, this
+        # pipeline starts and owns one
+        self.face_pool = face_pool
+        self._owns_face_pool = False
         os.makedirs(self.report_dir, exist_ok=True)
         os.makedirs(self.video_dir, exist_ok=True)
 
@@ -110,9 +142,55 @@ class DeceptionPipeline:
             print(f"Error loading analyzers: {e}")
             traceback.print_exc()
             raise e
+
+        if face_backend == "process" and self.face_pool is None:
+            self.face_pool = self.start_face_pool()
+            self._owns_face_pool = True
             
         print("All analyzers loaded successfully.")
 
+    @staticmethod
+    def start_face_pool() -> AnalyzerProcessPool:
+        """One warm worker process per face module; frames go through shared memory.
+
+        Long-running callers start one pool and pass it to every pipeline."""
+        print("Starting face analyzer worker processes...")
+        return AnalyzerProcessPool({
+            'eye_gaze': EyeGazeAnalyzer,
+            'lip_jaw': LipJawAnalyzer,
+            'head_pose': HeadPoseAnalyzer,
+            'asymmetry': AsymmetryAnalyzer,
+            'hand_face': HandFaceTouchAnalyzer,
+            'emotion': EmotionAnalyzer
+        })
+
+    def close(self):
+        """Stop the face worker processes if this pipeline started them and release
+        the shared models (they stay warm in the registry for the next pipeline)."""
+        if self._owns_face_pool:
+            self.face_pool.close()
+        self.face_pool = None
+        for analyzer in (self.voice_analyzer, self.segment_manager, self.emotion_analyzer):
+            analyzer.close()
+
+    def _register(self, source, name, analyzer):
+        """Register a face analyzer (through its worker when the process backend is on)
+        with its configured sampling policy."""
+        policy = make_policy(self.face_sampling, self.FULL_PASS_NAMES.get(name, name))
+        source.register(name, self.face_pool.proxy(analyzer) if self.face_pool else analyzer,
+                        sampling=policy)
+
+    def _run_source(self, source: FrameSource, **kwargs) -> Dict:
+        """source.run(); the worker pool, which may be shared, serves one run at a time."""
+        if self.face_pool is None:
+            return source.run(**kwargs)
+        with self.face_pool.run_lock:
+            return source.run(**kwargs)
+
+    def _face_workers(self, count: int) -> int:
+        # Worker processes already run in parallel; the fan-out itself stays serial
+        return 1 if self.face_pool else count
+
     def process(self, video_path: str, audio_path: Optional[str] = None,
                 question_context: str = ""):
         """Run the full pipeline on a video file.
@@ -130,35 +208,51 @@ class DeceptionPipeline:
         print(f"  DECEPTRON DECEPTION PIPELINE - Session {session_id}")
         print(f"{'='*60}\n")
 
+        # Analysis reads the cached proxy of the upload (CFR, <=720p, short
+        # GOP, 16 kHz mono WAV); the original is only used if it can't be made
+        stem = os.path.splitext(os.path.basename(video_path))[0]
+        proxy = AnalysisProxy.for_video(video_path)
+        analysis_video = proxy.video_path if proxy else video_path
+
         # 1. Handle audio: extract from video if needed
         if audio_path is None:
-            print("Extracting audio from video...")
-            audio_path = self._extract_audio(video_path)
+            if proxy and proxy.audio_path:
+                audio_path = proxy.audio_path
+            else:
+                print("Extracting audio from video...")
+                audio_path = self._extract_audio(video_path)
             if not audio_path:
                 print("Failed to extract audio. Aborting.")
                 return None
         else:
             print(f"Using provided audio: {audio_path}")
+        # Decoded once; diarization, segmentation and voice analysis slice it
+        session_audio = SessionAudio.load(audio_path)
 
-        # 2. Generate full annotated videos (including emotion)
-        stem = os.path.splitext(os.path.basename(video_path))[0]
-        self._generate_annotated_videos(video_path, stem)
+        # 2. Analyze the full video once (no drawing/encoding); the per-frame
+        # results of this pass are kept for segment and baseline aggregation
+        store = self._analyze_full_video(analysis_video)
+        store.source_path = video_path
+        if self.session_dir:
+            # Keep the cache so module videos can be rendered later on request
+            store.save(os.path.join(self.session_dir, session_id))
 
-        # Combine selected videos into a 2x2 presentation video with audio
-        self._create_combined_video(stem, audio_path)
+        # Draw the four presentation overlays from the cache straight into
+        # a 2x2 presentation video with audio
+        self._create_combined_video(stem, audio_path, store)
 
         # 3. Get suspect answer segments
         print("\nRunning speaker diarization & segmentation...")
-        segments = self.segment_manager.get_suspect_segments(audio_path)
+        segments = self.segment_manager.get_suspect_segments(session_audio)
         if not segments:
             print("No suspect segments found. Check audio content.")
             return None
         print(f"Found {len(segments)} suspect speaking segments.")
 
         # 4. Get video FPS and total frames for time-to-frame conversion
-        cap = cv2.VideoCapture(video_path)
+        cap = cv2.VideoCapture(analysis_video)
         if not cap.isOpened():
-            raise ValueError(f"Cannot open video: {video_path}")
+            raise ValueError(f"Cannot open video: {analysis_video}")
         fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         cap.release()
@@ -169,324 +263,53 @@ class DeceptionPipeline:
         baseline_end_frame = int(baseline_duration * fps)
         
         try:
-            self.baseline_metrics = self._analyze_baseline(video_path, audio_path, baseline_end_frame)
+            self.baseline_metrics = self._analyze_baseline(analysis_video, session_audio, baseline_end_frame, store)
             print("Baseline established successfully.")
         except Exception as e:
             print(f"Warning: Baseline analysis failed ({e}). Using defaults.")
             self.baseline_metrics = {}
 
-        # 5. Process each segment
-        segment_results = []
-        previous_segments = []  # For cross-segment contradiction tracking
-        full_timeline = []  # Deception score per second for the whole video
+        # 5. Process each segment. The stages of every segment form one
+        # dependency graph: Whisper of segment N+1, face aggregation of
+        # segment N and the LLM calls of segment N-1 run concurrently.
         video_duration_sec = total_frames / fps
+        missing = [name for name in self.FULL_PASS_NAMES.values() if not store.has(name)]
+        face_cpu = max(1, len(missing))
+        graph = TaskGraph(cpu_budget=self.cpu_budget)
+        seg_ctx = []
+        prev = None
         for i, seg in enumerate(segments):
             seg_id = f"SEG_{i+1:03d}"
-            start_sec = seg['start']
-            end_sec = seg['end']
-            seg_audio = seg['audio_file']
-
-            print(f"\n--- Processing Segment {seg_id}: {start_sec:.1f}s - {end_sec:.1f}s ---")
-
-            # Convert time to frame numbers
-            start_frame = max(1, int(start_sec * fps))
-            end_frame = min(total_frames, int(end_sec * fps))
-
-            # Voice analysis
-            voice_result = self.voice_analyzer.analyze_segment(
-                seg_audio, 0, end_sec - start_sec, suppress_terminal=True)
-            if voice_result is None:
-                print("  Voice analysis failed, skipping segment.")
-                continue
-            voice_deception = voice_result.get('deception_analysis', {})
-            voice_transcript_orig = voice_result.get('transcription_original', '')
-            voice_transcript_en = voice_result.get('transcription_english', '')
-
-            # Skip silent segments (silence detection in voice analyzer)
-            voice_flags = voice_deception.get('triggered_flags', [])
-            if 'silence' in voice_flags:
-                print(f"  Segment is silent (no speech detected). Skipping.")
-                continue
-            if not voice_transcript_en and not voice_transcript_orig:
-                print(f"  Empty transcription (silence/noise only). Skipping.")
-                continue
-
-            # All face analyzers in parallel
-            face_analyzers = {
-                'eye': self.eye_analyzer,
-                'lip': self.lip_analyzer,
-                'head': self.head_analyzer,
-                'asym': self.asymmetry_analyzer,
-                'hand': self.hand_analyzer,
-                'emotion': self.emotion_analyzer,
-            }
-            face_raw = {}
-            with ThreadPoolExecutor(max_workers=6) as pool:
-                futures = {
-                    name: pool.submit(
-                        a.process_video, video_path,
-                        output_path=None,
-                        start_frame=start_frame,
-                        end_frame=end_frame,
-                        verbose=False
-                    )
-                    for name, a in face_analyzers.items()
-                }
-                for name, future in futures.items():
-                    try:
-                        face_raw[name] = future.result()
-                    except Exception as e:
-                        print(f"  Face module '{name}' failed: {e}")
-                        face_raw[name] = None
-
-            # Eye gaze
-            eye_data = face_raw.get('eye')
-            if eye_data:
-                gazes = [f['gaze'] for f in eye_data]
-                avg_stab = (gazes.count('CENTER') / len(gazes) * 100) if gazes else 100
-                dir_changes = sum(1 for i in range(1, len(eye_data))
-                                  if eye_data[i]['gaze'] != eye_data[i-1]['gaze'])
-                blink_count = eye_data[-1]['blink_count'] - eye_data[0]['blink_count'] if eye_data else 0
-                blink_spike = blink_count > 2
-                eye_summary = {
-                    'gaze_stability': avg_stab,
-                    'direction_changes': dir_changes,
-                    'fixation_score': avg_stab,
-                    'blink_rate_spike': blink_spike
-                }
-                eye_full = self.eye_analyzer.get_summary(eye_data)
-            else:
-                eye_summary = {'gaze_stability': 100, 'direction_changes': 0,
-                               'fixation_score': 100, 'blink_rate_spike': False}
-                eye_full = {}
-
-            # Lip/jaw
-            lip_data = face_raw.get('lip')
-            if lip_data:
-                avg_jaw = np.mean([f['jaw_tightness'] for f in lip_data])
-                avg_oral = np.mean([f['oral_stress'] for f in lip_data])
-                avg_tremor = np.mean([f['chin_tremor'] for f in lip_data])
-                lip_dis = any(f['lip_disappear'] for f in lip_data)
-                lip_summary = {
-                    'jaw_tightness': avg_jaw,
-                    'lip_compression': avg_oral,
-                    'chin_tremor': avg_tremor,
-                    'lip_disappear': lip_dis
-                }
-                lip_full = self.lip_analyzer.get_summary(lip_data)
-            else:
-                lip_summary = {'jaw_tightness': 0, 'lip_compression': 0,
-                               'chin_tremor': 0, 'lip_disappear': False}
-                lip_full = {}
-
-            # Head pose
-            head_data = face_raw.get('head')
-            if head_data:
-                avg_withdr = np.mean([f['withdrawal_score'] for f in head_data])
-                avg_stiff = np.mean([f['stiffness_score'] for f in head_data])
-                nodding = any(f['is_nodding'] for f in head_data)
-                shaking = any(f['is_shaking'] for f in head_data)
-                head_summary = {
-                    'withdrawal_score': avg_withdr,
-                    'stiffness': avg_stiff,
-                    'is_nodding': nodding,
-                    'is_shaking': shaking
-                }
-                head_full = self.head_analyzer.get_summary(head_data)
-            else:
-                head_summary = {'withdrawal_score': 0, 'stiffness': 0,
-                                'is_nodding': False, 'is_shaking': False}
-                head_full = {}
-
-            # Asymmetry
-            asym_data = face_raw.get('asym')
-            if asym_data:
-                avg_total_asym = np.mean([f['total_asym'] for f in asym_data])
-                avg_mouth = np.mean([f['mouth_asym'] for f in asym_data])
-                avg_brow = np.mean([f['brow_asym'] for f in asym_data])
-                asym_summary = {
-                    'total_asym': avg_total_asym,
-                    'mouth_asym': avg_mouth,
-                    'brow_asym': avg_brow
-                }
-                asym_full = self.asymmetry_analyzer.get_summary(asym_data)
-            else:
-                asym_summary = {'total_asym': 0, 'mouth_asym': 0, 'brow_asym': 0}
-                asym_full = {}
-
-            # Hand/face touch
-            hand_data = face_raw.get('hand')
-            if hand_data:
-                touches = [f for f in hand_data if f['touches']]
-                if touches:
-                    max_dur = len(touches) / 30.0
-                    all_regions = [r for f in touches for r in f['touches']]
-                    best_region = max(set(all_regions), key=all_regions.count) if all_regions else 'NONE'
-                    touch_summary = {
-                        'touch_score': 100.0,
-                        'touch_region': best_region,
-                        'touch_duration': max_dur
-                    }
-                else:
-                    touch_summary = {'touch_score': 0, 'touch_region': 'NONE', 'touch_duration': 0}
-                hand_full = self.hand_analyzer.get_summary(hand_data)
-            else:
-                touch_summary = {'touch_score': 0, 'touch_region': 'NONE', 'touch_duration': 0}
-                hand_full = {}
-
-            # Emotion
-            emotion_data = face_raw.get('emotion')
-            if emotion_data:
-                emotions = [f['emotion'] for f in emotion_data]
-                if emotions:
-                    dominant = Counter(emotions).most_common(1)[0][0]
-                    changes = sum(1 for i in range(1, len(emotions)) if emotions[i] != emotions[i-1])
-                    variance = min(100, (changes / len(emotions)) * 100)
-                else:
-                    dominant = 'Neutral'; variance = 50
-                emotion_full = self.emotion_analyzer.get_summary(emotion_data)
-            else:
-                dominant = 'Neutral'; variance = 50
-                emotion_full = {}
-
-            emotion_summary = {
-                'dominant_emotion': dominant,
-                'emotion_variance': variance
-            }
-
-            # Assemble face data dict for fusion
-            face_data = {
-                'eye_gaze': eye_summary,
-                'lip_jaw': lip_summary,
-                'head_pose': head_summary,
-                'asymmetry': asym_summary,
-                'hand_touch': touch_summary,
-                'emotion_timeline': emotion_summary
-            }
-
-            # Extract question context for this segment
-            q_text = ""
-            if seg.get('question') and seg['question'].get('text'):
-                q_text = seg['question']['text']
-                print(f"  Question: \"{q_text[:100]}{'...' if len(q_text) > 100 else ''}\"")
-            per_segment_context = q_text if q_text else (question_context if question_context else "What can you tell us about this situation?")
-
-            # NLP analysis with question context
-            text_for_nlp = voice_transcript_en if voice_transcript_en else voice_transcript_orig
-            nlp_result = self.nlp_analyzer.analyze(
-                text=text_for_nlp,
-                voice_stress=voice_deception.get('overall_deception_score', 0),
-                question_context=per_segment_context,
-                previous_segments=previous_segments
-            )
-            if nlp_result is None:
-                nlp_result = {'overall_deception_score': 0, 'triggered_flags': []}
-
-            # Voice data for fusion
-            voice_data = {
-                'jitter': voice_result.get('micro_tremors', {}).get('jitter_local_percent', 0),
-                'shimmer': voice_result.get('micro_tremors', {}).get('shimmer_local_percent', 0),
-                'pitch_std': voice_result.get('fundamental_frequency', {}).get('f0_std_hz', 0),
-                'pitch_variance_category': voice_result.get('fundamental_frequency', {}).get('stability_status', 'Stable'),
-                'pause_ratio': voice_result.get('temporal_dynamics', {}).get('pause_ratio_percent', 0),
-                'wpm': voice_result.get('temporal_dynamics', {}).get('speaking_rate_wpm', 0),
-                'stress_category': voice_deception.get('stress_category', 'Low'),
-                'deception_score': voice_deception.get('overall_deception_score', 0)
+            ctx = {
+                'seg_id': seg_id,
+                'seg': seg,
+                # Convert time to frame numbers
+                'start_frame': max(1, int(seg['start'] * fps)),
+                'end_frame': min(total_frames, int(seg['end'] * fps)),
             }
-
-            # Fusion
-            fusion_result = self.fusion_engine.fuse(
-                face_data=face_data,
-                voice_data=voice_data,
-                nlp_data=nlp_result,
-                timestamps=None
-            )
-
-            # Advanced analysis (baseline comparison and conflicts)
-            # Detect mismatches (e.g. Happy face + Stressed voice)
-            face_summary_for_conflict = {
-                'eye_gaze': eye_summary,
-                'emotion': emotion_summary
-            }
-            conflicts = self._detect_conflicts(face_summary_for_conflict, voice_deception)
-            
-            # Detect behavioral spikes relative to the first 10 seconds
-            spikes = self._detect_spikes(
-                {'face_cues': face_data, 'voice_stress': voice_deception}, 
-                self.baseline_metrics
-            )
-            
-            # Apply penalties based on conflicts and spikes
-            if conflicts:
-                fusion_result['final_deception_score'] = min(100, fusion_result['final_deception_score'] + (15 * len(conflicts)))
-                for c in conflicts:
-                    fusion_result['active_cues'].append({
-                        'module': 'pipeline', 'cue': 'Conflict: ' + c, 
-                        'severity': 100, 'timestamp': f"{start_sec:.2f}", 'duration': end_sec - start_sec
-                    })
-            
-            if spikes:
-                fusion_result['final_deception_score'] = min(100, fusion_result['final_deception_score'] + (10 * len(spikes)))
-                for s in spikes:
-                    fusion_result['active_cues'].append({
-                        'module': 'pipeline', 'cue': 'Spike: ' + s, 
-                        'severity': 100, 'timestamp': f"{start_sec:.2f}", 'duration': end_sec - start_sec
-                    })
-
-            # Reasoning
-            reasoning_input = {
-                'text': text_for_nlp,
-                'question': per_segment_context,
-                'face_cues': face_data,
-                'voice_stress': voice_data,
-                'nlp_flags': nlp_result.get('triggered_flags', []),
-                'nlp_analysis': nlp_result.get('summary', ''),
-                'start_time': start_sec,
-                'end_time': end_sec
-            }
-            reason = self.reasoning_engine.explain(reasoning_input)
-
-            # Compile segment result
-            seg_result = {
-                'segment_id': seg_id,
-                'start_sec': start_sec,
-                'end_sec': end_sec,
-                'question': seg.get('question'),
-                'transcript_original': voice_transcript_orig,
-                'transcript_english': voice_transcript_en,
-                'fusion': fusion_result,
-                'reasoning': reason,
-                'raw_scores': {
-                    'voice_stress': voice_deception,
-                    'eye_gaze': eye_full or eye_summary,
-                    'lip_jaw': lip_full or lip_summary,
-                    'head_pose': head_full or head_summary,
-                    'asymmetry': asym_full or asym_summary,
-                    'hand_touch': hand_full or touch_summary,
-                    'emotion': emotion_full or emotion_summary,
-                    'nlp': nlp_result
-                }
-            }
-            segment_results.append(seg_result)
-
-            # Track this segment for cross-segment contradiction detection
-            previous_segments.append({
-                'transcript_original': voice_transcript_orig,
-                'transcript_english': voice_transcript_en,
-                'question': seg.get('question'),
-            })
-
-            print(f"  → Deception Score: {fusion_result['final_deception_score']:.1f}% "
-                  f"({fusion_result['confidence_level']})")
-            if fusion_result['is_deceptive']:
-                print(f"     Deceptive cues active!")
-            
-            # Cleanup: remove temporary segment audio file
-            try:
-                if seg_audio and os.path.exists(seg_audio):
-                    os.remove(seg_audio)
-            except Exception as e:
-                print(f"  Warning: Could not delete segment file {seg_audio}: {e}")
+            seg_ctx.append(ctx)
+            # Voice runs segments in order (one Whisper model); face re-runs
+            # share the analyzers and fusion keeps per-call state, so those
+            # stages are chained across segments as well
+            voice = graph.add(f"{seg_id}.voice", partial(self._segment_voice, ctx, session_audio),
+                              deps=[f"{prev}.voice"] if prev else [])
+            face = graph.add(f"{seg_id}.face", partial(self._segment_face, ctx, analysis_video, store),
+                             deps=[voice] + ([f"{prev}.face"] if prev else []), cpu=face_cpu)
+            nlp = graph.add(f"{seg_id}.nlp", partial(self._segment_nlp, ctx, seg_ctx[:i], question_context),
+                            deps=[voice], cpu=0)
+            fuse = graph.add(f"{seg_id}.fuse", partial(self._segment_fuse, ctx),
+                             deps=[face, nlp] + ([f"{prev}.fuse"] if prev else []))
+            graph.add(f"{seg_id}.reason", partial(self._segment_reason, ctx), deps=[fuse], cpu=0)
+            prev = seg_id
+
+        graph.run()
+        schedule = graph.report()
+        segment_results = [ctx['result'] for ctx in seg_ctx if 'result' in ctx]
+        if schedule:
+            print(f"\nSegment schedule: {schedule['wall_sec']:.1f}s wall, "
+                  f"{schedule['task_sec']:.1f}s of task time ({schedule['parallelism']}x), "
+                  f"critical path {schedule['critical_path_sec']:.1f}s:")
+            print("  " + " -> ".join(t['task'] for t in schedule['critical_path']))
 
         # 6. Overall summary & report
         if not segment_results:
@@ -539,6 +362,7 @@ class DeceptionPipeline:
             'session_id': session_id,
             'timestamp': datetime.now().isoformat(),
             'video_path': video_path,
+            'analysis_video': analysis_video,
             'audio_path': audio_path,
             'question_context': question_context,
             'overall_deception_score': round(overall_score, 1),
@@ -546,7 +370,8 @@ class DeceptionPipeline:
             'total_segments': total_segs,
             'timeline': full_timeline,
             'segments': segment_results,
-            'conclusion': conclusion
+            'conclusion': conclusion,
+            'schedule': schedule
         }
 
         # Save JSON report
@@ -571,7 +396,6 @@ class DeceptionPipeline:
         print("\n" + "=" * 60)
         print("   PIPELINE COMPLETE")
         print("=" * 60)
-        print(f"Annotated videos saved to: {self.video_dir}/")
         print(f"Combined presentation video with audio: {self.video_dir}/{stem}_combined_presentation.mp4")
         print(f"Processed {total_segs} suspect responses.")
         print(f"Average deception score: {overall_score:.1f}%")
@@ -594,18 +418,339 @@ class DeceptionPipeline:
 
         return report_path
 
-    # Generate annotated full videos (including emotion)
-    def _generate_annotated_videos(self, video_path: str, stem: str):
-        """Run each visual module on the full video in PARALLEL and save annotated copies at 720p."""
-        # Calculate scale for 720p target height
-        cap = cv2.VideoCapture(video_path)
-        orig_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        cap.release()
-        scale = min(720.0 / orig_height, 1.0) if orig_height > 0 else 1.0
-        if scale < 1.0:
-            print(f"\nScaling output to 720p (scale={scale:.3f})...")
+    # Per-segment stages (scheduled by the TaskGraph in process)
+    def _segment_voice(self, ctx: Dict, audio: SessionAudio) -> None:
+        """Voice analysis and transcription; marks the segment skipped if unusable."""
+        seg_id, seg = ctx['seg_id'], ctx['seg']
+        start_sec, end_sec = seg['start'], seg['end']
+        ctx['skip'] = True
+
+        print(f"\n--- Processing Segment {seg_id}: {start_sec:.1f}s - {end_sec:.1f}s ---")
+        # Sliced straight from the shared session samples by the segment's
+        # sample range (no segment files)
+        voice_result = self.voice_analyzer.analyze_segment(
+            audio, start_sec, end_sec, suppress_terminal=True,
+            sample_range=(seg['start_sample'], seg['end_sample']))
+        if voice_result is None:
+            print(f"  {seg_id}: Voice analysis failed, skipping segment.")
+            return
+        voice_deception = voice_result.get('deception_analysis', {})
+        voice_transcript_orig = voice_result.get('transcription_original', '')
+        voice_transcript_en = voice_result.get('transcription_english', '')
+
+        # Skip silent segments (silence detection in voice analyzer)
+        voice_flags = voice_deception.get('triggered_flags', [])
+        if 'silence' in voice_flags:
+            print(f"  {seg_id}: Segment is silent (no speech detected). Skipping.")
+            return
+        if not voice_transcript_en and not voice_transcript_orig:
+            print(f"  {seg_id}: Empty transcription (silence/noise only). Skipping.")
+            return
+
+        ctx.update(skip=False, voice_result=voice_result, voice_deception=voice_deception,
+                   transcript_orig=voice_transcript_orig, transcript_en=voice_transcript_en)
+
+    def _segment_face(self, ctx: Dict, video_path: str, store: SessionStore) -> None:
+        """Face cue summaries of one segment from the full-video pass."""
+        if ctx['skip']:
+            return
+        start_frame, end_frame = ctx['start_frame'], ctx['end_frame']
+
+        # All face analyzers in parallel
+        face_analyzers = {
+            'eye': self.eye_analyzer,
+            'lip': self.lip_analyzer,
+            'head': self.head_analyzer,
+            'asym': self.asymmetry_analyzer,
+            'hand': self.hand_analyzer,
+            'emotion': self.emotion_analyzer,
+        }
+        # Slice the full-video pass; only modules missing from it are
+        # re-run, over one shared decode of the segment
+        face_raw = {name: store.slice(self.FULL_PASS_NAMES[name], start_frame, end_frame)
+                    for name in face_analyzers}
+        missing = [name for name in face_analyzers if not store.has(self.FULL_PASS_NAMES[name])]
+        if missing:
+            source = FrameSource(video_path)
+            for name in missing:
+                self._register(source, name, face_analyzers[name])
+            face_raw.update(self._run_source(source, start_frame=start_frame, end_frame=end_frame,
+                                             workers=self._face_workers(len(missing))))
+            for name, e in source.errors.items():
+                print(f"  {ctx['seg_id']}: Face module '{name}' failed: {e}")
+
+        # Eye gaze
+        eye_data = face_raw.get('eye')
+        if eye_data:
+            avg_stab = eye_data.percent(eye_data.is_('gaze', 'CENTER'))
+            dir_changes = eye_data.transitions('gaze')
+            blink_counts = eye_data.col('blink_count')
+            blink_count = int(blink_counts[-1] - blink_counts[0])
+            blink_spike = blink_count > 2
+            eye_summary = {
+                'gaze_stability': avg_stab,
+                'direction_changes': dir_changes,
+                'fixation_score': avg_stab,
+                'blink_rate_spike': blink_spike
+            }
+            eye_full = self.eye_analyzer.get_summary(eye_data)
+        else:
+            eye_summary = {'gaze_stability': 100, 'direction_changes': 0,
+                           'fixation_score': 100, 'blink_rate_spike': False}
+            eye_full = {}
+
+        # Lip/jaw
+        lip_data = face_raw.get('lip')
+        if lip_data:
+            avg_jaw = lip_data.mean('jaw_tightness')
+            avg_oral = lip_data.mean('oral_stress')
+            avg_tremor = lip_data.mean('chin_tremor')
+            lip_dis = bool(lip_data.col('lip_disappear').any())
+            lip_summary = {
+                'jaw_tightness': avg_jaw,
+                'lip_compression': avg_oral,
+                'chin_tremor': avg_tremor,
+                'lip_disappear': lip_dis
+            }
+            lip_full = self.lip_analyzer.get_summary(lip_data)
+        else:
+            lip_summary = {'jaw_tightness': 0, 'lip_compression': 0,
+                           'chin_tremor': 0, 'lip_disappear': False}
+            lip_full = {}
+
+        # Head pose
+        head_data = face_raw.get('head')
+        if head_data:
+            avg_withdr = head_data.mean('withdrawal_score')
+            avg_stiff = head_data.mean('stiffness_score')
+            nodding = bool(head_data.col('is_nodding').any())
+            shaking = bool(head_data.col('is_shaking').any())
+            head_summary = {
+                'withdrawal_score': avg_withdr,
+                'stiffness': avg_stiff,
+                'is_nodding': nodding,
+                'is_shaking': shaking
+            }
+            head_full = self.head_analyzer.get_summary(head_data)
+        else:
+            head_summary = {'withdrawal_score': 0, 'stiffness': 0,
+                            'is_nodding': False, 'is_shaking': False}
+            head_full = {}
+
+        # Asymmetry
+        asym_data = face_raw.get('asym')
+        if asym_data:
+            avg_total_asym = asym_data.mean('total_asym')
+            avg_mouth = asym_data.mean('mouth_asym')
+            avg_brow = asym_data.mean('brow_asym')
+            asym_summary = {
+                'total_asym': avg_total_asym,
+                'mouth_asym': avg_mouth,
+                'brow_asym': avg_brow
+            }
+            asym_full = self.asymmetry_analyzer.get_summary(asym_data)
+        else:
+            asym_summary = {'total_asym': 0, 'mouth_asym': 0, 'brow_asym': 0}
+            asym_full = {}
+
+        # Hand/face touch
+        hand_data = face_raw.get('hand')
+        if hand_data:
+            touch_frames = int(np.count_nonzero(hand_data.col('touches')))
+            if touch_frames:
+                max_dur = touch_frames / 30.0
+                region_counts = hand_data.counts('touches')
+                best_region = max(region_counts, key=region_counts.get)
+                touch_summary = {
+                    'touch_score': 100.0,
+                    'touch_region': best_region,
+                    'touch_duration': max_dur
+                }
+            else:
+                touch_summary = {'touch_score': 0, 'touch_region': 'NONE', 'touch_duration': 0}
+            hand_full = self.hand_analyzer.get_summary(hand_data)
+        else:
+            touch_summary = {'touch_score': 0, 'touch_region': 'NONE', 'touch_duration': 0}
+            hand_full = {}
+
+        # Emotion
+        emotion_data = face_raw.get('emotion')
+        if emotion_data:
+            dominant = emotion_data.mode('emotion', 'Neutral')
+            changes = emotion_data.transitions('emotion')
+            variance = min(100, (changes / len(emotion_data)) * 100)
+            emotion_full = self.emotion_analyzer.get_summary(emotion_data)
+        else:
+            dominant = 'Neutral'; variance = 50
+            emotion_full = {}
+
+        emotion_summary = {
+            'dominant_emotion': dominant,
+            'emotion_variance': variance
+        }
+
+        # Assemble face data dict for fusion
+        ctx['face_data'] = {
+            'eye_gaze': eye_summary,
+            'lip_jaw': lip_summary,
+            'head_pose': head_summary,
+            'asymmetry': asym_summary,
+            'hand_touch': touch_summary,
+            'emotion_timeline': emotion_summary
+        }
+        ctx['eye_summary'], ctx['emotion_summary'] = eye_summary, emotion_summary
+        ctx['face_full'] = {
+            'eye_gaze': eye_full or eye_summary,
+            'lip_jaw': lip_full or lip_summary,
+            'head_pose': head_full or head_summary,
+            'asymmetry': asym_full or asym_summary,
+            'hand_touch': hand_full or touch_summary,
+            'emotion': emotion_full or emotion_summary,
+        }
+
+    def _segment_nlp(self, ctx: Dict, previous: List[Dict], question_context: str) -> None:
+        """NLP analysis of the transcript (Groq), with earlier answers for contradictions."""
+        if ctx['skip']:
+            return
+        seg = ctx['seg']
+
+        # Extract question context for this segment
+        q_text = ""
+        if seg.get('question') and seg['question'].get('text'):
+            q_text = seg['question']['text']
+            print(f"  {ctx['seg_id']} question: \"{q_text[:100]}{'...' if len(q_text) > 100 else ''}\"")
+        per_segment_context = q_text if q_text else (question_context if question_context else "What can you tell us about this situation?")
+
+        # Earlier analyzed segments, for cross-segment contradiction tracking
+        previous_segments = [{
+            'transcript_original': p['transcript_orig'],
+            'transcript_english': p['transcript_en'],
+            'question': p['seg'].get('question'),
+        } for p in previous if not p['skip']]
+
+        # NLP analysis with question context
+        text_for_nlp = ctx['transcript_en'] if ctx['transcript_en'] else ctx['transcript_orig']
+        nlp_result = self.nlp_analyzer.analyze(
+            text=text_for_nlp,
+            voice_stress=ctx['voice_deception'].get('overall_deception_score', 0),
+            question_context=per_segment_context,
+            previous_segments=previous_segments
+        )
+        if nlp_result is None:
+            nlp_result = {'overall_deception_score': 0, 'triggered_flags': []}
+        ctx.update(nlp_result=nlp_result, text_for_nlp=text_for_nlp, question_text=per_segment_context)
+
+    def _segment_fuse(self, ctx: Dict) -> None:
+        """Fuse face, voice and NLP cues and apply the conflict and spike penalties."""
+        if ctx['skip']:
+            return
+        voice_result, voice_deception = ctx['voice_result'], ctx['voice_deception']
+        face_data, nlp_result = ctx['face_data'], ctx['nlp_result']
+        start_sec, end_sec = ctx['seg']['start'], ctx['seg']['end']
+
+        # Voice data for fusion
+        voice_data = {
+            'jitter': voice_result.get('micro_tremors', {}).get('jitter_local_percent', 0),
+            'shimmer': voice_result.get('micro_tremors', {}).get('shimmer_local_percent', 0),
+            'pitch_std': voice_result.get('fundamental_frequency', {}).get('f0_std_hz', 0),
+            'pitch_variance_category': voice_result.get('fundamental_frequency', {}).get('stability_status', 'Stable'),
+            'pause_ratio': voice_result.get('temporal_dynamics', {}).get('pause_ratio_percent', 0),
+            'wpm': voice_result.get('temporal_dynamics', {}).get('speaking_rate_wpm', 0),
+            'stress_category': voice_deception.get('stress_category', 'Low'),
+            'deception_score': voice_deception.get('overall_deception_score', 0)
+        }
 
-        print("\nGenerating annotated full videos (Parallel Process)...")
+        # Fusion
+        fusion_result = self.fusion_engine.fuse(
+            face_data=face_data,
+            voice_data=voice_data,
+            nlp_data=nlp_result,
+            timestamps=None
+        )
+
+        # Advanced analysis (baseline comparison and conflicts)
+        # Detect mismatches (e.g. Happy face + Stressed voice)
+        face_summary_for_conflict = {
+            'eye_gaze': ctx['eye_summary'],
+            'emotion': ctx['emotion_summary']
+        }
+        conflicts = self._detect_conflicts(face_summary_for_conflict, voice_deception)
+        
+        # Detect behavioral spikes relative to the first 10 seconds
+        spikes = self._detect_spikes(
+            {'face_cues': face_data, 'voice_stress': voice_deception}, 
+            self.baseline_metrics
+        )
+        
+        # Apply penalties based on conflicts and spikes
+        if conflicts:
+            fusion_result['final_deception_score'] = min(100, fusion_result['final_deception_score'] + (15 * len(conflicts)))
+            for c in conflicts:
+                fusion_result['active_cues'].append({
+                    'module': 'pipeline', 'cue': 'Conflict: ' + c, 
+                    'severity': 100, 'timestamp': f"{start_sec:.2f}", 'duration': end_sec - start_sec
+                })
+        
+        if spikes:
+            fusion_result['final_deception_score'] = min(100, fusion_result['final_deception_score'] + (10 * len(spikes)))
+            for s in spikes:
+                fusion_result['active_cues'].append({
+                    'module': 'pipeline', 'cue': 'Spike: ' + s, 
+                    'severity': 100, 'timestamp': f"{start_sec:.2f}", 'duration': end_sec - start_sec
+                })
+        ctx.update(voice_data=voice_data, fusion_result=fusion_result)
+
+    def _segment_reason(self, ctx: Dict) -> None:
+        """LLM explanation of the fused result; compiles the segment's report entry."""
+        if ctx['skip']:
+            return
+        seg = ctx['seg']
+        start_sec, end_sec = seg['start'], seg['end']
+        nlp_result, fusion_result = ctx['nlp_result'], ctx['fusion_result']
+
+        # Reasoning
+        reasoning_input = {
+            'text': ctx['text_for_nlp'],
+            'question': ctx['question_text'],
+            'face_cues': ctx['face_data'],
+            'voice_stress': ctx['voice_data'],
+            'nlp_flags': nlp_result.get('triggered_flags', []),
+            'nlp_analysis': nlp_result.get('summary', ''),
+            'start_time': start_sec,
+            'end_time': end_sec
+        }
+        reason = self.reasoning_engine.explain(reasoning_input)
+
+        # Compile segment result
+        ctx['result'] = {
+            'segment_id': ctx['seg_id'],
+            'start_sec': start_sec,
+            'end_sec': end_sec,
+            'question': seg.get('question'),
+            'transcript_original': ctx['transcript_orig'],
+            'transcript_english': ctx['transcript_en'],
+            'fusion': fusion_result,
+            'reasoning': reason,
+            'raw_scores': {
+                'voice_stress': ctx['voice_deception'],
+                **ctx['face_full'],
+                'nlp': nlp_result
+            }
+        }
+
+        print(f"  {ctx['seg_id']} → Deception Score: {fusion_result['final_deception_score']:.1f}% "
+              f"({fusion_result['confidence_level']})")
+        if fusion_result['is_deceptive']:
+            print(f"     Deceptive cues active!")
+
+    # Full-video analysis pass (including emotion)
+    def _analyze_full_video(self, video_path: str) -> SessionStore:
+        """Run every visual module over one shared decode of the full video.
+
+        Nothing is drawn or encoded here; annotated videos are rendered from
+        the returned SessionStore only when they are needed.
+        """
+        print("\nAnalyzing full video (single decode, parallel modules)...")
         modules = {
             'eye_gaze': self.eye_analyzer,
             'lip_jaw': self.lip_analyzer,
@@ -615,58 +760,34 @@ class DeceptionPipeline:
             'emotion': self.emotion_analyzer
         }
         
-        with ThreadPoolExecutor(max_workers=len(modules)) as executor:
-            futures = []
-            for name, analyzer in modules.items():
-                out_path = os.path.join(self.video_dir, f"{stem}_{name}.mp4")
-                print(f"  Scheduling {name} ...")
-                futures.append(executor.submit(analyzer.process_video, video_path, output_path=out_path, verbose=False, scale=scale))
-            
-            # Wait for all to finish
-            for f in futures:
-                try: f.result()
-                except Exception as e: print(f"  Module video generation failed: {e}")
+        # Decode once and feed all six modules from the same frames
+        source = FrameSource(video_path)
+        for name, analyzer in modules.items():
+            self._register(source, name, analyzer)
+        results = self._run_source(source, workers=self._face_workers(len(modules)))
+        for name, e in source.errors.items():
+            print(f"  Module analysis failed ({name}): {e}")
 
-        print("Annotated videos complete.\n")
+        print("Full-video analysis complete.\n")
+        return SessionStore.from_source(source, results)
 
     # Create 2x2 combined presentation video with audio
-    def _create_combined_video(self, stem: str, audio_path: str):
-        """Stack eye_gaze, emotion, hand_face, lip_jaw in 2x2 grid,
-        add original audio, and save as 'stem_combined_presentation.mp4'.
+    def _create_combined_video(self, stem: str, audio_path: str, store: SessionStore):
+        """Draw eye_gaze, emotion, hand_face, lip_jaw from the cached results into
+        one 2x2 canvas per frame, encode it with the original audio in a single
+        ffmpeg process, and save as 'stem_combined_presentation.mp4'.
         """
         print("\nCreating 2x2 combined presentation video with audio...")
-        # Filenames of the four selected modules
-        eye_file = os.path.join(self.video_dir, f"{stem}_eye_gaze.mp4")
-        emotion_file = os.path.join(self.video_dir, f"{stem}_emotion.mp4")
-        hand_file = os.path.join(self.video_dir, f"{stem}_hand_face.mp4")
-        lip_file = os.path.join(self.video_dir, f"{stem}_lip_jaw.mp4")
-
-        # Ensure all four exist; if any missing, skip
-        for f in [eye_file, emotion_file, hand_file, lip_file]:
-            if not os.path.exists(f):
-                print(f"  Warning: {f} not found, skipping combined video.")
-                return
-
         combined_video = os.path.join(self.video_dir, f"{stem}_combined_presentation.mp4")
-        
-        # ffmpeg xstack 2x2: top-left, top-right, bottom-left, bottom-right
-        cmd = [
-            "ffmpeg", "-y",
-            "-i", eye_file, "-i", emotion_file, "-i", hand_file, "-i", lip_file,
-            "-i", audio_path,
-            "-filter_complex",
-            "[0:v][1:v][2:v][3:v]xstack=inputs=4:layout=0_0|w0_0|0_h0|w0_h0[v]",
-            "-map", "[v]", "-map", "4:a",
-            "-c:v", "libx264", "-preset", "fast", "-crf", "23",
-            "-c:a", "aac", "-b:a", "128k",
-            "-shortest",
-            combined_video
+        # Grid order: top-left, top-right, bottom-left, bottom-right
+        tiles = [
+            ('eye_gaze', self.eye_analyzer),
+            ('emotion', self.emotion_analyzer),
+            ('hand_face', self.hand_analyzer),
+            ('lip_jaw', self.lip_analyzer)
         ]
-        try:
-            subprocess.run(cmd, check=True, capture_output=True, text=True)
+        if render_composite(store, tiles, combined_video, audio_path=audio_path, max_height=720):
             print(f"  Combined video saved: {combined_video}")
-        except subprocess.CalledProcessError as e:
-            print(f"  ffmpeg error: {e.stderr}")
 
     # Audio extraction
     def _extract_audio(self, video_path: str) -> Optional[str]:
@@ -686,31 +807,41 @@ class DeceptionPipeline:
             print(f"ffmpeg error: {e.stderr}")
             return None
 
-    def _analyze_baseline(self, video_path: str, audio_path: str, end_frame: int) -> Dict:
+    def _analyze_baseline(self, video_path: str, audio: SessionAudio, end_frame: int,
+                          store: Optional[SessionStore] = None) -> Dict:
         """Analyzes the first few seconds of video/audio to establish 'normal' behavior."""
-        # Eye baseline
-        eye_data = self.eye_analyzer.process_video(video_path, end_frame=end_frame, verbose=False)
+        if store is not None and store.has('eye_gaze') and store.has('emotion'):
+            # Opening frames were already analyzed by the full-video pass
+            eye_data = store.slice('eye_gaze', 1, end_frame)
+            emo_data = store.slice('emotion', 1, end_frame)
+        else:
+            # Eye and emotion baselines share one decode of the opening frames
+            source = FrameSource(video_path)
+            self._register(source, 'eye', self.eye_analyzer)
+            self._register(source, 'emotion', self.emotion_analyzer)
+            raw = self._run_source(source, end_frame=end_frame, workers=self._face_workers(2))
+            if source.errors:
+                raise next(iter(source.errors.values()))
+            eye_data = raw['eye']
+            emo_data = raw['emotion']
         # We'll use gaze stability (CENTER ratio) as the eye baseline score
-        eye_base = (len([f for f in eye_data if f.get('gaze') == 'CENTER']) / len(eye_data) * 100) if eye_data else 80
+        eye_base = eye_data.percent(eye_data.is_('gaze', 'CENTER')) if eye_data else 80
         
         # Voice baseline
-        voice_results = self.voice_analyzer.analyze_segment(audio_path, 0, end_frame/30.0, suppress_terminal=True)
+        voice_results = self.voice_analyzer.analyze_segment(audio, 0, min(end_frame/30.0, audio.duration), suppress_terminal=True)
         # Use overall deception score or default to 30
         voice_base = 30
         if voice_results and 'deception_analysis' in voice_results:
             voice_base = voice_results['deception_analysis'].get('overall_deception_score', 30)
         
-        # Emotion baseline
-        emo_data = self.emotion_analyzer.process_video(video_path, end_frame=end_frame, verbose=False)
-        # Use 'emotion' key instead of 'dominant_emotion'
-        from collections import Counter
-        dom_emo = Counter([f['emotion'] for f in emo_data]).most_common(1)[0][0] if emo_data else "Neutral"
+        # Emotion baseline: use 'emotion' key instead of 'dominant_emotion'
+        dom_emo = emo_data.mode('emotion', "Neutral") if emo_data else "Neutral"
 
         return {
             'eye_gaze_score': eye_base,
             'voice_stress': voice_base,
             'dominant_emotion': dom_emo,
-            'blink_rate': len([f for f in eye_data if f.get('blink_count', 0) > 0]) / (end_frame/30.0) if (end_frame > 0) else 0.5
+            'blink_rate': (int(np.count_nonzero(eye_data.col('blink_count') > 0)) if eye_data else 0) / (end_frame/30.0) if (end_frame > 0) else 0.5
         }
 
     def _detect_conflicts(self, face_cues: Dict, voice_stress: Dict) -> List[str]:
@@ -759,10 +890,21 @@ if __name__ == "__main__":
     parser.add_argument("--report_dir", default="reports", help="Directory for report JSON files")
     parser.add_argument("--video_dir", default="results", help="Directory for annotated output videos")
     parser.add_argument("--question", default="", help="Interview question (for better NLP context)")
+    parser.add_argument("--face_backend", choices=["thread", "process"], default="thread",
+                        help="Run face modules in threads or in warm worker processes")
+    parser.add_argument("--cpu_budget", type=int, default=None,
+                        help="CPU slots for overlapping segment stages (default: all cores)")
+    parser.add_argument("--face_sampling", default=None,
+                        help='Face module frame sampling, e.g. "3" or "emotion=adaptive:6,head_pose=2"')
     args = parser.parse_args()
 
-    pipeline = DeceptionPipeline(report_dir=args.report_dir, video_dir=args.video_dir)
-    report_path = pipeline.process(args.video, args.audio, question_context=args.question)
+    pipeline = DeceptionPipeline(report_dir=args.report_dir, video_dir=args.video_dir,
+                                 face_backend=args.face_backend, cpu_budget=args.cpu_budget,
+                                 face_sampling=args.face_sampling)
+    try:
+        report_path = pipeline.process(args.video, args.audio, question_context=args.question)
+    finally:
+        pipeline.close()
     if report_path:
         print(f"Final report: {report_path}")
     else:
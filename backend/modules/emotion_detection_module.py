@@ -1,48 +1,199 @@
 """
 emotion_detection_module.py
 
-Real‑time emotion detection using HSEmotion + MediaPipe Face Detection.
+Real‑time emotion detection using HSEmotion on a face crop taken from the
+shared FaceMesh landmarks (MediaPipe Face Detection only as a fallback).
 Standalone: python emotion_detection_module.py → asks for video, prints per‑frame
 analysis, saves annotated video, and prints a final timeline report.
 
 Pipeline‑ready: supports start/end frame & optional output video.
+Face crops are classified in batches (batch_size frames per forward pass);
+records are appended in frame order and filled in when their batch runs.
 
-Dependencies: hsemotion, torch, mediapipe, opencv, numpy
+Backends: 'torch' (HSEmotion), 'onnx' or 'onnx-int8' (ONNX Runtime on CPU,
+exported with emotion_onnx.py); default from DECEPTRON_EMOTION_BACKEND.
+The recognizer is acquired from the shared model registry when a run starts,
+so constructing an analyzer is cheap; close() releases it.
+
+Dependencies: hsemotion, torch, mediapipe, opencv, numpy (onnxruntime for the ONNX backends)
 """
 
 import cv2
 import mediapipe as mp
 import torch
 import numpy as np
-from collections import defaultdict
 import os
-from hsemotion.facial_emotions import HSEmotionRecognizer
+from frame_source import FrameAnalyzer
+from frame_columns import Categorical, Column
+from face_landmarks import FaceBoxTracker
+from model_registry import MODELS
+
+
+class EmotionAnalyzer(FrameAnalyzer):
+    """Per‑frame emotion classification using HSEmotion on landmark-derived face crops."""
+
+    uses_face_mesh = True
+    FRAME_SCHEMA = [
+        Column('emotion', Categorical(['Neutral', 'Anger', 'Contempt', 'Disgust',
+                                       'Fear', 'Happiness', 'Sadness', 'Surprise'])),
+        Column('confidence', np.float32, 2),
+        # Overlay geometry: detected face box (x1, y1, x2, y2) normalized, NaN = no face
+        Column('face_box', np.float32, shape=(4,), export=False),
+    ]
+
+    def __init__(self, model_name='enet_b0_8_best_vgaf', device=None, batch_size=16, backend=None):
+        self.batch_size = max(1, batch_size)
+        # Face box from the shared FaceMesh landmarks; the detector is only
+        # created if a frame arrives without a mesh
+        self.box_tracker = FaceBoxTracker()
+        self.mp_face_detection = mp.solutions.face_detection
+        self.face_detection = None
+
+        self.backend = backend or os.environ.get("DECEPTRON_EMOTION_BACKEND", "torch")
+        self.model_name = model_name
+        self.device = device
+        # Recognizer is acquired from the shared registry on first use
+        self._fer = None
+
+    @property
+    def fer(self):
+        """The shared recognizer for this backend, loaded on first access."""
+        if self._fer is None:
+            if self.backend in ('onnx', 'onnx-int8'):
+                try:
+                    self._fer = MODELS.acquire('emotion-onnx', self.model_name, self.backend == 'onnx-int8')
+                    print(f"Emotion Detection Model loaded ({self._fer.model_path}, ONNX Runtime).")
+                    return self._fer
+                except Exception as e:
+                    print(f"ONNX emotion backend unavailable ({e}), falling back to PyTorch.")
+                    self.backend = 'torch'
+            if self.device is None:
+                self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+            self._fer = MODELS.acquire('hsemotion', self.model_name, self.device)
+            print("Model loaded successfully.")
+        return self._fer
+
+    def close(self):
+        """Release the shared recognizer (the next access acquires it again)."""
+        MODELS.release(self._fer)
+        self._fer = None
+
+    def reset(self, start_frame):
+        """Clamp the run range to the stream (emotion reports use it verbatim)."""
+        self.end_frame = min(self.end_frame, self.total_frames)
+        self.box_tracker.reset()
+        # Load the recognizer here so a load failure stops the run instead of
+        # being taken for a bad crop in _flush()
+        self.fer
+        # Frames waiting for their batch: (row, frame_idx, face crop or None, frame to draw or None)
+        self._pending = []
+        self._pending_crops = 0
+
+    def process_frame(self, frame_idx, frame, rgb, landmarks=None):
+        """Classify one decoded frame and append its record to frame_data.
 
+        Args:
+            frame_idx: 1‑based frame number
+            frame: BGR frame (shared with other analyzers – not modified)
+            rgb: the same frame converted to RGB once by the FrameSource
+            landmarks: shared FaceMesh landmarks (face box source; None = use detector)
+        """
+        if frame_idx > self.end_frame:
+            return
+        width, height = self.width, self.height
+        timestamp = frame_idx / self.fps
+        face_box = np.full(4, np.nan, dtype=np.float32)
+        face_crop = None
+
+        box = self.box_tracker.update(landmarks)
+        if box is None:
+            box = self._detect_box(rgb)
+
+        if box is not None:
+            x1 = max(0, int(box[0] * width))
+            y1 = max(0, int(box[1] * height))
+            x2 = min(width, int(box[2] * width))
+            y2 = min(height, int(box[3] * height))
+            face_box[:] = (x1 / width, y1 / height, x2 / width, y2 / height)
+
+            face_crop = frame[y1:y2, x1:x2]
+            # The frame buffer belongs to the FrameSource; keep our own copy until the batch runs
+            face_crop = face_crop.copy() if face_crop.size != 0 else None
+
+        # Emotion and confidence are filled in when the batch is classified
+        self.frame_data.append({
+            'frame_num': frame_idx,
+            'timestamp': timestamp,
+            'emotion': 'Neutral',
+            'confidence': 0.0,
+            'face_box': face_box
+        })
+        self._pending.append((len(self.frame_data) - 1, frame_idx, face_crop,
+                              frame.copy() if self._out is not None else None))
+        if face_crop is not None:
+            self._pending_crops += 1
+        if self._pending_crops >= self.batch_size:
+            self._flush()
+        # Do NOT close face_detection – allow pipeline reuse
 
-class EmotionAnalyzer:
-    """Per‑frame emotion classification using HSEmotion + MediaPipe Face Detection."""
+    def _detect_box(self, rgb):
+        """Fallback for frames without landmarks: normalized box of the first detected face."""
+        if self.face_detection is None:
+            self.face_detection = self.mp_face_detection.FaceDetection(
+                model_selection=1, min_detection_confidence=0.5)
+        results = self.face_detection.process(rgb)
+        if not results.detections:
+            return None
+        bbox = results.detections[0].location_data.relative_bounding_box
+        return np.array([bbox.xmin, bbox.ymin, bbox.xmin + bbox.width, bbox.ymin + bbox.height])
+
+    def _flush(self):
+        """Classify the pending face crops in one forward pass and fill in their records."""
+        pending, self._pending, self._pending_crops = self._pending, [], 0
+        crops = [(row, idx, crop) for row, idx, crop, _ in pending if crop is not None]
+        results = {}
+        if crops:
+            try:
+                # HSEmotion returns (labels, scores) with one row of class scores per crop
+                labels, scores = self.fer.predict_multi_emotions([c for _, _, c in crops], logits=False)
+                for (row, _, _), label, s in zip(crops, labels, scores):
+                    # confidence = highest score * 100
+                    results[row] = (label, float(np.max(s)) * 100)
+            except Exception:
+                # Retry one by one so a single bad crop only loses its own frame
+                for row, idx, crop in crops:
+                    try:
+                        label, s = self.fer.predict_emotions(crop, logits=False)
+                        results[row] = (label, float(max(s)) * 100)
+                    except Exception as e:
+                        if self.verbose:
+                            print(f"Frame {idx:04d}: prediction error - {e}")
 
-    def __init__(self, model_name='enet_b0_8_best_vgaf', device=None):
-        # Use Face Detection for accurate bounding boxes
-        self.mp_face_detection = mp.solutions.face_detection
-        self.face_detection = self.mp_face_detection.FaceDetection(
-            model_selection=1, min_detection_confidence=0.5)
-
-        if device is None:
-            device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        print(f"Loading Emotion Detection Model ({model_name}) on {device}...")
-        try:
-            self.fer = HSEmotionRecognizer(model_name=model_name, device=device)
-        except Exception as e:
-            if "WeightsUnpickler" in str(e) or "unpickle" in str(e):
-                print("Patching torch.load for compatibility...")
-                original_load = torch.load
-                torch.load = lambda *args, **kwargs: original_load(*args, **{**kwargs, 'weights_only': False})
-                self.fer = HSEmotionRecognizer(model_name=model_name, device=device)
-                torch.load = original_load
-            else:
-                raise e
-        print("Model loaded successfully.")
+        for row, idx, _, frame in pending:
+            emotion, confidence = results.get(row, ('Neutral', 0.0))
+            self.frame_data.set_row(row, {'emotion': emotion, 'confidence': round(confidence, 2)})
+            # Terminal output
+            if self.verbose:
+                print(f"Frame {idx:04d}: {emotion} ({confidence:.1f}%)")
+            if frame is not None:
+                self.draw_overlay(frame, self.frame_data.row(row))
+                self.write_frame(frame)
+
+    def finish(self):
+        self._flush()
+        return super().finish()
+
+    def draw_overlay(self, frame, rec, landmarks=None):
+        """Face box and emotion label of one cached record."""
+        box = rec['face_box']
+        if not np.isfinite(box).all():
+            return
+        height, width = frame.shape[:2]
+        x1, y1, x2, y2 = (box * (width, height, width, height)).round().astype(int).tolist()
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        label = f"{rec['emotion']} ({rec['confidence']:.1f}%)"
+        cv2.putText(frame, label, (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
 
     def process_video(self, input_path, output_path=None,
                       start_frame=None, end_frame=None,
@@ -58,102 +209,12 @@ class EmotionAnalyzer:
             scale: output resolution scale factor (1.0 = full, 0.667 = 720p for 1080p source)
 
         Returns:
-            list of dicts: [{'frame_num', 'timestamp', 'emotion', 'confidence'}, …]
+            FrameColumns with 'frame_num', 'timestamp', 'emotion', 'confidence'
+            (iterating it yields one dict per frame)
         """
-        cap = cv2.VideoCapture(input_path)
-        if not cap.isOpened():
-            raise ValueError(f"Cannot open video: {input_path}")
-
-        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        out_w, out_h = int(width * scale), int(height * scale)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-        if start_frame is None:
-            start_frame = 1
-        if end_frame is None:
-            end_frame = total_frames
-        start_frame = max(1, start_frame)
-        end_frame = min(total_frames, end_frame)
-
-        out = None
-        if output_path is not None:
-            fourcc = cv2.VideoWriter_fourcc(*'H264')
-            out = cv2.VideoWriter(output_path, fourcc, fps, (out_w, out_h))
-        frame_data = []
-        frame_idx = 0
-
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            frame_idx += 1
-            if frame_idx < start_frame:
-                continue
-            if frame_idx > end_frame:
-                break
-
-            timestamp = frame_idx / fps
-            emotion = 'Neutral'
-            confidence = 0.0
-
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.face_detection.process(rgb)
-
-            if results.detections:
-                detection = results.detections[0]
-                bbox = detection.location_data.relative_bounding_box
-                x = int(bbox.xmin * width)
-                y = int(bbox.ymin * height)
-                w = int(bbox.width * width)
-                h = int(bbox.height * height)
-
-                x1 = max(0, x)
-                y1 = max(0, y)
-                x2 = min(width, x + w)
-                y2 = min(height, y + h)
-
-                face_crop = frame[y1:y2, x1:x2]
-                if face_crop.size != 0:
-                    try:
-                        # HSEmotion returns (label, scores) where scores is array-like
-                        emotion, scores = self.fer.predict_emotions(face_crop, logits=False)
-                        # confidence = highest score * 100
-                        confidence = float(max(scores)) * 100
-                    except Exception as e:
-                        if verbose:
-                            print(f"Frame {frame_idx:04d}: prediction error - {e}")
-                        emotion = 'Neutral'
-                        confidence = 0.0
-
-                # Draw overlays (only for output video)
-                if out is not None:
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                    label = f"{emotion} ({confidence:.1f}%)"
-                    cv2.putText(frame, label, (x1, y1 - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-
-            # Terminal output
-            if verbose:
-                print(f"Frame {frame_idx:04d}: {emotion} ({confidence:.1f}%)")
-
-            frame_data.append({
-                'frame_num': frame_idx,
-                'timestamp': timestamp,
-                'emotion': emotion,
-                'confidence': round(confidence, 2)
-            })
-
-            if out is not None:
-                out.write(cv2.resize(frame, (out_w, out_h)) if scale != 1.0 else frame)
-
-        cap.release()
-        if out is not None:
-            out.release()
-        # Do NOT close face_detection – allow pipeline reuse
-
-        return frame_data
+        return super().process_video(input_path, output_path=output_path,
+                                     start_frame=start_frame, end_frame=end_frame,
+                                     verbose=verbose, scale=scale)
 
     def get_summary(self, frame_data):
         """Calculate distribution and timeline for API reporting."""
@@ -161,47 +222,28 @@ class EmotionAnalyzer:
             return {}
 
         # 1. Distribution
-        emotions = [f['emotion'] for f in frame_data]
-        counts = defaultdict(int)
-        for e in emotions:
-            counts[e] += 1
-        
         distribution = {}
-        for e, c in counts.items():
+        for e, c in frame_data.counts('emotion').items():
             distribution[e] = {
                 "count": c,
                 "percentage": round((c / len(frame_data)) * 100, 1)
             }
 
-        # 2. Timeline
+        # 2. Timeline (run-length encoded emotion codes)
         timeline = []
-        if emotions:
-            seq_start = frame_data[0]['frame_num']
-            seq_emo = emotions[0]
-            for i in range(1, len(emotions)):
-                if emotions[i] != seq_emo:
-                    end = frame_data[i-1]['frame_num']
-                    timeline.append({
-                        "start": seq_start,
-                        "end": end,
-                        "emotion": seq_emo,
-                        "frames": end - seq_start + 1
-                    })
-                    seq_start = frame_data[i]['frame_num']
-                    seq_emo = emotions[i]
-            end = frame_data[-1]['frame_num']
+        for start, end, (emo,) in frame_data.runs('emotion'):
             timeline.append({
-                "start": seq_start,
+                "start": start,
                 "end": end,
-                "emotion": seq_emo,
-                "frames": end - seq_start + 1
+                "emotion": emo,
+                "frames": end - start + 1
             })
 
         return {
             "total_frames": len(frame_data),
             "distribution": distribution,
             "timeline": timeline,
-            "frames": frame_data
+            "frames": frame_data.to_records()
         }
 
     def _print_report(self, data):
@@ -0,0 +1,238 @@
+"""
+emotion_onnx.py
+
+ONNX Runtime backend for the HSEmotion classifier (CPU deployments).
+export_onnx() converts the PyTorch model (backbone + classifier head) to
+ONNX with a dynamic batch axis and, optionally, a dynamically quantized
+int8 copy. OnnxEmotionRecognizer runs either file with the same
+preprocessing and the same predict_emotions / predict_multi_emotions
+interface as HSEmotionRecognizer, so EmotionAnalyzer can use it as a
+drop-in replacement.
+
+Export (and check label parity against torch on sample face crops):
+    python emotion_onnx.py [--video sample.mp4] [--model enet_b0_8_best_vgaf]
+
+Files (in myenv/local_models/emotion):
+    <model>.onnx, <model>.int8.onnx, <model>.json (labels, input size)
+
+Dependencies: onnxruntime (export also needs onnx, torch, hsemotion)
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+from model_registry import local_models_dir
+
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def model_paths(model_name, models_dir=None):
+    """(fp32 .onnx, int8 .onnx, metadata .json) paths of an exported model."""
+    d = Path(models_dir) if models_dir else local_models_dir("emotion")
+    return d / f"{model_name}.onnx", d / f"{model_name}.int8.onnx", d / f"{model_name}.json"
+
+
+class OnnxEmotionRecognizer:
+    """HSEmotionRecognizer-compatible classifier on ONNX Runtime (CPU)."""
+
+    def __init__(self, model_name='enet_b0_8_best_vgaf', quantized=False, models_dir=None, threads=None):
+        if ort is None:
+            raise ImportError("onnxruntime is not installed")
+        fp32_path, int8_path, meta_path = model_paths(model_name, models_dir)
+        path = int8_path if quantized else fp32_path
+        if not path.exists() or not meta_path.exists():
+            raise FileNotFoundError(f"ONNX emotion model not found: {path} (run emotion_onnx.py to export it)")
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.idx_to_class = {i: label for i, label in enumerate(meta['labels'])}
+        self.img_size = meta['img_size']
+        self.is_mtl = meta.get('is_mtl', False)
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(path), sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.model_path = str(path)
+
+    def _preprocess(self, face_img):
+        # Same steps as HSEmotion's torchvision transforms: PIL bilinear resize, /255, normalize
+        img = Image.fromarray(face_img).resize((self.img_size, self.img_size), Image.BILINEAR)
+        x = (np.asarray(img, dtype=np.float32) / 255.0 - MEAN) / STD
+        return x.transpose(2, 0, 1)
+
+    def _scores(self, face_img_list):
+        batch = np.stack([self._preprocess(img) for img in face_img_list]).astype(np.float32)
+        return self.session.run(None, {self.input_name: batch})[0].astype(np.float64)
+
+    def predict_multi_emotions(self, face_img_list, logits=True):
+        scores = self._scores(face_img_list)
+        x = scores[:, :-2] if self.is_mtl else scores
+        preds = np.argmax(x, axis=1)
+        if not logits:
+            e_x = np.exp(x - np.max(x, axis=1)[:, np.newaxis])
+            e_x = e_x / e_x.sum(axis=1)[:, None]
+            if self.is_mtl:
+                scores[:, :-2] = e_x
+            else:
+                scores = e_x
+        return [self.idx_to_class[p] for p in preds.tolist()], scores
+
+    def predict_emotions(self, face_img, logits=True):
+        labels, scores = self.predict_multi_emotions([face_img], logits=logits)
+        return labels[0], scores[0]
+
+
+def export_onnx(model_name='enet_b0_8_best_vgaf', models_dir=None, quantize=True):
+    """Export the HSEmotion model to ONNX (plus an int8 copy) and write its metadata.
+
+    Returns:
+        dict: {'fp32': path, 'int8': path or None, 'meta': path}
+    """
+    import torch
+    from hsemotion.facial_emotions import HSEmotionRecognizer
+
+    fp32_path, int8_path, meta_path = model_paths(model_name, models_dir)
+    fp32_path.parent.mkdir(parents=True, exist_ok=True)
+
+    original_load = torch.load
+    torch.load = lambda *args, **kwargs: original_load(*args, **{**kwargs, 'weights_only': False})
+    try:
+        fer = HSEmotionRecognizer(model_name=model_name, device='cpu')
+    finally:
+        torch.load = original_load
+
+    # HSEmotion strips the classifier head and applies it in NumPy; put it back for export
+    weights = torch.from_numpy(fer.classifier_weights)
+    head = torch.nn.Linear(weights.shape[1], weights.shape[0])
+    with torch.no_grad():
+        head.weight.copy_(weights)
+        head.bias.copy_(torch.from_numpy(fer.classifier_bias))
+    model = torch.nn.Sequential(fer.model, head).eval()
+
+    dummy = torch.zeros(1, 3, fer.img_size, fer.img_size)
+    print(f"Exporting {model_name} to {fp32_path} ...")
+    torch.onnx.export(model, dummy, str(fp32_path), input_names=['input'], output_names=['scores'],
+                      dynamic_axes={'input': {0: 'batch'}, 'scores': {0: 'batch'}}, opset_version=13)
+
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({'model_name': model_name,
+                   'labels': [fer.idx_to_class[i] for i in range(len(fer.idx_to_class))],
+                   'img_size': fer.img_size,
+                   'is_mtl': fer.is_mtl}, f, indent=2)
+
+    paths = {'fp32': str(fp32_path), 'int8': None, 'meta': str(meta_path)}
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        print(f"Quantizing to int8: {int8_path} ...")
+        quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QUInt8)
+        paths['int8'] = str(int8_path)
+    return paths
+
+
+def parity_check(reference, candidate, crops, batch_size=16):
+    """Compare two recognizers on the same face crops.
+
+    Returns:
+        dict: crops, label_agreement (%), max_score_diff (softmax), mismatches [crop index]
+    """
+    if not crops:
+        return {'crops': 0, 'label_agreement': 0.0, 'max_score_diff': 0.0, 'mismatches': []}
+    mismatches, max_diff = [], 0.0
+    for i in range(0, len(crops), batch_size):
+        batch = crops[i:i + batch_size]
+        ref_labels, ref_scores = reference.predict_multi_emotions(batch, logits=False)
+        cand_labels, cand_scores = candidate.predict_multi_emotions(batch, logits=False)
+        max_diff = max(max_diff, float(np.max(np.abs(np.asarray(ref_scores) - np.asarray(cand_scores)))))
+        mismatches += [i + k for k, (a, b) in enumerate(zip(ref_labels, cand_labels)) if a != b]
+    return {
+        'crops': len(crops),
+        'label_agreement': round((1 - len(mismatches) / len(crops)) * 100, 2),
+        'max_score_diff': round(max_diff, 5),
+        'mismatches': mismatches,
+    }
+
+
+def sample_face_crops(video_path, count=64):
+    """Face crops (BGR, like EmotionAnalyzer passes them) from evenly spaced frames."""
+    import cv2
+    import mediapipe as mp
+
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    step = max(1, total // count) if total > 0 else 1
+    crops = []
+    with mp.solutions.face_detection.FaceDetection(model_selection=1, min_detection_confidence=0.5) as detector:
+        frame_idx = 0
+        while len(crops) < count:
+            ret, frame = cap.read()
+            if not ret: break
+            frame_idx += 1
+            if frame_idx % step: continue
+            height, width = frame.shape[:2]
+            results = detector.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            if not results.detections: continue
+            bbox = results.detections[0].location_data.relative_bounding_box
+            x, y = int(bbox.xmin * width), int(bbox.ymin * height)
+            w, h = int(bbox.width * width), int(bbox.height * height)
+            crop = frame[max(0, y):min(height, y + h), max(0, x):min(width, x + w)]
+            if crop.size != 0:
+                crops.append(crop.copy())
+    cap.release()
+    return crops
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Export the HSEmotion model to ONNX / int8")
+    parser.add_argument("--model", default="enet_b0_8_best_vgaf", help="HSEmotion model name")
+    parser.add_argument("--video", help="Video to take face crops from for the parity check")
+    parser.add_argument("--no-quantize", action="store_true", help="Skip the int8 model")
+    args = parser.parse_args()
+
+    paths = export_onnx(args.model, quantize=not args.no_quantize)
+    print(f"[OK] Exported: {paths}")
+
+    if args.video:
+        crops = sample_face_crops(args.video)
+    else:
+        # No video: random crops still exercise the numerics, not the labels of real faces
+        rng = np.random.default_rng(0)
+        crops = [rng.integers(0, 256, (rng.integers(80, 300), rng.integers(80, 300), 3), dtype=np.uint8)
+                 for _ in range(32)]
+
+    import torch
+    from hsemotion.facial_emotions import HSEmotionRecognizer
+    original_load = torch.load
+    torch.load = lambda *a, **kw: original_load(*a, **{**kw, 'weights_only': False})
+    try:
+        reference = HSEmotionRecognizer(model_name=args.model, device='cpu')
+    finally:
+        torch.load = original_load
+
+    for quantized in ([False] if args.no_quantize else [False, True]):
+        candidate = OnnxEmotionRecognizer(args.model, quantized=quantized)
+        result = parity_check(reference, candidate, crops)
+        t0 = time.perf_counter()
+        for crop in crops[:16]:
+            reference.predict_emotions(crop, logits=False)
+        t_ref = (time.perf_counter() - t0) / max(1, min(16, len(crops)))
+        t0 = time.perf_counter()
+        for crop in crops[:16]:
+            candidate.predict_emotions(crop, logits=False)
+        t_cand = (time.perf_counter() - t0) / max(1, min(16, len(crops)))
+        print(f"{os.path.basename(candidate.model_path)}: {result['label_agreement']}% label agreement "
+              f"over {result['crops']} crops, max score diff {result['max_score_diff']}, "
+              f"{t_ref * 1000:.1f} ms -> {t_cand * 1000:.1f} ms per crop")
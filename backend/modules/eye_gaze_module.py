@@ -1,20 +1,28 @@
 import cv2
-import mediapipe as mp
 import numpy as np
 import os
+from frame_source import FrameAnalyzer
+from frame_columns import Categorical, Column
 
-class EyeGazeAnalyzer:
-    """Analyzes eye gaze direction and blink detection."""
+class EyeGazeAnalyzer(FrameAnalyzer):
+    """Analyzes eye gaze direction and blink detection.
+
+    EAR, iris ratio and blink detection are whole-array operations over an
+    (N, 478, 2+) landmark tensor; process_frame() runs them on one frame,
+    process_landmarks() on a whole segment at once.
+    """
+
+    uses_face_mesh = True
+    batch_landmarks = True
+    GAZE_LABELS = ['CENTER', 'LEFT', 'RIGHT']
+    FRAME_SCHEMA = [
+        Column('ear', np.float32, 3),
+        Column('gaze', Categorical(GAZE_LABELS)),
+        Column('blink_count', np.int32),
+    ]
+    SUMMARY_STATE = ('blink_timestamps',)
 
     def __init__(self):
-        self.mp_face_mesh = mp.solutions.face_mesh
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            static_image_mode=False,
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
         self.LEFT_EYE = [362, 382, 381, 380, 374, 373, 390, 249, 263, 466, 388, 387, 386, 385, 384, 398]
         self.RIGHT_EYE = [33, 7, 163, 144, 145, 153, 154, 155, 133, 173, 157, 158, 159, 160, 161, 246]
         self.LEFT_IRIS = [474, 475, 476, 477]
@@ -26,102 +34,122 @@ class EyeGazeAnalyzer:
         
         self.EAR_THRESHOLD = 0.22
         self.BLINK_FRAME_CONSEC = 2
+        # Frame sampling stays at full rate while the EAR is this close to a blink
+        self.BLINK_MARGIN = 0.04
         self.blink_counter = 0
         self.total_blinks = 0
         self.blink_timestamps = []
 
-    def get_ear(self, eye_pts):
-        v1 = np.linalg.norm(eye_pts[12] - eye_pts[4])
-        v2 = np.linalg.norm(eye_pts[14] - eye_pts[2])
-        h = np.linalg.norm(eye_pts[0] - eye_pts[8])
-        return (v1 + v2) / (2.0 * h)
-
-    def process_video(self, input_path, output_path=None, start_frame=None, end_frame=None, verbose=True, scale=1.0):
-        cap = cv2.VideoCapture(input_path)
-        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        out_w, out_h = int(width * scale), int(height * scale)
-        total_f = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        if start_frame is None: start_frame = 1
-        if end_frame is None: end_frame = total_f
-        
-        out = None
-        if output_path:
-            fourcc = cv2.VideoWriter_fourcc(*'H264'); out = cv2.VideoWriter(output_path, fourcc, fps, (out_w, out_h))
-        frame_data, frame_idx = [], 0
+        # EAR point pairs per eye: two vertical distances, then the eye width
+        self._ear_idx = np.array([[eye[12], eye[4], eye[14], eye[2], eye[0], eye[8]]
+                                  for eye in (self.LEFT_EYE, self.RIGHT_EYE)])
+
+    def ear_batch(self, lms):
+        """Mean EAR of both eyes for normalized landmarks (N, 478, 2+) -> (N,)."""
+        pts = lms[:, self._ear_idx, :2] * (self.width, self.height)   # (N, 2 eyes, 6, 2)
+        d = np.linalg.norm(pts[:, :, 0::2] - pts[:, :, 1::2], axis=-1)  # (N, 2, 3)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ear = (d[..., 0] + d[..., 1]) / (2.0 * d[..., 2])
+        return ear.mean(axis=1)
+
+    def gaze_batch(self, lms):
+        """Gaze codes (CENTER / LEFT / RIGHT) from the left iris position, (N, 478, 2+) -> (N,)."""
+        scale = (self.width, self.height)
+        iris = np.mean(lms[:, self.LEFT_IRIS, :2] * scale, axis=1)
+        left = lms[:, self.L_EYE_LEFT, :2] * scale
+        right = lms[:, self.L_EYE_RIGHT, :2] * scale
+        total_w = np.linalg.norm(left - right, axis=-1)
+        ratio = np.divide(np.linalg.norm(iris - left, axis=-1), total_w,
+                          out=np.full(len(total_w), 0.5), where=total_w > 0)
+        return np.select([ratio < 0.4, ratio > 0.6], [1, 2], 0).astype(np.uint8)  # GAZE_LABELS codes
+
+    def blink_batch(self, ear):
+        """Blink events over consecutive face frames: a blink ends on the first
+        open-eye frame after >= BLINK_FRAME_CONSEC closed frames.
+
+        Returns:
+            (blink (N,) bool, closed frames still open at the end)
+        """
+        closed = ear < self.EAR_THRESHOLD
+        n = np.cumsum(closed)
+        run = n - np.maximum.accumulate(np.where(closed, 0, n))  # closed-run length ending here
+        # The run in progress when the segment starts carries over from the previous call
+        run = run + self.blink_counter * (n == np.arange(1, len(closed) + 1))
+        blink = np.zeros(len(closed), dtype=bool)
+        if len(closed):
+            prev = np.concatenate([[self.blink_counter], run[:-1]])
+            blink = ~closed & (prev >= self.BLINK_FRAME_CONSEC)
+        return blink, int(run[-1]) if len(run) else self.blink_counter
+
+    def needs_full_rate(self, landmarks):
+        """Blinks last only a few frames: never skip frames around an EAR dip."""
+        if landmarks is None: return False
+        return self.ear_batch(landmarks[None])[0] < self.EAR_THRESHOLD + self.BLINK_MARGIN
+
+    def reset(self, start_frame):
+        self.blink_counter = 0
         self.total_blinks = 0; self.blink_timestamps = []
 
-        while True:
-            ret, frame = cap.read()
-            if not ret: break
-            frame_idx += 1
-            if frame_idx < start_frame: continue
-            if frame_idx > end_frame: break
-
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            res = self.face_mesh.process(rgb)
-            ear, gaze = 0.0, "CENTER"
-
-            if res.multi_face_landmarks:
-                mesh = res.multi_face_landmarks[0].landmark
-                l_pts = np.array([(mesh[p].x * width, mesh[p].y * height) for p in self.LEFT_EYE])
-                r_pts = np.array([(mesh[p].x * width, mesh[p].y * height) for p in self.RIGHT_EYE])
-                ear = (self.get_ear(l_pts) + self.get_ear(r_pts)) / 2.0
-                
-                if ear < self.EAR_THRESHOLD:
-                    self.blink_counter += 1
-                else:
-                    if self.blink_counter >= self.BLINK_FRAME_CONSEC:
-                        self.total_blinks += 1
-                        self.blink_timestamps.append(round(frame_idx / fps, 2))
-                    self.blink_counter = 0
-                
-                l_iris = np.mean([(mesh[p].x * width, mesh[p].y * height) for p in self.LEFT_IRIS], axis=0)
-                l_left = np.array((mesh[self.L_EYE_LEFT].x * width, mesh[self.L_EYE_LEFT].y * height))
-                l_right = np.array((mesh[self.L_EYE_RIGHT].x * width, mesh[self.L_EYE_RIGHT].y * height))
-                
-                total_w = np.linalg.norm(l_left - l_right)
-                if total_w > 0:
-                    ratio = np.linalg.norm(l_iris - l_left) / total_w
-                    if ratio < 0.4: gaze = "LEFT"
-                    elif ratio > 0.6: gaze = "RIGHT"
-                
-                if out:
-                    for p in self.LEFT_EYE + self.RIGHT_EYE: cv2.circle(frame, (int(mesh[p].x*width), int(mesh[p].y*height)), 1, (0,255,0), -1)
-                    cv2.putText(frame, f"EAR: {ear:.2f} Blinks: {self.total_blinks} Gaze: {gaze}", (10,30), 0, 0.7, (0,0,255), 2)
-
-            if out: out.write(cv2.resize(frame, (out_w, out_h)) if scale != 1.0 else frame)
-            frame_data.append({'frame_num': frame_idx, 'timestamp': frame_idx/fps, 'ear': round(ear, 3), 'gaze': gaze, 'blink_count': self.total_blinks})
-            if verbose and frame_idx % 30 == 0: print(f"Gaze Processed: {frame_idx}/{end_frame}")
-
-        cap.release()
-        if out: out.release()
-        return frame_data
+    def process_frame(self, frame_idx, frame, rgb, landmarks=None):
+        ear, gaze = 0.0, "CENTER"
+
+        if landmarks is not None:
+            ear = float(self.ear_batch(landmarks[None])[0])
+            gaze = self.GAZE_LABELS[self.gaze_batch(landmarks[None])[0]]
+            blink, self.blink_counter = self.blink_batch(np.array([ear]))
+            if blink[0]:
+                self.total_blinks += 1
+                self.blink_timestamps.append(round(frame_idx / self.fps, 2))
+
+        self.frame_data.append({'frame_num': frame_idx, 'timestamp': frame_idx/self.fps, 'ear': round(ear, 3), 'gaze': gaze, 'blink_count': self.total_blinks})
+        self.write_overlay(frame, landmarks)
+        if self.verbose and frame_idx % 30 == 0: print(f"Gaze Processed: {frame_idx}/{self.end_frame}")
+
+    def process_landmarks(self, store):
+        """Whole-segment form of process_frame over a LandmarkStore."""
+        nums, present = store.frame_nums, store.present
+        keep = (nums >= self.start_frame) & (nums <= self.end_frame)
+        nums, present, lms = nums[keep], present[keep], store.coords[keep]
+
+        ear = np.zeros(len(nums))
+        gaze = np.zeros(len(nums), dtype=np.uint8)
+        blink = np.zeros(len(nums), dtype=bool)
+        face = lms[present]
+        ear[present] = self.ear_batch(face)
+        gaze[present] = self.gaze_batch(face)
+        blink[present], self.blink_counter = self.blink_batch(ear[present])
+
+        blink_count = self.total_blinks + np.cumsum(blink)
+        self.total_blinks = int(blink_count[-1]) if len(nums) else self.total_blinks
+        self.blink_timestamps += [round(int(f) / self.fps, 2) for f in nums[blink]]
+        self.frame_data.extend({'frame_num': nums, 'ear': np.round(ear, 3), 'gaze': gaze, 'blink_count': blink_count})
+        if self.verbose: print(f"Gaze Processed: {len(nums)} frames")
+
+    def draw_overlay(self, frame, rec, landmarks=None):
+        if landmarks is None: return
+        height, width = frame.shape[:2]
+        pts = landmarks[:, :2] * (width, height)
+        for p in self.LEFT_EYE + self.RIGHT_EYE: cv2.circle(frame, (int(pts[p][0]), int(pts[p][1])), 1, (0,255,0), -1)
+        cv2.putText(frame, f"EAR: {rec['ear']:.2f} Blinks: {rec['blink_count']} Gaze: {rec['gaze']}", (10,30), 0, 0.7, (0,0,255), 2)
 
     def get_summary(self, data):
         if not data: return {}
-        gazes = [d['gaze'] for d in data]
-        dist = {g: round(gazes.count(g)/len(gazes)*100, 1) for g in set(gazes)}
+        dist = data.distribution('gaze')
         
         # Timeline of Gaze
-        timeline = []
-        if data:
-            start_f = data[0]['frame_num']
-            curr_g = data[0]['gaze']
-            for i in range(1, len(data)):
-                if data[i]['gaze'] != curr_g:
-                    timeline.append({"start_frame": start_f, "end_frame": data[i-1]['frame_num'], "gaze": curr_g})
-                    start_f = data[i]['frame_num']; curr_g = data[i]['gaze']
-            timeline.append({"start_frame": start_f, "end_frame": data[-1]['frame_num'], "gaze": curr_g})
+        timeline = [{"start_frame": s, "end_frame": e, "gaze": g} for s, e, (g,) in data.runs('gaze')]
+
+        # data may be a slice of a longer run: only report blinks inside it
+        t0, t1 = round(data[0]['timestamp'], 2), round(data[-1]['timestamp'], 2)
+        blink_ts = [t for t in self.blink_timestamps if t0 <= t <= t1]
 
         return {
             "total_frames": len(data),
-            "blinks": {"total": self.total_blinks, "timestamps": self.blink_timestamps, "rate_per_min": round(self.total_blinks / (len(data)/30) * 60, 1) if data else 0},
+            "blinks": {"total": len(blink_ts), "timestamps": blink_ts, "rate_per_min": round(len(blink_ts) / (len(data)/30) * 60, 1) if data else 0},
             "distribution": dist,
-            "averages": {"ear": round(np.mean([d['ear'] for d in data]), 3)},
+            "averages": {"ear": round(data.mean('ear'), 3)},
             "timeline": timeline,
-            "frames": data  # Export every single frame's raw data
+            "frames": data.to_records()  # Export every single frame's raw data
         }
 
     def _print_report(self, data):
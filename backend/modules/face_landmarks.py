@@ -0,0 +1,230 @@
+"""
+face_landmarks.py
+
+Shared FaceMesh landmark stage.
+Runs a single refined MediaPipe FaceMesh per frame and hands every face
+module the same compact (478, 3) float32 array of normalized landmarks
+(x, y in [0, 1] of the frame, z relative depth), or None if no face.
+
+Once a face is found, FaceMesh runs on a padded crop around it (tracked
+by RegionTracker) instead of the full frame, and the landmarks are mapped
+back to full-frame coordinates; the full frame is searched again only
+when the face is lost inside the crop.
+
+Classes:
+    FaceLandmarkExtractor(roi=True)
+        extract(rgb) -> np.ndarray (478, 3) or None
+    RegionTracker(pad, max_area)
+        update(landmarks, width, height) -> pixel window or None (= full frame)
+        crop(image), to_frame(points, width, height)
+    LandmarkStore
+        add(frame_idx, landmarks), get(frame_idx)
+        coords (N, 478, 3) float32, present (N,) bool, frame_nums (N,) int32
+        from_arrays(start_frame, coords, present)
+    FaceBoxTracker(margin, smoothing)
+        update(landmarks) -> normalized (x1, y1, x2, y2) face box or None
+"""
+
+import mediapipe as mp
+import numpy as np
+
+NUM_LANDMARKS = 478
+
+
+class FaceLandmarkExtractor:
+    """FaceMesh (refined landmarks) for one decode run, on a face crop when possible."""
+
+    def __init__(self, roi=True):
+        # FaceMesh keeps tracking state between frames, so each FrameSource
+        # run gets its own instances rather than sharing them across runs.
+        # Full frames and crops get separate graphs so each one tracks in
+        # consistent image coordinates.
+        self.face_mesh = self._new_mesh()
+        self.roi = RegionTracker(pad=0.5) if roi else None
+        self.roi_mesh = self._new_mesh() if roi else None
+
+    @staticmethod
+    def _new_mesh():
+        return mp.solutions.face_mesh.FaceMesh(
+            static_image_mode=False,
+            max_num_faces=1,
+            refine_landmarks=True,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
+
+    @staticmethod
+    def _run(mesh, rgb):
+        res = mesh.process(rgb)
+        if not res.multi_face_landmarks:
+            return None
+        lms = res.multi_face_landmarks[0].landmark
+        return np.array([(p.x, p.y, p.z) for p in lms], dtype=np.float32)
+
+    def extract(self, rgb):
+        if self.roi is None:
+            return self._run(self.face_mesh, rgb)
+        height, width = rgb.shape[:2]
+        landmarks = None
+        if self.roi.window is not None:
+            landmarks = self._run(self.roi_mesh, self.roi.crop(rgb))
+            if landmarks is not None:
+                landmarks = self.roi.to_frame(landmarks, width, height)
+        if landmarks is None:
+            # No window yet, or the face was lost inside it: search the full frame
+            landmarks = self._run(self.face_mesh, rgb)
+        self.roi.update(landmarks, width, height)
+        return landmarks
+
+    def close(self):
+        self.face_mesh.close()
+        if self.roi_mesh is not None:
+            self.roi_mesh.close()
+
+
+class LandmarkStore:
+    """Landmarks of a contiguous frame range with a per-frame presence mask."""
+
+    def __init__(self, start_frame, capacity=0):
+        self.start_frame = start_frame
+        capacity = max(1, capacity)
+        self._coords = np.zeros((capacity, NUM_LANDMARKS, 3), dtype=np.float32)
+        self._present = np.zeros(capacity, dtype=bool)
+        self._count = 0
+
+    @classmethod
+    def from_arrays(cls, start_frame, coords, present):
+        """Store over saved arrays; coords may hold x, y only (z is then 0)."""
+        store = cls(start_frame, capacity=len(present))
+        store._coords[:, :, :coords.shape[2]] = coords
+        store._present[:] = present
+        store._count = len(present)
+        return store
+
+    def __len__(self):
+        return self._count
+
+    def add(self, frame_idx, landmarks):
+        i = frame_idx - self.start_frame
+        if i < 0:
+            return
+        if i >= len(self._present):
+            self._grow(i + 1)
+        if landmarks is not None:
+            self._coords[i] = landmarks
+            self._present[i] = True
+        self._count = max(self._count, i + 1)
+
+    def get(self, frame_idx):
+        i = frame_idx - self.start_frame
+        if 0 <= i < self._count and self._present[i]:
+            return self._coords[i]
+        return None
+
+    @property
+    def coords(self):
+        return self._coords[:self._count]
+
+    @property
+    def present(self):
+        return self._present[:self._count]
+
+    @property
+    def frame_nums(self):
+        return np.arange(self.start_frame, self.start_frame + self._count, dtype=np.int32)
+
+    def _grow(self, needed):
+        capacity = max(needed, len(self._present) * 2)
+        coords = np.zeros((capacity, NUM_LANDMARKS, 3), dtype=np.float32)
+        present = np.zeros(capacity, dtype=bool)
+        coords[:len(self._present)] = self._coords
+        present[:len(self._present)] = self._present
+        self._coords, self._present = coords, present
+
+
+class RegionTracker:
+    """Padded pixel window around the face, kept steady across frames.
+
+    The window spans the landmark extent plus `pad` face sizes on each side.
+    It is only re-centred when the face gets close to its edge or changes
+    size noticeably, so tracking models keep seeing a stable crop. When the
+    window would cover most of the frame anyway (max_area), or there is no
+    face, window is None and the full frame should be used.
+    """
+
+    def __init__(self, pad=0.5, max_area=0.6):
+        self.pad = pad
+        self.max_area = max_area
+        self.window = None
+
+    def reset(self):
+        self.window = None
+
+    def update(self, landmarks, width, height):
+        if landmarks is None:
+            self.window = None
+            return None
+        lo = landmarks[:, :2].min(axis=0) * (width, height)
+        hi = landmarks[:, :2].max(axis=0) * (width, height)
+        size = np.maximum(hi - lo, 1.0)
+        if self.window is not None:
+            x0, y0, x1, y1 = self.window
+            margin = size * self.pad * 0.5
+            inside = (lo - margin >= (x0, y0)).all() and (hi + margin <= (x1, y1)).all()
+            scale = np.array([x1 - x0, y1 - y0]) / (size * (1 + 2 * self.pad))
+            if inside and (np.abs(scale - 1) < 0.3).all():
+                return self.window
+        center, half = (lo + hi) / 2, size * (0.5 + self.pad)
+        x0, y0 = np.maximum(np.floor(center - half), 0).astype(int).tolist()
+        x1, y1 = np.minimum(np.ceil(center + half), (width, height)).astype(int).tolist()
+        if x1 - x0 < 2 or y1 - y0 < 2 or (x1 - x0) * (y1 - y0) >= self.max_area * width * height:
+            self.window = None
+        else:
+            self.window = (x0, y0, x1, y1)
+        return self.window
+
+    def crop(self, image):
+        x0, y0, x1, y1 = self.window
+        return np.ascontiguousarray(image[y0:y1, x0:x1])
+
+    def to_frame(self, points, width, height):
+        """Map normalized crop coordinates (x, y[, z]) to normalized full-frame coordinates."""
+        x0, y0, x1, y1 = self.window
+        out = np.array(points, dtype=np.float32)
+        out[..., 0] = (out[..., 0] * (x1 - x0) + x0) / width
+        out[..., 1] = (out[..., 1] * (y1 - y0) + y0) / height
+        if out.shape[-1] > 2:
+            # MediaPipe z is in units of the input image width
+            out[..., 2] *= (x1 - x0) / width
+        return out
+
+
+class FaceBoxTracker:
+    """Face bounding box from the landmark extents, smoothed across frames.
+
+    Replaces a separate face detector for modules that only need a crop:
+    the box is the x/y extent of the mesh plus a relative margin, blended
+    with the previous frame's box (exponential moving average). Tracking
+    restarts whenever a frame has no landmarks.
+    """
+
+    def __init__(self, margin=0.05, smoothing=0.5):
+        self.margin = margin
+        self.smoothing = smoothing
+        self._box = None
+
+    def reset(self):
+        self._box = None
+
+    def update(self, landmarks):
+        if landmarks is None:
+            self._box = None
+            return None
+        xy = landmarks[:, :2]
+        lo, hi = xy.min(axis=0), xy.max(axis=0)
+        pad = (hi - lo) * self.margin
+        box = np.clip(np.concatenate([lo - pad, hi + pad]), 0.0, 1.0).astype(np.float32)
+        if self._box is not None:
+            box = self.smoothing * self._box + (1 - self.smoothing) * box
+        self._box = box
+        return box
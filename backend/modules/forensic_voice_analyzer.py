@@ -10,61 +10,53 @@ Class:
     ForensicVoiceAnalyzer
         calibrate(neutral_wav_path)
         analyze(wav_path) -> dict
-        analyze_segment(wav_path, start, end) -> dict
+        analyze_segment(audio, start, end, sample_range=None) -> dict (audio: SessionAudio or WAV path)
+        close() - releases the shared Whisper model
         generate_report(result, output_path)
 """
 
 import json
 import os
-import sys
 import uuid
-from pathlib import Path
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
 import numpy as np
 import soundfile as sf
+from numpy.lib.stride_tricks import sliding_window_view
 import parselmouth
 
-try:
-    import whisper
-except ImportError:
-    raise ImportError(
-        "OpenAI Whisper is required. Install with: pip install openai-whisper"
-    )
-
 # We do NOT import librosa anywhere that could trigger the lazy loading.
 # Only use librosa.resample if needed – that function is safe.
 import librosa as _librosa_resample_only
 
+from session_audio import SessionAudio
+from whisper_strategy import WhisperTranscriber
+from model_registry import MODELS
+
+# Frame layouts of the framed features (in samples)
+RMS_FRAME_LENGTH, RMS_HOP_LENGTH = 1024, 256
+SPECTRAL_FRAME_LENGTH, SPECTRAL_HOP_LENGTH = 2048, 512
+SILENCE_RMS = 0.01
+FRAME_BLOCK = 2048   # frames per RMS/rFFT batch
+
 
 class ForensicVoiceAnalyzer:
     """Forensic voice analyzer – acoustic features + transcription."""
 
     def __init__(self, whisper_model_size: str = "base"):
-        # Resolve base directory (Handles PyInstaller .exe mode)
-        if getattr(sys, 'frozen', False):
-            # Prioritize internal bundled models
-            base_path = Path(sys._MEIPASS)
-        else:
-            base_path = Path(__file__).resolve().parent.parent
-
-        models_dir = base_path / "myenv" / "local_models" / "whisper"
-        
-        # Fallback to external directory if not found inside EXE
-        if getattr(sys, 'frozen', False) and not models_dir.exists():
-            models_dir = Path(sys.executable).parent / "myenv" / "local_models" / "whisper"
-
-        print(f"Loading Whisper model '{whisper_model_size}' from {models_dir} …")
-        
-        try:
-            self.whisper_model = whisper.load_model(whisper_model_size, download_root=str(models_dir))
-        except Exception:
-            self.whisper_model = whisper.load_model(whisper_model_size)
-            
+        # Shared with the segment manager and every other consumer of this size
+        self.whisper_model = MODELS.acquire('whisper', whisper_model_size)
+        # One encoder pass per clip for both transcript and translation
+        self.transcriber = WhisperTranscriber(self.whisper_model)
         self.sample_rate = 16000
         self.baseline = None
 
+    def close(self):
+        """Release the shared Whisper model."""
+        MODELS.release(self.whisper_model)
+        self.whisper_model = self.transcriber = None
+
     # Public API
     def calibrate(self, neutral_wav_path: str) -> Dict[str, float]:
         features = self._analyze_core_from_file(neutral_wav_path)
@@ -80,6 +72,7 @@ class ForensicVoiceAnalyzer:
         y, sr = self._load_audio(wav_path)
         if y is None:
             return None
+        y = y.astype(np.float64, copy=False)
         duration = len(y) / sr
 
         core = self._analyze_core_from_array(y, sr, duration)
@@ -106,9 +99,16 @@ class ForensicVoiceAnalyzer:
         self._print_mini_report(result, wav_path)
         return result
 
-    def analyze_segment(self, wav_path: str, start: float, end: float,
-                        suppress_terminal: bool = False) -> Optional[Dict[str, Any]]:
-        y_full, sr = self._load_audio(wav_path)
+    def analyze_segment(self, audio, start: float, end: float,
+                        suppress_terminal: bool = False,
+                        sample_range: Optional[tuple] = None) -> Optional[Dict[str, Any]]:
+        """Analyze [start, end] seconds of a SessionAudio (sliced in place) or a WAV file.
+
+        sample_range: (start_sample, end_sample) of the segment in the audio,
+        as handed off by SegmentManager; sliced as-is instead of converting
+        start/end again.
+        """
+        y_full, sr = self._load_audio(audio)
         if y_full is None:
             return None
         full_dur = len(y_full) / sr
@@ -126,8 +126,11 @@ class ForensicVoiceAnalyzer:
             print(f"Segment [{start}-{end}] out of range (duration {full_dur}s).")
             return None
 
-        sample_start = int(start * sr)
-        sample_end = int(end * sr)
+        if sample_range is not None:
+            sample_start, sample_end = sample_range
+        else:
+            sample_start = int(start * sr)
+            sample_end = int(end * sr)
         y_seg = y_full[sample_start:sample_end].astype(np.float64)
         seg_duration = end - start
 
@@ -148,11 +151,8 @@ class ForensicVoiceAnalyzer:
         original_text = ""
         english_text = ""
         try:
-            audio_whisper = y_seg.astype(np.float32)
-            res_orig = self.whisper_model.transcribe(audio_whisper, task="transcribe")
-            original_text = res_orig['text'].strip()
-            res_en = self.whisper_model.transcribe(audio_whisper, task="translate")
-            english_text = res_en['text'].strip()
+            transcript = self.transcriber.transcribe(y_seg.astype(np.float32))
+            original_text, english_text = transcript['text'], transcript['english']
         except Exception as e:
             print(f"Segment transcription failed: {e}")
 
@@ -212,7 +212,13 @@ class ForensicVoiceAnalyzer:
         print(f"Report saved to {output_path}")
 
     # Audio loading (soundfile, no librosa.load)
-    def _load_audio(self, path: str):
+    def _load_audio(self, path):
+        """(samples, sample rate) of a file, or of a SessionAudio without copying it."""
+        if isinstance(path, SessionAudio):
+            if path.sample_rate == self.sample_rate:
+                return path.samples, path.sample_rate
+            y = _librosa_resample_only.resample(path.samples, orig_sr=path.sample_rate, target_sr=self.sample_rate)
+            return y.astype(np.float64), self.sample_rate
         try:
             y, orig_sr = sf.read(path)
             if y.ndim > 1:
@@ -231,7 +237,7 @@ class ForensicVoiceAnalyzer:
         if y is None:
             return None
         duration = len(y) / sr
-        return self._analyze_core_from_array(y, sr, duration)
+        return self._analyze_core_from_array(y.astype(np.float64, copy=False), sr, duration)
 
     def _analyze_core_from_array(self, y: np.ndarray, sr: int,
                                  duration: float) -> Optional[Dict[str, Any]]:
@@ -241,11 +247,11 @@ class ForensicVoiceAnalyzer:
         f0_stats = self._extract_f0(snd)
         tremor_stats = self._extract_tremors(snd)
         hnr_stats = self._extract_hnr(snd)
-        temporal_stats = self._extract_temporal(y, sr, duration)
-        energy_stats = self._extract_energy(y, sr)
-
-        # Compute spectral centroid with pure numpy
-        cent_mean, cent_std = self._compute_spectral_centroid(y, sr)
+        # RMS, silence mask, centroids and ZCR in one framing pass
+        feats = self._frame_features(y, sr)
+        temporal_stats = self._extract_temporal(feats, sr, duration)
+        energy_stats = self._extract_energy(feats)
+        cent_mean, cent_std = self._compute_spectral_centroid(feats)
 
         return {
             "audio_duration_sec": round(duration, 3),
@@ -268,66 +274,71 @@ class ForensicVoiceAnalyzer:
             print(f"Cannot create Parselmouth Sound from array: {e}")
             return None
 
+    # Framed features (pure numpy): one strided frame view per frame layout
+    def _frame_features(self, y: np.ndarray, sr: int) -> Dict[str, Any]:
+        """RMS, silence mask, spectral centroids and zero-crossing rate of y.
+
+        Frames are sliding_window_view slices of y (no copies); the RMS and
+        batched rFFT run over blocks of FRAME_BLOCK frames so long files do
+        not materialize every frame at once. Values are identical to the
+        former frame-by-frame loops.
+        """
+        # RMS: 1024-sample frames every 256 samples
+        num_frames = max(0, 1 + (len(y) - RMS_FRAME_LENGTH) // RMS_HOP_LENGTH)
+        rms = np.zeros(num_frames)
+        if num_frames:
+            frames = sliding_window_view(y, RMS_FRAME_LENGTH)[::RMS_HOP_LENGTH]
+            for b in range(0, num_frames, FRAME_BLOCK):
+                block = frames[b:min(b + FRAME_BLOCK, num_frames)]
+                rms[b:b + len(block)] = np.sqrt(np.mean(block ** 2, axis=1))
+
+        # Spectral centroid: 2048-sample frames every 512 samples
+        num_frames = len(range(0, len(y) - SPECTRAL_FRAME_LENGTH, SPECTRAL_HOP_LENGTH))
+        centroids = np.zeros(num_frames)
+        if num_frames:
+            freqs = np.fft.rfftfreq(SPECTRAL_FRAME_LENGTH, 1 / sr)
+            frames = sliding_window_view(y, SPECTRAL_FRAME_LENGTH)[::SPECTRAL_HOP_LENGTH]
+            for b in range(0, num_frames, FRAME_BLOCK):
+                spectrum = np.abs(np.fft.rfft(frames[b:min(b + FRAME_BLOCK, num_frames)], axis=1))
+                total = np.sum(spectrum, axis=1)
+                weighted = np.sum(freqs * spectrum, axis=1)
+                centroids[b:b + len(total)] = np.divide(weighted, total, out=np.zeros_like(total), where=total > 0)
+
+        return {
+            "rms": rms,
+            "silent": rms < SILENCE_RMS,
+            "centroids": centroids,
+            "zcr": np.sum(np.abs(np.diff(np.sign(y)))) / (2 * len(y)) if len(y) else 0.0
+        }
+
     # Spectral centroid (pure numpy)
-    def _compute_spectral_centroid(self, y, sr):
-        """Compute mean and std of spectral centroid using numpy FFT."""
-        try:
-            frame_length = 2048
-            hop_length = 512
-            frames = [y[i:i+frame_length] for i in range(0, len(y)-frame_length, hop_length)]
-            centroids = []
-            for frame in frames:
-                spectrum = np.abs(np.fft.rfft(frame))
-                freqs = np.fft.rfftfreq(frame_length, 1/sr)
-                if np.sum(spectrum) > 0:
-                    cent = np.sum(freqs * spectrum) / np.sum(spectrum)
-                else:
-                    cent = 0
-                centroids.append(cent)
-            if centroids:
-                return float(np.mean(centroids)), float(np.std(centroids))
-        except:
-            pass
+    def _compute_spectral_centroid(self, feats):
+        """Mean and std of the per-frame spectral centroid."""
+        centroids = feats["centroids"]
+        if len(centroids):
+            return float(np.mean(centroids)), float(np.std(centroids))
         return 0.0, 0.0
 
     # Temporal dynamics (pure numpy)
-    def _extract_temporal(self, y: np.ndarray, sr: int, duration: float) -> Dict[str, Any]:
-        # 1. Compute RMS energy manually
-        frame_length = 1024
-        hop_length = 256
-        num_frames = 1 + (len(y) - frame_length) // hop_length
-        rms = np.zeros(num_frames)
-        for i in range(num_frames):
-            segment = y[i*hop_length : i*hop_length + frame_length]
-            rms[i] = np.sqrt(np.mean(segment**2))
+    def _extract_temporal(self, feats: Dict[str, Any], sr: int, duration: float) -> Dict[str, Any]:
+        rms = feats["rms"]
 
-        # 2. Syllable rate via RMS peaks
+        # Syllable rate via RMS peaks
         rms_mean = np.mean(rms)
         peak_frames = (rms > rms_mean * 1.2).astype(int)
         syllable_count = np.sum(np.diff(peak_frames) == 1)
         sps = syllable_count / duration if duration > 0 else 0
         wpm = sps * 60 / 2
 
-        # 3. Silence detection via RMS threshold
-        silence_thresh = 0.01
-        silent_mask = rms < silence_thresh
-        silent_regions = []
-        in_silence = False
-        start_idx = 0
-        for i, s in enumerate(silent_mask):
-            if s and not in_silence:
-                start_idx = i
-                in_silence = True
-            elif not s and in_silence:
-                silent_regions.append((start_idx, i))
-                in_silence = False
-        if in_silence:
-            silent_regions.append((start_idx, len(silent_mask)))
-
-        frame_time = hop_length / sr
+        # Silent regions [start, end) in frames, from the edges of the mask
+        edges = np.diff(np.concatenate([[0], feats["silent"].astype(np.int8), [0]]))
+        region_starts = np.flatnonzero(edges == 1).tolist()
+        region_ends = np.flatnonzero(edges == -1).tolist()
+
+        frame_time = RMS_HOP_LENGTH / sr
         pauses = []
         prev_end = 0.0
-        for s, e in silent_regions:
+        for s, e in zip(region_starts, region_ends):
             start_sec = s * frame_time
             end_sec = e * frame_time
             gap = start_sec - prev_end
@@ -360,16 +371,8 @@ class ForensicVoiceAnalyzer:
         }
 
     # Energy profile (pure numpy)
-    def _extract_energy(self, y, sr):
-        # RMS energy
-        frame_length = 1024
-        hop_length = 256
-        num_frames = 1 + (len(y) - frame_length) // hop_length
-        rms = np.zeros(num_frames)
-        for i in range(num_frames):
-            segment = y[i*hop_length : i*hop_length + frame_length]
-            rms[i] = np.sqrt(np.mean(segment**2))
-
+    def _extract_energy(self, feats):
+        rms = feats["rms"]
         rms_mean = float(np.mean(rms))
         rms_std = float(np.std(rms))
         half = len(rms) // 2
@@ -385,11 +388,8 @@ class ForensicVoiceAnalyzer:
         else:
             trend = "Stable"
 
-        # Zero crossing rate
-        zcr = np.sum(np.abs(np.diff(np.sign(y)))) / (2 * len(y))
-
         return {"rms_mean": round(rms_mean, 5), "rms_std": round(rms_std, 5),
-                "rms_trend": trend, "zcr_mean": round(zcr, 5)}
+                "rms_trend": trend, "zcr_mean": round(feats["zcr"], 5)}
 
     # Other extractors (Praat), unchanged
     def _extract_f0(self, snd):
@@ -545,11 +545,8 @@ class ForensicVoiceAnalyzer:
         original = ""
         english = ""
         try:
-            audio_whisper = y.astype(np.float32)
-            res_orig = self.whisper_model.transcribe(audio_whisper, task="transcribe")
-            original = res_orig['text'].strip()
-            res_en = self.whisper_model.transcribe(audio_whisper, task="translate")
-            english = res_en['text'].strip()
+            transcript = self.transcriber.transcribe(y.astype(np.float32))
+            original, english = transcript['text'], transcript['english']
         except Exception as e:
             print(f"Full transcription failed: {e}")
         return original, english
@@ -0,0 +1,337 @@
+"""
+frame_columns.py
+
+Columnar per-frame result container for the face analyzers.
+Each field is a typed NumPy array instead of one dict per frame; string
+states (gaze, emotion, status, ...) are stored as small integer codes and
+multi-valued fields (touched face regions) as bitmasks. Summaries,
+timelines and run-lengths are computed with whole-array operations.
+
+Classes:
+    Categorical(labels)      - single label per frame, uint8 codes
+    FlagSet(labels)          - any subset of labels per frame, bitmask
+    FrameColumns(schema, fps, capacity)
+        append(record), extend(columns), row(i), slice_frames(start, end), to_records()
+        fill_frames(frame_nums) - add interpolated rows for skipped frames
+        state() / from_state(schema, fps, arrays, labels) for saving
+        col(name), is_(name, label), mean(name), percent(mask)
+        counts(name), distribution(name), mode(name), transitions(name), runs(*names)
+"""
+
+import numpy as np
+
+
+class Categorical:
+    """Column of one label per frame. Unknown labels are added on first use."""
+
+    def __init__(self, labels, dtype=np.uint8):
+        self.labels = list(labels)
+        self.dtype = dtype
+
+    def copy(self):
+        return Categorical(self.labels, self.dtype)
+
+    def encode(self, label):
+        try:
+            return self.labels.index(label)
+        except ValueError:
+            self.labels.append(label)
+            return len(self.labels) - 1
+
+    def decode(self, code):
+        return self.labels[code]
+
+
+class FlagSet:
+    """Column holding any subset of a fixed label list as a bitmask."""
+
+    def __init__(self, labels):
+        self.labels = list(labels)
+        self.dtype = np.uint8 if len(self.labels) <= 8 else np.uint32
+
+    def encode(self, values):
+        mask = 0
+        for v in values:
+            mask |= 1 << self.labels.index(v)
+        return mask
+
+    def decode(self, mask):
+        return [l for i, l in enumerate(self.labels) if mask & (1 << i)]
+
+
+class Column:
+    """Schema entry: name, storage dtype or Categorical/FlagSet, JSON rounding.
+
+    shape gives fixed-size array fields (e.g. a bbox); export=False keeps a
+    column out of the JSON records (render-only data such as overlay geometry).
+    """
+
+    def __init__(self, name, kind, decimals=None, shape=(), export=True):
+        self.name = name
+        self.kind = kind
+        self.decimals = decimals
+        self.shape = tuple(shape)
+        self.export = export
+
+    @property
+    def dtype(self):
+        return self.kind.dtype if isinstance(self.kind, (Categorical, FlagSet)) else self.kind
+
+
+class FrameColumns:
+    """Per-frame analyzer results stored column-wise.
+
+    The 'frame_num' column is always present; 'timestamp' is derived from
+    it (frame_num / fps) rather than stored. New columns get their own copy
+    of each Categorical, so labels added by one analyzer run never reach the
+    class-level FRAME_SCHEMA shared by other instances and threads; views
+    share their parent's.
+    """
+
+    def __init__(self, schema, fps, capacity=0, _arrays=None, _size=None):
+        self.fps = fps
+        if _arrays is not None:
+            self.schema = {c.name: c for c in schema}
+            self._arrays, self._size = _arrays, _size
+            return
+        schema = [Column(c.name, c.kind.copy(), c.decimals, c.shape, c.export)
+                  if isinstance(c.kind, Categorical) else c for c in schema]
+        self.schema = {c.name: c for c in schema}
+        capacity = max(1, capacity)
+        self._arrays = {'frame_num': np.zeros(capacity, dtype=np.int32)}
+        for c in schema:
+            self._arrays[c.name] = np.zeros((capacity,) + c.shape, dtype=c.dtype)
+        self._size = 0
+
+    @classmethod
+    def from_state(cls, schema, fps, arrays, labels):
+        """Rebuild saved columns; categorical labels come from the saved state."""
+        cols = []
+        for c in schema:
+            if c.name in labels:
+                c = Column(c.name, Categorical(labels[c.name], c.kind.dtype), c.decimals, c.shape, c.export)
+            cols.append(c)
+        arrays = {n: np.asarray(arrays[n]) for n in ['frame_num'] + [c.name for c in cols]}
+        return cls(cols, fps, _arrays=arrays, _size=len(arrays['frame_num']))
+
+    # Building
+    def append(self, record):
+        """Append one frame given as a dict (extra keys such as 'timestamp' are ignored)."""
+        if self._size >= len(self._arrays['frame_num']):
+            self._grow()
+        i = self._size
+        self._arrays['frame_num'][i] = record['frame_num']
+        self._size += 1
+        self.set_row(i, record)
+
+    def extend(self, columns):
+        """Append many frames given as whole columns ({name: array}, codes for
+        categorical/flag columns). Columns left out stay zero."""
+        n = len(columns['frame_num'])
+        while self._size + n > len(self._arrays['frame_num']):
+            self._grow()
+        for name, values in columns.items():
+            self._arrays[name][self._size:self._size + n] = values
+        self._size += n
+
+    def set_row(self, i, record):
+        for name, c in self.schema.items():
+            if name in record:
+                v = record[name]
+                self._arrays[name][i] = c.kind.encode(v) if isinstance(c.kind, (Categorical, FlagSet)) else v
+
+    def _grow(self):
+        for name, arr in self._arrays.items():
+            new = np.zeros((max(1, len(arr) * 2),) + arr.shape[1:], dtype=arr.dtype)
+            new[:len(arr)] = arr
+            self._arrays[name] = new
+
+    def fill_frames(self, frame_nums):
+        """Copy with rows added for frame_nums, interpolated from the neighbouring rows.
+
+        Float columns are linearly interpolated between the previous and next
+        row (held at the ends); labels, flags, integers and booleans take the
+        previous row's value (the next row's before the first one).
+        """
+        nums = self.col('frame_num')
+        extra = np.setdiff1d(np.asarray(frame_nums, dtype=np.int32), nums)
+        if not len(extra) or not len(nums):
+            return self[:]
+        all_nums = np.union1d(nums, extra).astype(np.int32)
+        prev = np.clip(np.searchsorted(nums, all_nums, side='right') - 1, 0, len(nums) - 1)
+        nxt = np.clip(prev + 1, 0, len(nums) - 1)
+        span = (nums[nxt] - nums[prev]).astype(np.float64)
+        w = np.divide(all_nums - nums[prev], span, out=np.zeros(len(all_nums)), where=span > 0)
+        w = np.clip(w, 0.0, 1.0)
+
+        arrays = {'frame_num': all_nums}
+        for name in self.schema:
+            arr = self.col(name)
+            if arr.dtype.kind == 'f':
+                wb = w.reshape((-1,) + (1,) * (arr.ndim - 1))
+                arrays[name] = (arr[prev] * (1 - wb) + arr[nxt] * wb).astype(arr.dtype)
+            else:
+                arrays[name] = arr[prev]
+        return self._view(arrays)
+
+    # Sequence protocol (records as dicts, for callers that walk frames)
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self._record(i)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            if key < 0: key += self._size
+            if not 0 <= key < self._size: raise IndexError(key)
+            return self._record(key)
+        if isinstance(key, slice):
+            return self._view({n: a[:self._size][key] for n, a in self._arrays.items()})
+        # boolean mask or index array
+        key = np.asarray(key)
+        return self._view({n: a[:self._size][key] for n, a in self._arrays.items()})
+
+    def _view(self, arrays):
+        return FrameColumns(list(self.schema.values()), self.fps, _arrays=arrays,
+                            _size=len(arrays['frame_num']))
+
+    def _record(self, i, hidden=False):
+        rec = {'frame_num': int(self._arrays['frame_num'][i]),
+               'timestamp': int(self._arrays['frame_num'][i]) / self.fps}
+        for name, c in self.schema.items():
+            if c.export or hidden:
+                rec[name] = self._to_py(c, self._arrays[name][i])
+        return rec
+
+    def row(self, i):
+        """Record i including render-only columns (array fields stay arrays)."""
+        if i < 0: i += self._size
+        if not 0 <= i < self._size: raise IndexError(i)
+        return self._record(i, hidden=True)
+
+    @staticmethod
+    def _to_py(c, v):
+        if isinstance(c.kind, (Categorical, FlagSet)):
+            return c.kind.decode(int(v))
+        if c.shape:
+            return v.copy()
+        v = v.item()
+        return round(v, c.decimals) if c.decimals is not None and isinstance(v, float) else v
+
+    def to_records(self):
+        """Frames as a list of plain dicts (JSON-ready), one per frame."""
+        n = self._size
+        cols = {'frame_num': self._arrays['frame_num'][:n].tolist(),
+                'timestamp': (self._arrays['frame_num'][:n] / self.fps).tolist()}
+        for name, c in self.schema.items():
+            if not c.export:
+                continue
+            arr = self._arrays[name][:n]
+            if isinstance(c.kind, Categorical):
+                labels = c.kind.labels
+                cols[name] = [labels[k] for k in arr.tolist()]
+            elif isinstance(c.kind, FlagSet):
+                cols[name] = [c.kind.decode(k) for k in arr.tolist()]
+            elif c.decimals is not None and arr.dtype.kind == 'f':
+                cols[name] = np.round(arr.astype(np.float64), c.decimals).tolist()
+            else:
+                cols[name] = arr.tolist()
+        names = list(cols)
+        return [dict(zip(names, row)) for row in zip(*(cols[k] for k in names))]
+
+    def state(self):
+        """(arrays, categorical labels) of the filled rows, for saving."""
+        arrays = {n: a[:self._size] for n, a in self._arrays.items()}
+        labels = {n: list(c.kind.labels) for n, c in self.schema.items() if isinstance(c.kind, Categorical)}
+        return arrays, labels
+
+    # Column access
+    def col(self, name):
+        """Raw column (codes for categorical/flag columns)."""
+        if name == 'timestamp':
+            return self._arrays['frame_num'][:self._size] / self.fps
+        return self._arrays[name][:self._size]
+
+    def is_(self, name, label):
+        """Boolean mask of frames whose categorical `name` equals `label`."""
+        kind = self.schema[name].kind
+        if label not in kind.labels:
+            return np.zeros(self._size, dtype=bool)
+        code = kind.labels.index(label)
+        if isinstance(kind, FlagSet):
+            return (self.col(name) & (1 << code)) != 0
+        return self.col(name) == code
+
+    def slice_frames(self, start_frame=None, end_frame=None):
+        """Frames with start_frame <= frame_num <= end_frame (frame_num is sorted)."""
+        nums = self.col('frame_num')
+        lo = 0 if start_frame is None else int(np.searchsorted(nums, start_frame, side='left'))
+        hi = self._size if end_frame is None else int(np.searchsorted(nums, end_frame, side='right'))
+        return self[lo:hi]
+
+    # Vectorized summaries
+    def mean(self, name, mask=None):
+        arr = self.col(name)
+        if mask is not None: arr = arr[mask]
+        return float(np.mean(arr, dtype=np.float64)) if len(arr) else 0.0
+
+    def percent(self, mask):
+        return float(np.count_nonzero(mask)) / len(mask) * 100 if len(mask) else 0.0
+
+    def counts(self, name):
+        """{label: frame count} for labels that occur, in label order."""
+        kind = self.schema[name].kind
+        arr = self.col(name)
+        if isinstance(kind, FlagSet):
+            bits = (arr[:, None] >> np.arange(len(kind.labels))) & 1
+            totals = bits.sum(axis=0)
+        else:
+            totals = np.bincount(arr, minlength=len(kind.labels))
+        return {kind.labels[i]: int(c) for i, c in enumerate(totals) if c > 0}
+
+    def distribution(self, name, decimals=1):
+        """{label: percentage of frames} for labels that occur."""
+        n = self._size
+        return {k: round(c / n * 100, decimals) for k, c in self.counts(name).items()} if n else {}
+
+    def mode(self, name, default=None):
+        """Most frequent label; ties go to the label seen first (like Counter.most_common)."""
+        arr = self.col(name)
+        if not len(arr):
+            return default
+        kind = self.schema[name].kind
+        totals = np.bincount(arr, minlength=len(kind.labels))
+        best = np.flatnonzero(totals == totals.max())
+        first_seen = [int(np.argmax(arr == b)) for b in best]
+        return kind.decode(int(best[int(np.argmin(first_seen))]))
+
+    def transitions(self, name):
+        """Number of frame-to-frame changes of column `name`."""
+        arr = self.col(name)
+        return int(np.count_nonzero(arr[1:] != arr[:-1])) if len(arr) > 1 else 0
+
+    def runs(self, *names):
+        """Run-length encode the given columns jointly.
+
+        Returns:
+            list of (start_frame, end_frame, values) where values is a tuple of
+            decoded values (one per name) constant over the run.
+        """
+        n = self._size
+        if n == 0:
+            return []
+        changed = np.zeros(n, dtype=bool)
+        changed[0] = True
+        for name in names:
+            arr = self.col(name)
+            changed[1:] |= arr[1:] != arr[:-1]
+        starts = np.flatnonzero(changed)
+        ends = np.append(starts[1:] - 1, n - 1)
+        nums = self.col('frame_num')
+        out = []
+        for s, e in zip(starts.tolist(), ends.tolist()):
+            values = tuple(self._to_py(self.schema[name], self._arrays[name][s]) for name in names)
+            out.append((int(nums[s]), int(nums[e]), values))
+        return out
@@ -0,0 +1,144 @@
+"""
+frame_index.py
+
+Keyframe index for seekable segment access.
+Built once per video with ffprobe and cached next to the file as
+"<video>.frameidx.json", so segment runs can seek straight to the nearest
+keyframe instead of decoding (and discarding) every frame from frame 1.
+
+Class:
+    FrameIndex
+        load_or_build(video_path) -> FrameIndex or None
+        keyframe_before(frame_num) -> int
+"""
+
+import bisect
+import json
+import os
+import subprocess
+import threading
+
+INDEX_VERSION = 1
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+class FrameIndex:
+    """Sorted 1-based frame numbers of the keyframes of a video stream."""
+
+    def __init__(self, keyframes, frame_count, constant_rate):
+        self.keyframes = keyframes
+        self.frame_count = frame_count
+        self.constant_rate = constant_rate
+
+    @classmethod
+    def load_or_build(cls, video_path):
+        """Return the cached index for video_path, building it if needed.
+
+        Returns None when the index cannot be built (e.g. ffprobe missing);
+        callers then fall back to sequential decoding.
+        """
+        key = os.path.abspath(video_path)
+        try:
+            stat = os.stat(key)
+        except OSError:
+            return None
+        stamp = (stat.st_size, int(stat.st_mtime))
+
+        with _memo_lock:
+            cached = _memo.get(key)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+        cache_path = cls.cache_path(key)
+        index = cls._load(cache_path, stamp)
+        if index is None:
+            index = cls._build(key)
+            if index is None:
+                return None
+            cls._save(cache_path, stamp, index)
+
+        with _memo_lock:
+            _memo[key] = (stamp, index)
+        return index
+
+    @staticmethod
+    def cache_path(video_path):
+        return video_path + ".frameidx.json"
+
+    def keyframe_before(self, frame_num):
+        """Largest keyframe number <= frame_num (1 if there is none)."""
+        pos = bisect.bisect_right(self.keyframes, frame_num)
+        return self.keyframes[pos - 1] if pos > 0 else 1
+
+    @classmethod
+    def _load(cls, cache_path, stamp):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != INDEX_VERSION or (data.get('size'), data.get('mtime')) != stamp:
+            return None
+        return cls(data['keyframes'], data['frame_count'], data['constant_rate'])
+
+    @staticmethod
+    def _save(cache_path, stamp, index):
+        data = {
+            'version': INDEX_VERSION,
+            'size': stamp[0],
+            'mtime': stamp[1],
+            'frame_count': index.frame_count,
+            'constant_rate': index.constant_rate,
+            'keyframes': index.keyframes
+        }
+        try:
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+        except OSError as e:
+            # Read-only media folder: keep the in-memory index only
+            print(f"Frame index not cached ({e}).")
+
+    @classmethod
+    def _build(cls, video_path):
+        """Scan packet timestamps/flags with ffprobe (no decoding)."""
+        cmd = [
+            "ffprobe", "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags",
+            "-of", "csv=p=0",
+            video_path
+        ]
+        try:
+            proc = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        except Exception as e:
+            print(f"Frame index unavailable for {video_path}: {e}")
+            return None
+
+        packets = []
+        for line in proc.stdout.splitlines():
+            parts = line.strip().split(',')
+            if len(parts) < 2:
+                continue
+            try:
+                pts = float(parts[0])
+            except ValueError:
+                continue
+            packets.append((pts, 'K' in parts[1]))
+        if not packets:
+            return None
+
+        # Packets come in decode order; frame numbers follow presentation order
+        packets.sort(key=lambda p: p[0])
+        keyframes = [i + 1 for i, (_, is_key) in enumerate(packets) if is_key] or [1]
+
+        # OpenCV seeks by timestamp (frame / fps), which only lines up with
+        # frame numbers on constant-frame-rate streams
+        constant_rate = True
+        if len(packets) > 2:
+            deltas = [b[0] - a[0] for a, b in zip(packets, packets[1:])]
+            step = sorted(deltas)[len(deltas) // 2]
+            constant_rate = step > 0 and all(abs(d - step) <= step * 0.5 for d in deltas)
+
+        return cls(keyframes, len(packets), constant_rate)
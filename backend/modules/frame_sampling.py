@@ -0,0 +1,233 @@
+"""
+frame_sampling.py
+
+Per-module frame sampling for the FrameSource fan-out.
+Most face metrics (EAR, head angles, jaw tightness, emotion) change far
+more slowly than the video frame rate, so a module can be fed only some
+frames; the records of the frames it skipped are interpolated afterwards
+(FrameColumns.fill_frames: float columns linearly, labels/flags/counters
+from the previous processed frame).
+
+Policies:
+    fixed stride N   - every Nth frame
+    adaptive[:N]     - a frame is processed once the landmarks (or, without
+                       a mesh, a small grayscale thumbnail) have moved enough
+                       since the last processed frame, and at least every N
+                       frames
+Both always process the first frame, frames where the face appears or
+disappears, and frames the analyzer asks for via needs_full_rate() (the
+eye module: while the EAR is near the blink threshold, so blinks are still
+detected at full rate), plus the frame right after such a frame.
+
+Specs (DECEPTRON_FACE_SAMPLING / --face_sampling):
+    "3"                              - stride 3 for every module
+    "emotion=adaptive:6,head_pose=2" - per module; other modules full rate
+    "*=2,eye_gaze=1"                 - default plus overrides
+
+Drift report against full rate (choose a stride per deployment):
+    python frame_sampling.py video.mp4 --policies 2,3,5,adaptive [--frames 900]
+
+Functions / classes:
+    SamplingPolicy(stride=1, adaptive=False, motion_threshold=0.02, max_stride=8)
+    parse_sampling(spec) -> {module: policy spec}
+    make_policy(specs, name) -> SamplingPolicy or None
+    drift_report(full, sampled) -> dict
+"""
+
+import cv2
+import numpy as np
+
+from frame_columns import Categorical, FlagSet
+
+
+class SamplingPolicy:
+    """Decides, frame by frame, whether one analyzer processes the frame."""
+
+    def __init__(self, stride=1, adaptive=False, motion_threshold=0.02, max_stride=8):
+        self.stride = max(1, int(stride))
+        self.adaptive = adaptive
+        self.motion_threshold = motion_threshold
+        self.max_stride = max(1, int(max_stride))
+        self.begin()
+
+    @classmethod
+    def parse(cls, spec):
+        """'full'/'1' -> None, 'N' -> fixed stride, 'adaptive[:N]' -> adaptive (max stride N)."""
+        spec = str(spec).strip().lower()
+        if spec in ('', 'full', '1'):
+            return None
+        if spec.startswith('adaptive'):
+            _, _, max_stride = spec.partition(':')
+            return cls(adaptive=True, max_stride=int(max_stride) if max_stride else 8)
+        return cls(stride=int(spec))
+
+    def __repr__(self):
+        return f"adaptive:{self.max_stride}" if self.adaptive else f"stride {self.stride}"
+
+    def begin(self):
+        """Reset per-run state (FrameSource calls this before each run)."""
+        self.skipped = []
+        self.processed = 0
+        self._last_idx = None
+        self._last_present = None
+        self._last_lms = None
+        self._last_thumb = None
+        self._dense = False
+
+    def should_process(self, analyzer, frame_idx, frame, landmarks):
+        present = landmarks is not None
+        dense = bool(analyzer.needs_full_rate(landmarks))
+        gap = frame_idx - self._last_idx if self._last_idx is not None else 0
+
+        if self._last_idx is None or present != self._last_present:
+            take = True
+        elif (analyzer.uses_face_mesh and not present) or dense or self._dense:
+            take = True
+        elif self.adaptive:
+            take = gap >= self.max_stride or self._motion(frame, landmarks) >= self.motion_threshold
+        else:
+            take = gap >= self.stride
+        self._dense = dense
+
+        if take:
+            self.processed += 1
+            self._last_idx, self._last_present = frame_idx, present
+            if self.adaptive:
+                self._last_lms = landmarks[:, :2].copy() if present else None
+                self._last_thumb = None if present else self._thumb(frame)
+        else:
+            self.skipped.append(frame_idx)
+        return take
+
+    def _motion(self, frame, landmarks):
+        """Change since the last processed frame (landmarks relative to face size, else pixels)."""
+        if landmarks is not None and self._last_lms is not None:
+            size = float(np.max(np.ptp(self._last_lms, axis=0))) or 1.0
+            return float(np.mean(np.abs(landmarks[:, :2] - self._last_lms))) / size
+        if self._last_thumb is None:
+            return np.inf
+        return float(np.mean(np.abs(self._thumb(frame) - self._last_thumb))) / 255.0
+
+    @staticmethod
+    def _thumb(frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, (32, 18), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def parse_sampling(spec):
+    """Parse a sampling spec string into {module name or '*': policy spec}."""
+    specs = {}
+    for part in (spec or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, value = part.partition('=')
+        if sep:
+            specs[name.strip()] = value.strip()
+        else:
+            specs['*'] = name
+    return specs
+
+
+def make_policy(specs, name):
+    """Fresh SamplingPolicy for module `name` (None = full rate)."""
+    spec = specs.get(name, specs.get('*'))
+    return SamplingPolicy.parse(spec) if spec is not None else None
+
+
+def drift_report(full, sampled):
+    """Per-column error of a sampled (interpolated) run against the full-rate run.
+
+    Frames are matched by frame_num. Float columns report the mean and max
+    absolute error and the MAE relative to the column's std at full rate;
+    label, flag, integer and boolean columns report the % of frames that agree.
+    """
+    if full is None or sampled is None:
+        return {}
+    nums, fi, si = np.intersect1d(full.col('frame_num'), sampled.col('frame_num'), return_indices=True)
+    report = {'frames': int(len(nums)), 'columns': {}}
+    for name, c in full.schema.items():
+        if not c.export or name not in sampled.schema:
+            continue
+        a, b = full.col(name)[fi], sampled.col(name)[si]
+        if isinstance(c.kind, (Categorical, FlagSet)):
+            # Codes are only comparable through the labels
+            a = np.array([str(full.schema[name].kind.decode(int(v))) for v in a])
+            b = np.array([str(sampled.schema[name].kind.decode(int(v))) for v in b])
+        if a.dtype.kind == 'f':
+            err = np.abs(a.astype(np.float64) - b.astype(np.float64))
+            std = float(np.std(a)) if len(a) else 0.0
+            mae = float(np.mean(err)) if len(err) else 0.0
+            report['columns'][name] = {
+                'mae': round(mae, 4),
+                'max_err': round(float(np.max(err)) if len(err) else 0.0, 4),
+                'rel_mae': round(mae / std, 4) if std > 0 else 0.0,
+            }
+        else:
+            agree = float(np.mean(a == b)) * 100 if len(a) else 100.0
+            report['columns'][name] = {'agreement': round(agree, 2)}
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from frame_source import FrameSource
+    from eye_gaze_module import EyeGazeAnalyzer
+    from lip_jaw_module import LipJawAnalyzer
+    from head_pose_module import HeadPoseAnalyzer
+    from asymmetry_module import AsymmetryAnalyzer
+    from hand_face_touch_module import HandFaceTouchAnalyzer
+    from emotion_detection_module import EmotionAnalyzer
+
+    MODULES = {
+        'eye_gaze': EyeGazeAnalyzer,
+        'lip_jaw': LipJawAnalyzer,
+        'head_pose': HeadPoseAnalyzer,
+        'asymmetry': AsymmetryAnalyzer,
+        'hand_face': HandFaceTouchAnalyzer,
+        'emotion': EmotionAnalyzer,
+    }
+
+    parser = argparse.ArgumentParser(description="Drift of sampled face metrics against full-rate output")
+    parser.add_argument("video", help="Video to analyze")
+    parser.add_argument("--policies", default="2,3,5,adaptive", help="Comma-separated sampling specs")
+    parser.add_argument("--modules", default=",".join(MODULES), help="Comma-separated module names")
+    parser.add_argument("--frames", type=int, default=None, help="Only analyze the first N frames")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    modules = [m.strip() for m in args.modules.split(',') if m.strip()]
+    policies = [p.strip() for p in args.policies.split(',') if p.strip()]
+
+    # One decode: a full-rate instance and one instance per policy of every module
+    source = FrameSource(args.video)
+    for m in modules:
+        source.register(f"{m}@full", MODULES[m]())
+        for p in policies:
+            source.register(f"{m}@{p}", MODULES[m](), sampling=SamplingPolicy.parse(p))
+    results = source.run(end_frame=args.frames)
+    for name, e in source.errors.items():
+        print(f"  {name} failed: {e}")
+
+    report = {}
+    for m in modules:
+        report[m] = {}
+        for p in policies:
+            drift = drift_report(results.get(f"{m}@full"), results.get(f"{m}@{p}"))
+            drift['processed_pct'] = source.sampling_stats.get(f"{m}@{p}", {}).get('processed_pct', 100.0)
+            report[m][p] = drift
+
+    for m, by_policy in report.items():
+        print(f"\n[{m}]")
+        for p, drift in by_policy.items():
+            cols = ", ".join(
+                f"{c}: {v['rel_mae']:.3f} rel MAE" if 'rel_mae' in v else f"{c}: {v['agreement']:.1f}% agree"
+                for c, v in drift.get('columns', {}).items())
+            print(f"  {p:>12s}  {drift['processed_pct']:5.1f}% frames processed | {cols}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport saved to: {args.json}")
@@ -0,0 +1,294 @@
+"""
+frame_source.py
+
+Single-decode frame bus for the visual analyzers.
+A FrameSource opens the video once, decodes every frame once, converts it
+BGR→RGB once and fans the pair out to every registered analyzer. If any
+analyzer sets uses_face_mesh, FaceMesh also runs once per frame and the
+(478, 3) landmark array is passed along (and kept in self.landmarks).
+
+Per-frame analyzer interface (see FrameAnalyzer):
+    begin(meta, start_frame, end_frame, output_path=None, scale=1.0, verbose=False)
+    process_frame(frame_idx, frame, rgb, landmarks)
+    process_landmarks(store) - whole-run batch form (batch_landmarks analyzers)
+    finish() -> FrameColumns
+    draw_overlay(frame, rec, landmarks) - draws one cached record (render stage)
+
+Segment runs (start_frame > 1) seek to the nearest keyframe using the
+cached FrameIndex instead of decoding the video from frame 1.
+
+An analyzer may be registered with a SamplingPolicy (frame_sampling.py):
+it then only sees the frames the policy selects, and the records of the
+skipped frames are interpolated into its result.
+
+Analyzers whose records depend only on the landmarks (batch_landmarks)
+are not fed frame by frame; once decoding is done they get the whole
+LandmarkStore in one process_landmarks() call. They fall back to
+process_frame() when they record an overlay video or have a sampling policy.
+
+Class:
+    FrameSource
+        register(name, analyzer, output_path=None, scale=1.0, sampling=None)
+        run(start_frame=None, end_frame=None, verbose=False, workers=1) -> dict
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from frame_columns import FrameColumns
+from face_landmarks import FaceLandmarkExtractor, LandmarkStore
+from frame_index import FrameIndex
+
+
+class VideoMeta:
+    """Basic stream properties shared with every analyzer of a run."""
+
+    def __init__(self, fps, width, height, total_frames):
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.total_frames = total_frames
+
+
+class FrameAnalyzer:
+    """Base for analyzers that are fed one decoded frame at a time.
+
+    Subclasses declare FRAME_SCHEMA (columns of their per-frame record) and
+    implement reset(), process_frame() and draw_overlay(); process_video() is
+    kept for standalone use and simply runs a private FrameSource.
+
+    Overlays are drawn only from the stored record (plus landmarks), so the
+    same code serves inline output videos and the deferred render stage.
+
+    SUMMARY_STATE names the attributes, besides the returned frame data,
+    that get_summary() reads; the process backend copies them back from the
+    worker after finish().
+
+    batch_landmarks marks analyzers that also implement process_landmarks()
+    and can compute the whole run from the stored landmarks at once.
+    """
+
+    uses_face_mesh = False
+    batch_landmarks = False
+    FRAME_SCHEMA = []
+    SUMMARY_STATE = ()
+
+    def begin(self, meta, start_frame, end_frame, output_path=None, scale=1.0, verbose=False):
+        self.fps, self.width, self.height = meta.fps, meta.width, meta.height
+        self.total_frames = meta.total_frames
+        self.start_frame, self.end_frame = start_frame, end_frame
+        self.verbose = verbose
+        self.frame_data = FrameColumns(self.FRAME_SCHEMA, meta.fps, capacity=end_frame - start_frame + 1)
+        self._out = None
+        self._out_size = (int(meta.width * scale), int(meta.height * scale))
+        self._scale = scale
+        if output_path:
+            fourcc = cv2.VideoWriter_fourcc(*'H264')
+            self._out = cv2.VideoWriter(output_path, fourcc, meta.fps, self._out_size)
+        self.reset(start_frame)
+
+    def reset(self, start_frame):
+        """Clear per-run state before the first frame."""
+
+    def process_frame(self, frame_idx, frame, rgb, landmarks=None):
+        raise NotImplementedError
+
+    def process_landmarks(self, store):
+        """Append the records of every frame in store (a LandmarkStore) at once."""
+        raise NotImplementedError
+
+    def draw_overlay(self, frame, rec, landmarks=None):
+        """Draw the annotations of one record onto frame (in place)."""
+
+    def needs_full_rate(self, landmarks):
+        """True if this frame must not be skipped by a sampling policy.
+
+        Must only depend on the landmarks and constants (it is evaluated for
+        every frame, also for analyzers running in a worker process).
+        """
+        return False
+
+    def write_overlay(self, frame, landmarks=None):
+        """Annotate a copy of frame with the last record and write it, if recording."""
+        if self._out is None:
+            return
+        frame = frame.copy()
+        if len(self.frame_data):
+            self.draw_overlay(frame, self.frame_data.row(-1), landmarks)
+        self.write_frame(frame)
+
+    def write_frame(self, frame):
+        if self._out is not None:
+            self._out.write(cv2.resize(frame, self._out_size) if self._scale != 1.0 else frame)
+
+    def finish(self):
+        if self._out is not None:
+            self._out.release()
+            self._out = None
+        return self.frame_data
+
+    def process_video(self, input_path, output_path=None, start_frame=None, end_frame=None, verbose=True, scale=1.0):
+        source = FrameSource(input_path)
+        source.register('self', self, output_path=output_path, scale=scale)
+        results = source.run(start_frame, end_frame, verbose=verbose)
+        if 'self' in source.errors:
+            raise source.errors['self']
+        return results['self']
+
+
+class FrameSource:
+    """Decodes a video once and fans each frame out to registered analyzers."""
+
+    def __init__(self, input_path, seek=True):
+        self.input_path = input_path
+        self.seek = seek
+        self.cap = cv2.VideoCapture(input_path)
+        if not self.cap.isOpened():
+            raise ValueError(f"Cannot open video: {input_path}")
+        self.meta = VideoMeta(
+            fps=self.cap.get(cv2.CAP_PROP_FPS) or 30.0,
+            width=int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            height=int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            total_frames=int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        )
+        self.analyzers = {}
+        self.sampling = {}
+        self.sampling_stats = {}
+        self.errors = {}
+        self.landmarks = None
+
+    def register(self, name, analyzer, output_path=None, scale=1.0, sampling=None):
+        self.analyzers[name] = (analyzer, output_path, scale)
+        if sampling is not None:
+            self.sampling[name] = sampling
+
+    def run(self, start_frame=None, end_frame=None, verbose=False, workers=1):
+        """Decode [start_frame, end_frame] (1-based, inclusive) and feed all analyzers.
+
+        A failing analyzer is dropped from the fan-out and recorded in
+        self.errors; its result is None. The others keep running.
+
+        Returns:
+            dict: {name: frame data returned by analyzer.finish()}
+        """
+        if start_frame is None: start_frame = 1
+        if end_frame is None: end_frame = self.meta.total_frames
+        start_frame = max(1, start_frame)
+
+        active = {}
+        for name, (analyzer, output_path, scale) in self.analyzers.items():
+            try:
+                analyzer.begin(self.meta, start_frame, end_frame, output_path=output_path, scale=scale, verbose=verbose)
+                active[name] = analyzer
+            except Exception as e:
+                self.errors[name] = e
+        for policy in self.sampling.values():
+            policy.begin()
+        batched = {name: a for name, a in active.items()
+                   if a.batch_landmarks and a.uses_face_mesh
+                   and self.analyzers[name][1] is None and name not in self.sampling}
+        for name in batched:
+            del active[name]
+
+        extractor = None
+        if any(a.uses_face_mesh for a in active.values()) or batched:
+            extractor = FaceLandmarkExtractor()
+            self.landmarks = LandmarkStore(start_frame, capacity=end_frame - start_frame + 1)
+
+        pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 and len(active) > 1 else None
+        frame_idx = self._seek_to(start_frame) if active or batched else 0
+        try:
+            while active or batched:
+                ret, frame = self.cap.read()
+                if not ret: break
+                frame_idx += 1
+                if frame_idx < start_frame: continue
+                if frame_idx > end_frame: break
+
+                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                landmarks = None
+                if extractor is not None:
+                    landmarks = extractor.extract(rgb)
+                    self.landmarks.add(frame_idx, landmarks)
+                targets = self._select(active, frame_idx, frame, landmarks) if self.sampling else active
+                if pool is not None:
+                    futures = {name: pool.submit(a.process_frame, frame_idx, frame, rgb, landmarks) for name, a in targets.items()}
+                    for name, future in futures.items():
+                        try: future.result()
+                        except Exception as e: self._drop(active, name, e)
+                else:
+                    for name, a in list(targets.items()):
+                        try: a.process_frame(frame_idx, frame, rgb, landmarks)
+                        except Exception as e: self._drop(active, name, e)
+        finally:
+            if pool is not None: pool.shutdown()
+            if extractor is not None: extractor.close()
+            self.cap.release()
+
+        for name, a in list(batched.items()):
+            try: a.process_landmarks(self.landmarks)
+            except Exception as e: self._drop(batched, name, e)
+
+        results = {}
+        for name, (analyzer, _, _) in self.analyzers.items():
+            if name in self.errors:
+                results[name] = None
+                continue
+            try:
+                results[name] = analyzer.finish()
+            except Exception as e:
+                self.errors[name] = e
+                results[name] = None
+                continue
+            policy = self.sampling.get(name)
+            if policy is not None:
+                total = policy.processed + len(policy.skipped)
+                self.sampling_stats[name] = {
+                    'policy': repr(policy),
+                    'processed': policy.processed,
+                    'skipped': len(policy.skipped),
+                    'processed_pct': round(policy.processed / total * 100, 1) if total else 100.0,
+                }
+                if policy.skipped and results[name] is not None:
+                    results[name] = results[name].fill_frames(policy.skipped)
+        return results
+
+    def _select(self, active, frame_idx, frame, landmarks):
+        """Analyzers that process this frame; sampled-out ones only keep their video going."""
+        targets = {}
+        for name, a in active.items():
+            policy = self.sampling.get(name)
+            if policy is None or policy.should_process(a, frame_idx, frame, landmarks):
+                targets[name] = a
+            else:
+                a.write_overlay(frame, landmarks)
+        return targets
+
+    def _seek_to(self, start_frame):
+        """Position the capture at the keyframe at or before start_frame.
+
+        Returns the number of the last frame consumed (the next read()
+        yields frame_idx + 1). Falls back to 0 (decode from the start) when
+        no usable index exists.
+        """
+        if not self.seek or start_frame <= 1:
+            return 0
+        index = FrameIndex.load_or_build(self.input_path)
+        if index is None or not index.constant_rate:
+            return 0
+        keyframe = index.keyframe_before(start_frame)
+        if keyframe <= 1:
+            return 0
+        if self.cap.set(cv2.CAP_PROP_POS_FRAMES, keyframe - 1) and int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)) == keyframe - 1:
+            return keyframe - 1
+        # Backend refused the seek: reopen and decode sequentially
+        self.cap.release()
+        self.cap = cv2.VideoCapture(self.input_path)
+        return 0
+
+    def _drop(self, active, name, error):
+        self.errors[name] = error
+        analyzer = active.pop(name)
+        try: analyzer.finish()
+        except Exception: pass
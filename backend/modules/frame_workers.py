@@ -0,0 +1,309 @@
+"""
+frame_workers.py
+
+Process-pool backend for the FrameSource fan-out.
+Each face analyzer runs in its own worker process that keeps one warm
+analyzer instance (models and MediaPipe graphs loaded once) for the life of
+the pool, so Python-side landmark math and graph overhead no longer contend
+for the GIL of the decoding process.
+
+Frames reach the workers through a shared-memory ring buffer (BGR frame,
+RGB frame and FaceMesh landmarks per slot); only small control tuples go
+over the pipes. The decoding process writes each frame once and a slot is
+reused only after every worker has acknowledged it.
+
+Classes:
+    FrameRing(meta, slots) / FrameRing.attach(spec)
+    AnalyzerProcessPool({name: analyzer or analyzer class}, slots=8)
+        proxy(analyzer) -> RemoteAnalyzer (register it on a FrameSource)
+        run_lock - held around each FrameSource.run that uses the proxies
+        close()
+"""
+
+import multiprocessing as mp
+import threading
+import traceback
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from face_landmarks import NUM_LANDMARKS
+from frame_source import FrameAnalyzer
+
+
+class FrameRing:
+    """Fixed number of frame slots (BGR, RGB, landmarks) in one shared memory block."""
+
+    def __init__(self, width, height, slots, name=None):
+        self.width, self.height, self.slots = width, height, slots
+        frame_bytes = height * width * 3
+        lm_bytes = NUM_LANDMARKS * 3 * 4
+        size = slots * (2 * frame_bytes + lm_bytes)
+        self._owner = name is None
+        if self._owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        buf = self.shm.buf
+        self.bgr = np.ndarray((slots, height, width, 3), dtype=np.uint8, buffer=buf)
+        self.rgb = np.ndarray((slots, height, width, 3), dtype=np.uint8, buffer=buf, offset=slots * frame_bytes)
+        self.lms = np.ndarray((slots, NUM_LANDMARKS, 3), dtype=np.float32, buffer=buf, offset=2 * slots * frame_bytes)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def spec(self):
+        return (self.shm.name, self.width, self.height, self.slots)
+
+    @classmethod
+    def attach(cls, spec):
+        name, width, height, slots = spec
+        return cls(width, height, slots, name=name)
+
+    def fits(self, meta):
+        return (self.width, self.height) == (meta.width, meta.height)
+
+    def write(self, slot, frame, rgb, landmarks):
+        self.bgr[slot] = frame
+        self.rgb[slot] = rgb
+        if landmarks is not None:
+            self.lms[slot] = landmarks
+
+    def read(self, slot):
+        return self.bgr[slot], self.rgb[slot], self.lms[slot]
+
+    def close(self):
+        # Drop the views before closing the mapping
+        self.bgr = self.rgb = self.lms = None
+        self.shm.close()
+        if self._owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _worker_main(factory, conn):
+    """Worker loop: one warm analyzer, driven by ('begin'|'frame'|'finish'|'stop', ...) messages."""
+    cls, kwargs = factory
+    try:
+        analyzer = cls(**kwargs)
+        conn.send(('ready',))
+    except Exception as e:
+        conn.send(('error', -1, _portable(e), traceback.format_exc()))
+        return
+
+    ring = None
+    failed = False
+    while True:
+        msg = conn.recv()
+        kind = msg[0]
+        if kind == 'stop':
+            break
+        try:
+            if kind == 'begin':
+                _, spec, meta, start_frame, end_frame, output_path, scale, verbose = msg
+                if ring is None or ring.name != spec[0]:
+                    if ring is not None: ring.close()
+                    ring = FrameRing.attach(spec)
+                failed = False
+                analyzer.begin(meta, start_frame, end_frame, output_path=output_path, scale=scale, verbose=verbose)
+            elif kind == 'frame':
+                _, seq, frame_idx, slot, has_landmarks = msg
+                if not failed:
+                    frame, rgb, lms = ring.read(slot)
+                    analyzer.process_frame(frame_idx, frame, rgb, lms if has_landmarks else None)
+                conn.send(('ack', seq))
+            elif kind == 'finish':
+                data = analyzer.finish()
+                state = {attr: getattr(analyzer, attr) for attr in analyzer.SUMMARY_STATE}
+                conn.send(('result', data, state))
+        except Exception as e:
+            failed = True
+            conn.send(('error', msg[1] if kind == 'frame' else -1, _portable(e), traceback.format_exc()))
+            if kind == 'finish':
+                conn.send(('result', None, {}))
+    if ring is not None:
+        ring.close()
+
+
+def _portable(e):
+    """Exceptions from native libraries do not always pickle; send a plain copy."""
+    return RuntimeError(f"{type(e).__name__}: {e}")
+
+
+class _Worker:
+    def __init__(self, name, process, conn):
+        self.name = name
+        self.process = process
+        self.conn = conn
+        self.done_seq = 0
+        self.error = None
+        self.active = False
+
+
+class RemoteAnalyzer(FrameAnalyzer):
+    """Stands in for a local analyzer on a FrameSource; the work happens in a worker.
+
+    After finish() the local analyzer receives the worker's SUMMARY_STATE, so
+    its get_summary() and draw_overlay() keep working on the returned data.
+    """
+
+    def __init__(self, pool, name, local):
+        self.pool = pool
+        self.name = name
+        self.local = local
+        self.uses_face_mesh = local.uses_face_mesh
+        self._out = None  # any output video is written by the worker
+
+    def begin(self, meta, start_frame, end_frame, output_path=None, scale=1.0, verbose=False):
+        # needs_full_rate() is evaluated locally and may use the frame geometry
+        self.local.fps, self.local.width, self.local.height = meta.fps, meta.width, meta.height
+        self.pool._begin(self.name, meta, start_frame, end_frame, output_path, scale, verbose)
+
+    def needs_full_rate(self, landmarks):
+        return self.local.needs_full_rate(landmarks)
+
+    def process_frame(self, frame_idx, frame, rgb, landmarks=None):
+        self.pool._submit(self.name, frame_idx, frame, rgb, landmarks)
+
+    def finish(self):
+        data, state = self.pool._finish(self.name)
+        for attr, value in state.items():
+            setattr(self.local, attr, value)
+        return data
+
+
+class AnalyzerProcessPool:
+    """One worker process per analyzer, each holding a warm instance of it.
+
+    Workers are started once and reused by every FrameSource run; each is
+    built as type(analyzer)() in its own process (spawn start method, so
+    CUDA/MediaPipe state is never forked). Any local instance of a pool
+    class can be proxied, so one pool can serve many pipelines; the workers
+    and the frame ring serve one run at a time (run_lock).
+    """
+
+    def __init__(self, analyzers, slots=8):
+        self.slots = max(2, slots)
+        self.ring = None
+        self._lock = threading.Lock()
+        self.run_lock = threading.Lock()
+        self._seq = 0
+        self._slot = 0
+        self._last_frame = None
+        self._types = {}               # analyzer class -> worker name
+        self._workers = {}
+        ctx = mp.get_context('spawn')
+        for name, analyzer in analyzers.items():
+            cls = analyzer if isinstance(analyzer, type) else type(analyzer)
+            parent, child = ctx.Pipe()
+            process = ctx.Process(target=_worker_main, args=((cls, {}), child),
+                                  name=f"analyzer-{name}", daemon=True)
+            process.start()
+            child.close()
+            self._workers[name] = _Worker(name, process, parent)
+            self._types[cls] = name
+        for w in self._workers.values():
+            msg = self._recv(w)
+            if msg[0] == 'error':
+                w.error = msg[2]
+                print(f"Analyzer worker '{w.name}' failed to start: {msg[2]}")
+
+    def proxy(self, analyzer):
+        """FrameSource-compatible stand-in for a local analyzer of one of the pool's classes."""
+        name = self._types.get(type(analyzer))
+        if name is None:
+            raise KeyError(f"No analyzer worker for {type(analyzer).__name__}")
+        return RemoteAnalyzer(self, name, analyzer)
+
+    def close(self):
+        for w in self._workers.values():
+            try:
+                w.conn.send(('stop',))
+            except (OSError, ValueError):
+                pass
+        for w in self._workers.values():
+            w.process.join(timeout=5)
+            if w.process.is_alive():
+                w.process.terminate()
+            w.conn.close()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    # FrameSource-side protocol (called through RemoteAnalyzer)
+    def _begin(self, name, meta, start_frame, end_frame, output_path, scale, verbose):
+        w = self._workers[name]
+        if not w.process.is_alive():
+            raise w.error or RuntimeError(f"Analyzer worker '{name}' is not running")
+        with self._lock:
+            if self.ring is None or not self.ring.fits(meta):
+                if any(x.active for x in self._workers.values()):
+                    raise RuntimeError("Frame ring resized while a run is active")
+                if self.ring is not None:
+                    self.ring.close()
+                self.ring = FrameRing(meta.width, meta.height, self.slots)
+            self._last_frame = None
+        w.error = None
+        w.done_seq = self._seq
+        w.active = True
+        w.conn.send(('begin', self.ring.spec, meta, start_frame, end_frame, output_path, scale, verbose))
+
+    def _submit(self, name, frame_idx, frame, rgb, landmarks):
+        w = self._workers[name]
+        if w.error is not None:
+            raise w.error
+        with self._lock:
+            if self._last_frame != frame_idx:
+                # First analyzer to see this frame publishes it into the next slot
+                self._seq += 1
+                self._wait_free(self._seq - self.slots)
+                self._slot = self._seq % self.slots
+                self.ring.write(self._slot, frame, rgb, landmarks)
+                self._last_frame = frame_idx
+            seq, slot = self._seq, self._slot
+        w.conn.send(('frame', seq, frame_idx, slot, landmarks is not None))
+
+    def _finish(self, name):
+        w = self._workers[name]
+        w.active = False
+        if w.process.is_alive():
+            w.conn.send(('finish',))
+        while True:
+            msg = self._recv(w)
+            if msg[0] == 'result':
+                break
+            self._handle(w, msg)
+        if w.error is not None:
+            raise w.error
+        return msg[1], msg[2]
+
+    def _recv(self, w):
+        try:
+            return w.conn.recv()
+        except (EOFError, OSError):
+            # Worker process died (e.g. crashed inside a native library)
+            error = w.error or RuntimeError(f"Analyzer worker '{w.name}' exited unexpectedly")
+            return ('error', -1, error, '') if w.error is None else ('result', None, {})
+
+    def _wait_free(self, seq):
+        """Block until every active worker has processed frame `seq` (its slot is free)."""
+        pending = [w for w in self._workers.values() if w.active and w.error is None and w.done_seq < seq]
+        while pending:
+            for conn in wait([w.conn for w in pending]):
+                w = next(x for x in pending if x.conn is conn)
+                self._handle(w, self._recv(w))
+            pending = [w for w in pending if w.error is None and w.done_seq < seq]
+
+    def _handle(self, w, msg):
+        if msg[0] == 'ack':
+            w.done_seq = max(w.done_seq, msg[1])
+        elif msg[0] == 'error':
+            w.error = msg[2]
+            print(f"Analyzer worker '{w.name}' error: {msg[2]}\n{msg[3]}")
+            # A failed worker skips the rest of the run; treat its slots as free
+            w.done_seq = float('inf')
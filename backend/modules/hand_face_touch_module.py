@@ -3,28 +3,52 @@ import mediapipe as mp
 import numpy as np
 import os
 from collections import defaultdict
-
-class HandFaceTouchAnalyzer:
-    """Detects hand-to-face touches (self-adaptors) using a scaling radius check."""
-
-    def __init__(self):
+from frame_source import FrameAnalyzer
+from frame_columns import Column, FlagSet
+from face_landmarks import RegionTracker
+
+class HandFaceTouchAnalyzer(FrameAnalyzer):
+    """Detects hand-to-face touches (self-adaptors) using a scaling radius check.
+
+    Hands only matter near the face, so the hand model runs on a padded
+    window around the face landmarks (use_roi) and skips frames without a face.
+
+    With motion_gate, the hand model runs while it is tracking hands; after
+    that it runs only when something moves in the face neighbourhood (the
+    window minus the face box, compared on a small grayscale thumbnail) or
+    every gate_refresh frames. Skipped frames keep the "no hands" state of
+    the last invocation.
+    """
+
+    uses_face_mesh = True
+    REGIONS = ['NOSE', 'MOUTH', 'FOREHEAD', 'CHIN', 'EYES', 'LEFT_CHEEK', 'RIGHT_CHEEK']
+    # Region sizes relative to the face, tuned so nearby areas don't overlap
+    REGION_RADIUS = np.array([0.05, 0.06, 0.06, 0.06, 0.05, 0.07, 0.07])
+    FRAME_SCHEMA = [
+        Column('touches', FlagSet(REGIONS)),
+        Column('confidence', np.float32, 2),
+        Column('duration', np.int32),
+        # Overlay geometry: up to two hands x 21 normalized points (NaN = no hand)
+        Column('hand_points', np.float32, shape=(2, 21, 2), export=False),
+    ]
+
+    def __init__(self, use_roi=True, motion_gate=True):
         self.mp_hands = mp.solutions.hands
-        self.mp_face_mesh = mp.solutions.face_mesh
-        self.mp_draw = mp.solutions.drawing_utils
         
-        self.hands = self.mp_hands.Hands(
-            static_image_mode=False,
-            max_num_hands=2,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            static_image_mode=False,
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
+        self.hands = self._new_hands()
+        # Window of 1.5 face sizes around the face on each side; the crop gets
+        # its own Hands graph so its tracking stays in crop coordinates
+        self.roi = RegionTracker(pad=1.5) if use_roi else None
+        self.roi_hands = self._new_hands() if use_roi else None
+
+        # Motion gate: a thumbnail pixel counts as changed above gate_pixel_diff
+        # grey levels; the hand model runs once gate_motion of the
+        # neighbourhood has changed, and at least every gate_refresh frames
+        self.motion_gate = motion_gate
+        self.gate_size = 64
+        self.gate_pixel_diff = 20
+        self.gate_motion = 0.02
+        self.gate_refresh = 15
 
         # Face landmark clusters that define the touch regions
         self.NOSE_REGION = [1, 2, 5, 168, 19, 94, 4, 6, 197, 195] # Covers the nose area
@@ -38,156 +62,174 @@ class HandFaceTouchAnalyzer:
         # Finger tip indices (Index, Middle, Ring, Pinky tips)
         self.FINGER_TIPS = [8, 12, 16, 20]
 
-    def _landmark_point(self, landmarks, idx, img_w, img_h):
-        if isinstance(idx, (tuple, list)):
-            pts = np.array([(landmarks[i].x * img_w, landmarks[i].y * img_h) for i in idx])
-            return np.mean(pts, axis=0)
-        lm = landmarks[idx]
-        return np.array([lm.x * img_w, lm.y * img_h])
-
-    def _distance(self, pt1, pt2):
-        return np.linalg.norm(np.array(pt1) - np.array(pt2))
-
-    def _get_regions_def(self, landmarks, img_w, img_h):
-        """Returns map of region name to (center_pt, radius)."""
-        l_eye = landmarks[33]
-        r_eye = landmarks[263]
-        chin = landmarks[152]
-        nose = landmarks[1]
-        
-        face_w = abs(r_eye.x - l_eye.x) * img_w
-        face_h = abs(chin.y - nose.y) * img_h
-        baselen = min(face_w, face_h)
-
-        # Region sizes, tuned so nearby areas don't overlap
-        radii = {
-            'NOSE': 0.05 * baselen,
-            'MOUTH': 0.06 * baselen,
-            'EYES': 0.05 * baselen,
-            'FOREHEAD': 0.06 * baselen,
-            'CHEEK': 0.07 * baselen,
-            'CHIN': 0.06 * baselen
-        }
-        
-        return {
-            'NOSE': (self._landmark_point(landmarks, self.NOSE_REGION, img_w, img_h), radii['NOSE']),
-            'MOUTH': (self._landmark_point(landmarks, self.MOUTH_REGION, img_w, img_h), radii['MOUTH']),
-            'FOREHEAD': (self._landmark_point(landmarks, self.FOREHEAD, img_w, img_h), radii['FOREHEAD']),
-            'CHIN': (self._landmark_point(landmarks, self.CHIN_REGION, img_w, img_h), radii['CHIN']),
-            'EYES': (self._landmark_point(landmarks, self.EYES_REGION, img_w, img_h), radii['EYES']),
-            'LEFT_CHEEK': (self._landmark_point(landmarks, self.LEFT_CHEEK, img_w, img_h), radii['CHEEK']),
-            'RIGHT_CHEEK': (self._landmark_point(landmarks, self.RIGHT_CHEEK, img_w, img_h), radii['CHEEK'])
-        }
+        # Region centers as weights over the landmarks they average (REGIONS order)
+        clusters = [self.NOSE_REGION, self.MOUTH_REGION, [self.FOREHEAD], self.CHIN_REGION,
+                    self.EYES_REGION, [self.LEFT_CHEEK], [self.RIGHT_CHEEK]]
+        self._region_idx = np.unique(np.concatenate(clusters))
+        self._region_weights = np.zeros((len(clusters), len(self._region_idx)))
+        for r, cluster in enumerate(clusters):
+            np.add.at(self._region_weights[r], np.searchsorted(self._region_idx, cluster), 1.0 / len(cluster))
+
+    def _new_hands(self):
+        return self.mp_hands.Hands(
+            static_image_mode=False,
+            max_num_hands=2,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
 
-    def process_video(self, input_path, output_path=None, start_frame=None, end_frame=None, verbose=True, scale=1.0):
-        cap = cv2.VideoCapture(input_path)
-        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        out_w, out_h = int(width * scale), int(height * scale)
-        total_f = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    def _regions(self, lms, img_w, img_h):
+        """Region centers (N, R, 2) and radii (N, R) in pixels for landmark frames (N, 478, 2+)."""
+        pts = lms[:, self._region_idx, :2].astype(np.float64)
+        centers = (self._region_weights @ pts) * (img_w, img_h)
+        face_w = np.abs(lms[:, 263, 0] - lms[:, 33, 0]) * img_w
+        face_h = np.abs(lms[:, 152, 1] - lms[:, 1, 1]) * img_h
+        baselen = np.minimum(face_w, face_h)
+        return centers, baselen[:, None] * self.REGION_RADIUS
+
+    def classify_touches(self, lms, tips):
+        """Touched regions of N frames at once.
+
+        Each fingertip touches the nearest region whose radius it is inside;
+        confidence is the best (1 - distance / radius) over all tips, in %.
+
+        Args:
+            lms: (N, 478, 2+) normalized face landmarks
+            tips: (N, T, 2) fingertip pixels, NaN for missing hands
+
+        Returns:
+            (touches (N,) region bitmask in REGIONS order, confidence (N,))
+        """
+        centers, radii = self._regions(lms, self.width, self.height)
+        dist = np.linalg.norm(tips[:, :, None, :] - centers[:, None, :, :], axis=-1)  # (N, T, R)
+        dist = np.where(dist <= radii[:, None, :], dist, np.inf)
+        best = np.argmin(dist, axis=2)
+        best_dist = np.take_along_axis(dist, best[..., None], axis=2)[..., 0]
+        hit = np.isfinite(best_dist)
+        touches = np.bitwise_or.reduce(np.where(hit, 1 << best, 0), axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            conf = (1.0 - best_dist / np.take_along_axis(radii, best, axis=1)) * 100
+        conf = np.where(hit, conf, 0.0).max(axis=1, initial=0.0)
+        return touches.astype(self.FRAME_SCHEMA[0].kind.dtype), conf
+
+    def reset(self, start_frame):
+        self.touch_duration = 0
+        if self.roi is not None:
+            self.roi.reset()
+        self._gate_thumb = None
+        self._gate_window = None
+        self._hands_tracked = False
+        self._since_hands = 0
+        self.gate_stats = {'run': 0, 'skipped': 0}
+
+    def _hands_needed(self, rgb, window, landmarks):
+        """Motion gate in front of the hand model (see class doc)."""
+        if not self.motion_gate:
+            return True
+        x0, y0, x1, y1 = window if window is not None else (0, 0, self.width, self.height)
+        size = self.gate_size
+        thumb = cv2.cvtColor(cv2.resize(rgb[y0:y1, x0:x1], (size, size), interpolation=cv2.INTER_AREA), cv2.COLOR_RGB2GRAY)
+
+        # Neighbourhood = window minus the face box (grown a little so head
+        # movement and talking don't count as motion)
+        lo = landmarks[:, :2].min(axis=0) * (self.width, self.height)
+        hi = landmarks[:, :2].max(axis=0) * (self.width, self.height)
+        grow = (hi - lo) * 0.1
+        scale = (size / (x1 - x0), size / (y1 - y0))
+        fx0, fy0 = np.floor((lo - grow - (x0, y0)) * scale).astype(int).clip(0, size).tolist()
+        fx1, fy1 = np.ceil((hi + grow - (x0, y0)) * scale).astype(int).clip(0, size).tolist()
+
+        prev, prev_window = self._gate_thumb, self._gate_window
+        self._gate_thumb, self._gate_window = thumb, window
+        if self._hands_tracked or prev is None or window != prev_window or self._since_hands >= self.gate_refresh:
+            return True
+        changed = cv2.absdiff(thumb, prev) > self.gate_pixel_diff
+        changed[fy0:fy1, fx0:fx1] = False
+        ring = size * size - (fy1 - fy0) * (fx1 - fx0)
+        return ring > 0 and np.count_nonzero(changed) >= self.gate_motion * ring
+
+    def process_frame(self, frame_idx, frame, rgb, landmarks=None):
+        width, height = self.width, self.height
         
-        if start_frame is None: start_frame = 1
-        if end_frame is None: end_frame = total_f
+        touches = []
+        touch_conf = 0.0
+        hand_points = np.full((2, 21, 2), np.nan, dtype=np.float32)
         
-        out = None
-        if output_path:
-            fourcc = cv2.VideoWriter_fourcc(*'H264'); out = cv2.VideoWriter(output_path, fourcc, fps, (out_w, out_h))
-            
-        frame_data, frame_idx = [], 0
-        touch_duration = 0
-
-        while True:
-            ret, frame = cap.read()
-            if not ret: break
-            frame_idx += 1
-            if frame_idx < start_frame: continue
-            if frame_idx > end_frame: break
-
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            h_res = self.hands.process(rgb)
-            f_res = self.face_mesh.process(rgb)
-            
-            touches = []
-            touch_conf = 0.0
-            regions_def = {}
-            
-            if f_res.multi_face_landmarks:
-                landmarks = f_res.multi_face_landmarks[0].landmark
-                regions_def = self._get_regions_def(landmarks, width, height)
-
-                if h_res.multi_hand_landmarks:
-                    for h_lms in h_res.multi_hand_landmarks:
-                        for tip_idx in self.FINGER_TIPS:
-                            tip_pt = np.array([h_lms.landmark[tip_idx].x * width, h_lms.landmark[tip_idx].y * height])
-                            
-                            best_region = None
-                            min_dist = float('inf')
-                            
-                            for r_name, (r_pt, r_radius) in regions_def.items():
-                                dist = self._distance(tip_pt, r_pt)
-                                if dist <= r_radius and dist < min_dist:
-                                    min_dist = dist
-                                    best_region = r_name
-                            
-                            if best_region:
-                                if best_region not in touches: 
-                                    touches.append(best_region)
-                                r_radius = regions_def[best_region][1]
-                                touch_conf = max(touch_conf, (1.0 - min_dist / r_radius) * 100)
-                        
-                        if out:
-                            self.mp_draw.draw_landmarks(frame, h_lms, self.mp_hands.HAND_CONNECTIONS)
-
-                if out:
-                    for r_name, (r_pt, r_radius) in regions_def.items():
-                        color = (0,0,255) if r_name in touches else (0,255,0)
-                        cv2.circle(frame, (int(r_pt[0]), int(r_pt[1])), int(r_radius), color, 1)
-                        if r_name in touches:
-                            cv2.putText(frame, r_name, (int(r_pt[0]), int(r_pt[1])-10), 0, 0.4, (0,0,255), 1)
-
-            if touches:
-                touch_duration += 1
+        if landmarks is not None:
+            window = self.roi.update(landmarks, width, height) if self.roi is not None else None
+            h_res = None
+            if self._hands_needed(rgb, window, landmarks):
+                if window is not None:
+                    h_res = self.roi_hands.process(self.roi.crop(rgb))
+                else:
+                    h_res = self.hands.process(rgb)
+                self._hands_tracked = bool(h_res.multi_hand_landmarks)
+                self._since_hands = 0
+                self.gate_stats['run'] += 1
             else:
-                touch_duration = 0
-
-            if out: out.write(cv2.resize(frame, (out_w, out_h)) if scale != 1.0 else frame)
-            frame_data.append({
-                'frame_num': frame_idx, 
-                'timestamp': frame_idx/fps, 
-                'touches': touches, 
-                'confidence': round(touch_conf, 2),
-                'duration': touch_duration
-            })
-            if verbose and frame_idx % 30 == 0: print(f"Touch Processed: {frame_idx}/{end_frame}")
-
-        cap.release()
-        if out: out.release()
-        return frame_data
+                self._since_hands += 1
+                self.gate_stats['skipped'] += 1
+
+            if h_res is not None and h_res.multi_hand_landmarks:
+                for h, h_lms in enumerate(h_res.multi_hand_landmarks[:2]):
+                    hand_points[h] = [(p.x, p.y) for p in h_lms.landmark]
+                    if window is not None:
+                        hand_points[h] = self.roi.to_frame(hand_points[h], width, height)
+                tips = (hand_points[:, self.FINGER_TIPS] * (width, height)).reshape(1, -1, 2)
+                mask, conf = self.classify_touches(landmarks[None], tips)
+                touches = self.FRAME_SCHEMA[0].kind.decode(int(mask[0]))
+                touch_conf = float(conf[0])
+
+        if touches:
+            self.touch_duration += 1
+        else:
+            self.touch_duration = 0
+
+        self.frame_data.append({
+            'frame_num': frame_idx, 
+            'timestamp': frame_idx/self.fps, 
+            'touches': touches, 
+            'confidence': round(touch_conf, 2),
+            'duration': self.touch_duration,
+            'hand_points': hand_points
+        })
+        self.write_overlay(frame, landmarks)
+        if self.verbose and frame_idx % 30 == 0: print(f"Touch Processed: {frame_idx}/{self.end_frame}")
+
+    def draw_overlay(self, frame, rec, landmarks=None):
+        if landmarks is None: return
+        height, width = frame.shape[:2]
+        touches = rec['touches']
+
+        # Hand skeletons in the MediaPipe drawing style
+        for hand in rec['hand_points']:
+            if not np.isfinite(hand).all(): continue
+            pts = (hand * (width, height)).astype(int).tolist()
+            for a, b in self.mp_hands.HAND_CONNECTIONS:
+                cv2.line(frame, tuple(pts[a]), tuple(pts[b]), (224, 224, 224), 2)
+            for p in pts:
+                cv2.circle(frame, tuple(p), 2, (0, 0, 255), 2)
+
+        centers, radii = self._regions(landmarks[None], width, height)
+        for r_name, r_pt, r_radius in zip(self.REGIONS, centers[0], radii[0]):
+            color = (0,0,255) if r_name in touches else (0,255,0)
+            cv2.circle(frame, (int(r_pt[0]), int(r_pt[1])), int(r_radius), color, 1)
+            if r_name in touches:
+                cv2.putText(frame, r_name, (int(r_pt[0]), int(r_pt[1])-10), 0, 0.4, (0,0,255), 1)
 
     def get_summary(self, data):
         if not data: return {}
-        all_touches = [t for d in data for t in d['touches']]
-        counts = {r: all_touches.count(r) for r in set(all_touches)}
+        counts = data.counts('touches')
         
-        timeline = []
-        if data:
-            start_f = data[0]['frame_num']
-            curr_t = sorted(data[0]['touches'])
-            for i in range(1, len(data)):
-                t = sorted(data[i]['touches'])
-                if t != curr_t:
-                    if curr_t:
-                        timeline.append({"start_frame": start_f, "end_frame": data[i-1]['frame_num'], "regions": curr_t})
-                    start_f = data[i]['frame_num']; curr_t = t
-            if curr_t:
-                timeline.append({"start_frame": start_f, "end_frame": data[-1]['frame_num'], "regions": curr_t})
+        timeline = [{"start_frame": s, "end_frame": e, "regions": sorted(regions)}
+                    for s, e, (regions,) in data.runs('touches') if regions]
 
         return {
             "total_frames": len(data),
-            "touch_count": len([d for d in data if d['touches']]),
+            "touch_count": int(np.count_nonzero(data.col('touches'))),
             "region_distribution": counts,
             "timeline": timeline,
-            "frames": data
+            "frames": data.to_records()
         }
 
     def _print_report(self, data):
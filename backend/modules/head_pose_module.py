@@ -1,22 +1,42 @@
 import cv2
-import mediapipe as mp
+import math
 import numpy as np
-from collections import deque
 import os
-
-class HeadPoseAnalyzer:
-    """Analyses head pose: angles, depth, stiffness, withdrawal, nodding/shaking."""
-
-    def __init__(self):
-        self.mp_face_mesh = mp.solutions.face_mesh
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            static_image_mode=False,
-            max_num_faces=1,
-            refine_landmarks=False,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
-
+from frame_source import FrameAnalyzer
+from frame_columns import Column
+from rolling_stats import RollingWindow, rolling_std, rolling_ptp, rolling_crossings
+
+class HeadPoseAnalyzer(FrameAnalyzer):
+    """Analyses head pose: angles, depth, stiffness, withdrawal, nodding/shaking.
+
+    Stiffness and nodding/shaking come from sliding windows over the angle
+    series (rolling_stats): RollingWindow per frame, the rolling_* batch
+    functions over a whole segment in process_landmarks().
+
+    Poses come from estimate_poses() over (N, 6, 2) image points: solvePnP
+    warm-started from the previous frame, with Rodrigues/Euler conversion
+    and axis projection done for all frames at once. fast_pnp (or
+    DECEPTRON_FAST_PNP=1) accepts the closed-form EPnP pose for frames
+    whose reprojection error stays low.
+    """
+
+    uses_face_mesh = True
+    batch_landmarks = True
+    FRAME_SCHEMA = [
+        Column('pitch', np.float32, 2),
+        Column('yaw', np.float32, 2),
+        Column('roll', np.float32, 2),
+        Column('z_depth', np.float32, 2),
+        Column('stiffness_score', np.float32, 2),
+        Column('withdrawal_score', np.float32, 2),
+        Column('is_nodding', np.bool_),
+        Column('is_shaking', np.bool_),
+        # Overlay geometry (normalized): nose tip and the projected X/Y/Z axis ends
+        Column('pose_axes', np.float32, shape=(4, 2), export=False),
+        Column('calibrating', np.bool_, export=False),
+    ]
+
+    def __init__(self, fast_pnp=None):
         self.IDX_NOSE = 1
         self.IDX_CHIN = 152
         self.IDX_LEYE = 33
@@ -45,146 +65,305 @@ class HeadPoseAnalyzer:
         self.baseline_yaw = None
         self.baseline_roll = None
 
-    def _landmark_point(self, landmarks, idx, img_w, img_h):
-        lm = landmarks[idx]
-        return (int(lm.x * img_w), int(lm.y * img_h))
-
-    def _build_image_points(self, landmarks, img_w, img_h):
-        return np.array([
-            self._landmark_point(landmarks, self.IDX_NOSE, img_w, img_h),
-            self._landmark_point(landmarks, self.IDX_CHIN, img_w, img_h),
-            self._landmark_point(landmarks, self.IDX_LEYE, img_w, img_h),
-            self._landmark_point(landmarks, self.IDX_REYE, img_w, img_h),
-            self._landmark_point(landmarks, self.IDX_LMOUTH, img_w, img_h),
-            self._landmark_point(landmarks, self.IDX_RMOUTH, img_w, img_h)
-        ], dtype=np.float32)
-
-    def _rotation_matrix_to_euler_angles(self, R):
-        sy = np.sqrt(R[0, 0]**2 + R[1, 0]**2)
-        if sy > 1e-6:
-            pitch = np.arctan2(R[2, 1], R[2, 2])
-            yaw = np.arctan2(-R[2, 0], sy)
-            roll = np.arctan2(R[1, 0], R[0, 0])
+        # Optional closed-form pose (EPnP) for frames where it fits well enough;
+        # DECEPTRON_FAST_PNP=1 turns it on for analyzers created without the flag
+        self.fast_pnp = fast_pnp if fast_pnp is not None else os.environ.get("DECEPTRON_FAST_PNP", "0") == "1"
+        self.fast_pnp_max_error = 0.03   # RMS reprojection error / eye distance
+        self.fast_pnp_backoff = 30       # frames without the fast path after it is rejected
+        self.warm_restart_margin = 0.02  # re-solve from scratch when a warm start fits this much worse
+
+    def _image_points(self, coords):
+        """(N, 478, 2+) normalized landmarks -> (N, 6, 2) pixel points (truncated like int())."""
+        idx = [self.IDX_NOSE, self.IDX_CHIN, self.IDX_LEYE, self.IDX_REYE, self.IDX_LMOUTH, self.IDX_RMOUTH]
+        pts = coords[:, idx, :2]
+        return np.ascontiguousarray(np.trunc(np.stack([pts[..., 0] * self.width, pts[..., 1] * self.height], axis=-1)), dtype=np.float32)
+
+    @staticmethod
+    def _rotation_matrices(rvecs):
+        """Rodrigues vectors (N, 3) -> rotation matrices (N, 3, 3)."""
+        theta = np.linalg.norm(rvecs, axis=1)
+        k = np.divide(rvecs, theta[:, None], out=np.zeros_like(rvecs), where=theta[:, None] > 0)
+        K = np.zeros((len(rvecs), 3, 3))
+        K[:, 0, 1], K[:, 0, 2], K[:, 1, 2] = -k[:, 2], k[:, 1], -k[:, 0]
+        K[:, 1, 0], K[:, 2, 0], K[:, 2, 1] = k[:, 2], -k[:, 1], k[:, 0]
+        s, c = np.sin(theta)[:, None, None], np.cos(theta)[:, None, None]
+        return np.eye(3) + s * K + (1 - c) * (K @ K)
+
+    @staticmethod
+    def _euler_angles(R):
+        """Rotation matrices (N, 3, 3) -> (pitch, yaw, roll) in degrees, (N, 3)."""
+        sy = np.sqrt(R[:, 0, 0]**2 + R[:, 1, 0]**2)
+        regular = sy > 1e-6
+        pitch = np.where(regular, np.arctan2(R[:, 2, 1], R[:, 2, 2]), np.arctan2(-R[:, 1, 2], R[:, 1, 1]))
+        yaw = np.arctan2(-R[:, 2, 0], sy)
+        roll = np.where(regular, np.arctan2(R[:, 1, 0], R[:, 0, 0]), 0.0)
+        return np.rad2deg(np.stack([pitch, yaw, roll], axis=1))
+
+    def _reprojection_error(self, img_pts, rvec, tvec):
+        """RMS reprojection error relative to the eye distance (scale-free)."""
+        proj, _ = cv2.projectPoints(self.model_points, rvec, tvec, self.cam_matrix, self.dist_coeffs)
+        eye_dist = math.hypot(*(img_pts[2] - img_pts[3]).tolist()) or 1.0
+        return cv2.norm(proj[:, 0].astype(np.float32), img_pts, cv2.NORM_L2) / math.sqrt(len(img_pts)) / eye_dist
+
+    def _solve(self, img_pts, flags, guess=None):
+        """One solvePnP call: (rvec, tvec, error), or None if it fails or lands behind the camera."""
+        if guess is None:
+            ok, rvec, tvec = cv2.solvePnP(self.model_points, img_pts, self.cam_matrix, self.dist_coeffs, flags=flags)
         else:
-            pitch = np.arctan2(-R[1, 2], R[1, 1]); yaw = np.arctan2(-R[2, 0], sy); roll = 0.0
-        return float(np.rad2deg(pitch)), float(np.rad2deg(yaw)), float(np.rad2deg(roll))
-
-    def process_video(self, input_path, output_path=None, start_frame=None, end_frame=None, verbose=True, scale=1.0):
-        cap = cv2.VideoCapture(input_path)
-        if not cap.isOpened(): raise ValueError(f"Cannot open video: {input_path}")
-        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        out_w, out_h = int(width * scale), int(height * scale)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-        if start_frame is None: start_frame = 1
-        if end_frame is None: end_frame = total_frames
-
-        out = None
-        if output_path:
-            fourcc = cv2.VideoWriter_fourcc(*'H264'); out = cv2.VideoWriter(output_path, fourcc, fps, (out_w, out_h))
-        cam_matrix = np.array([[width, 0, width/2], [0, width, height/2], [0, 0, 1]], dtype=np.float32)
-        dist_coeffs = np.zeros((4, 1))
-
-        auto_calib = (start_frame == 1 and self.baseline_depth is None)
-        calib_duration, calib_ended = 5.0, not auto_calib
-        calib_depths, calib_pitches, calib_yaws, calib_rolls = [], [], [], []
+            ok, rvec, tvec = cv2.solvePnP(self.model_points, img_pts, self.cam_matrix, self.dist_coeffs,
+                                          rvec=guess[0].copy(), tvec=guess[1].copy(), useExtrinsicGuess=True, flags=flags)
+        if not ok or tvec[2, 0] <= 0:
+            return None
+        return rvec, tvec, self._reprojection_error(img_pts, rvec, tvec)
+
+    def _solve_cold(self, img_pts):
+        """Pose without a previous frame: EPnP seed refined iteratively.
+
+        A plain iterative solve can settle on the mirrored pose behind the
+        camera; seeding from EPnP avoids that.
+        """
+        seed = self._solve(img_pts, cv2.SOLVEPNP_EPNP)
+        pose = self._solve(img_pts, cv2.SOLVEPNP_ITERATIVE, guess=seed) if seed is not None else None
+        if pose is None:
+            ok, rvec, tvec = cv2.solvePnP(self.model_points, img_pts, self.cam_matrix, self.dist_coeffs, flags=cv2.SOLVEPNP_ITERATIVE)
+            pose = (rvec, tvec, self._reprojection_error(img_pts, rvec, tvec)) if ok else None
+        return pose
+
+    def estimate_poses(self, img_pts):
+        """Pose of each frame in img_pts (N, 6, 2), in order.
+
+        Each frame is warm-started from the previous frame's pose (also across
+        calls) and solved from scratch only when that fit is clearly worse.
+        With fast_pnp, the closed-form EPnP pose is used as is while its
+        reprojection error stays below fast_pnp_max_error.
+
+        Returns:
+            (ok (N,) bool, rvecs (N, 3), tvecs (N, 3))
+        """
+        n = len(img_pts)
+        ok = np.zeros(n, dtype=bool)
+        rvecs, tvecs = np.zeros((n, 3)), np.zeros((n, 3))
+        for i, pts in enumerate(img_pts):
+            pose, kind = None, None
+            if self.fast_pnp and self._fast_skip == 0:
+                pose, kind = self._solve(pts, cv2.SOLVEPNP_EPNP), 'fast'
+                if pose is None or pose[2] > self.fast_pnp_max_error:
+                    # Error too high for this session right now: back off for a while
+                    pose, self._fast_skip = None, self.fast_pnp_backoff
+            elif self._fast_skip:
+                self._fast_skip -= 1
+            if pose is None and self._prev_pose is not None:
+                pose, kind = self._solve(pts, cv2.SOLVEPNP_ITERATIVE, guess=self._prev_pose), 'warm'
+                if pose is None or pose[2] > self._prev_pose[2] + self.warm_restart_margin:
+                    cold = self._solve_cold(pts)
+                    if cold is not None and (pose is None or cold[2] < pose[2]):
+                        pose, kind = cold, 'cold'
+            if pose is None:
+                pose, kind = self._solve_cold(pts), 'cold'
+            if pose is None:
+                continue
+            self._prev_pose = pose
+            self.pnp_stats[kind] += 1
+            ok[i], rvecs[i], tvecs[i] = True, pose[0][:, 0], pose[1][:, 0]
+        return ok, rvecs, tvecs
+
+    def _poses(self, coords):
+        """Head pose of landmark frames (N, 478, 2+).
+
+        Returns:
+            (ok (N,) bool, angles (N, 3) pitch/yaw/roll degrees, z_depth (N,), pose_axes (N, 4, 2))
+        """
+        img_pts = self._image_points(coords)
+        ok, rvecs, tvecs = self.estimate_poses(img_pts)
+        R = self._rotation_matrices(rvecs)
+        angles = self._euler_angles(R)
+        z_depth = np.linalg.norm(tvecs, axis=1)
+
+        # Nose tip and the projected ends of 50 mm X/Y/Z axes, normalized
+        cam = self.cam_matrix.astype(np.float64)
+        ends = np.einsum('nij,kj->nki', R, np.eye(3) * 50.0) + tvecs[:, None, :]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            proj = ends[..., :2] / ends[..., 2:] * (cam[0, 0], cam[1, 1]) + (cam[0, 2], cam[1, 2])
+        pose_axes = np.concatenate([img_pts[:, :1], proj], axis=1) / (self.width, self.height)
+        pose_axes = pose_axes.astype(np.float32)
+        pose_axes[~ok] = np.nan
+        return ok, angles, z_depth, pose_axes
+
+    def reset(self, start_frame):
+        width, height, fps = self.width, self.height, self.fps
+        self.cam_matrix = np.array([[width, 0, width/2], [0, width, height/2], [0, 0, 1]], dtype=np.float32)
+        self.dist_coeffs = np.zeros((4, 1))
+
+        self.auto_calib = (start_frame == 1 and self.baseline_depth is None)
+        self.calib_duration, self.calib_ended = 5.0, not self.auto_calib
+        self.calib_depths, self.calib_pitches, self.calib_yaws, self.calib_rolls = [], [], [], []
 
         stiff_len = max(2, int(fps * self.stiffness_window_sec))
-        p_win, y_win, r_win = deque(maxlen=stiff_len), deque(maxlen=stiff_len), deque(maxlen=stiff_len)
+        self.p_win, self.y_win, self.r_win = RollingWindow(stiff_len), RollingWindow(stiff_len), RollingWindow(stiff_len)
         nod_len = max(2, int(fps * self.nodding_window_sec))
-        pv_hist, yv_hist, pval_hist, yval_hist = deque(maxlen=nod_len), deque(maxlen=nod_len), deque(maxlen=nod_len), deque(maxlen=nod_len)
-
-        frame_data_list, frame_idx = [], 0
-        prev_p = prev_y = None
-
-        while True:
-            ret, frame = cap.read()
-            if not ret: break
-            frame_idx += 1
-            if frame_idx < start_frame: continue
-            if frame_idx > end_frame: break
-
-            timestamp = frame_idx / fps
-            pitch = yaw = roll = withdrawal = stiffness = 0.0
-            z_depth = 500.0
-            is_nodding = is_shaking = False
-
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.face_mesh.process(rgb)
-
-            if results.multi_face_landmarks:
-                landmarks = results.multi_face_landmarks[0].landmark
-                img_pts = self._build_image_points(landmarks, width, height)
-                nose_img = tuple(img_pts[0].astype(int))
-
-                success, rvec, tvec = cv2.solvePnP(self.model_points, img_pts, cam_matrix, dist_coeffs, flags=cv2.SOLVEPNP_ITERATIVE)
-                if success:
-                    R, _ = cv2.Rodrigues(rvec)
-                    pitch, yaw, roll = self._rotation_matrix_to_euler_angles(R)
-                    z_depth = float(np.linalg.norm(tvec))
-
-                    if auto_calib and not calib_ended and timestamp <= calib_duration:
-                        calib_depths.append(z_depth); calib_pitches.append(pitch); calib_yaws.append(yaw); calib_rolls.append(roll)
-                        if out: cv2.putText(frame, "Scanning Signal...", (10, 30), 0, 0.8, (0, 255, 255), 2); out.write(cv2.resize(frame, (out_w, out_h)) if scale != 1.0 else frame)
-                        frame_data_list.append({'frame_num': frame_idx, 'timestamp': timestamp, 'pitch': 0.0, 'yaw': 0.0, 'roll': 0.0, 'z_depth': 0.0, 'stiffness_score': 0.0, 'withdrawal_score': 0.0, 'is_nodding': False, 'is_shaking': False})
-                        continue
-
-                    if auto_calib and not calib_ended:
-                        calib_ended = True
-                        self.baseline_depth = float(np.mean(calib_depths)) if calib_depths else z_depth
-                        self.baseline_pitch = float(np.mean(calib_pitches)) if calib_pitches else pitch
-                        self.baseline_yaw = float(np.mean(calib_yaws)) if calib_yaws else yaw
-                        self.baseline_roll = float(np.mean(calib_rolls)) if calib_rolls else roll
-
-                    if self.baseline_depth:
-                        withdrawal = max(0.0, min(100.0, ((z_depth - self.baseline_depth) / self.baseline_depth) * self.withdrawal_scale))
-
-                    p_win.append(pitch); y_win.append(yaw); r_win.append(roll)
-                    if len(p_win) >= 2: stiffness = max(0.0, min(100.0, 100.0 - self.stiffness_scale * np.mean([np.std(p_win), np.std(y_win), np.std(r_win)])))
-
-                    pv = pitch - prev_p if prev_p is not None else 0.0
-                    yv = yaw - prev_y if prev_y is not None else 0.0
-                    prev_p, prev_y = pitch, yaw
-                    pv_hist.append(pv); yv_hist.append(yv); pval_hist.append(pitch); yval_hist.append(yaw)
-
-                    if len(pv_hist) >= 3:
-                        is_nodding = sum(1 for i in range(1, len(pv_hist)) if np.sign(pv_hist[i-1]) != np.sign(pv_hist[i]) and pv_hist[i] != 0) >= self.nodding_zero_cross_thresh and (max(pval_hist) - min(pval_hist)) >= self.nodding_amplitude_thresh
-                        is_shaking = sum(1 for i in range(1, len(yv_hist)) if np.sign(yv_hist[i-1]) != np.sign(yv_hist[i]) and yv_hist[i] != 0) >= self.nodding_zero_cross_thresh and (max(yval_hist) - min(yval_hist)) >= self.nodding_amplitude_thresh
-
-                    if out:
-                        axis_pts, _ = cv2.projectPoints(np.array([[50,0,0],[0,50,0],[0,0,50]], dtype=np.float32), rvec, tvec, cam_matrix, dist_coeffs)
-                        cv2.line(frame, nose_img, tuple(axis_pts[0][0].astype(int)), (0,0,255), 2)
-                        cv2.line(frame, nose_img, tuple(axis_pts[1][0].astype(int)), (0,255,0), 2)
-                        cv2.line(frame, nose_img, tuple(axis_pts[2][0].astype(int)), (255,0,0), 2)
-                        stext = f"P:{pitch:.1f} Y:{yaw:.1f} R:{roll:.1f} Stiff:{stiffness:.0f}%"
-                        cv2.putText(frame, stext, (10, 20), 0, 0.45, (255, 255, 255), 1, cv2.LINE_AA)
-
-            if out: out.write(cv2.resize(frame, (out_w, out_h)) if scale != 1.0 else frame)
-            frame_data_list.append({'frame_num': frame_idx, 'timestamp': timestamp, 'pitch': round(float(pitch), 2), 'yaw': round(float(yaw), 2), 'roll': round(float(roll), 2), 'z_depth': round(float(z_depth), 2), 'stiffness_score': round(float(stiffness), 2), 'withdrawal_score': round(float(withdrawal), 2), 'is_nodding': bool(is_nodding), 'is_shaking': bool(is_shaking)})
-
-        cap.release()
-        if out: out.release()
-        return frame_data_list
+        self.pv_hist, self.yv_hist, self.pval_hist, self.yval_hist = RollingWindow(nod_len), RollingWindow(nod_len), RollingWindow(nod_len), RollingWindow(nod_len)
+        self.prev_p = self.prev_y = None
+        self._prev_pose = None
+        self._fast_skip = 0
+        self.pnp_stats = {'fast': 0, 'warm': 0, 'cold': 0}
+
+    def _stiffness(self, std_p, std_y, std_r):
+        return np.clip(100.0 - self.stiffness_scale * ((std_p + std_y + std_r) / 3), 0.0, 100.0)
+
+    def process_frame(self, frame_idx, frame, rgb, landmarks=None):
+        pv_hist, yv_hist, pval_hist, yval_hist = self.pv_hist, self.yv_hist, self.pval_hist, self.yval_hist
+        timestamp = frame_idx / self.fps
+        pitch = yaw = roll = withdrawal = stiffness = 0.0
+        z_depth = 500.0
+        is_nodding = is_shaking = False
+        pose_axes = np.full((4, 2), np.nan, dtype=np.float32)
+
+        ok = False
+        if landmarks is not None:
+            ok, angles, depths, axes = self._poses(landmarks[None])
+            ok = ok[0]
+        if ok:
+            pitch, yaw, roll = angles[0].tolist()
+            z_depth = float(depths[0])
+            if self.auto_calib and not self.calib_ended and timestamp <= self.calib_duration:
+                self.calib_depths.append(z_depth); self.calib_pitches.append(pitch); self.calib_yaws.append(yaw); self.calib_rolls.append(roll)
+                self.frame_data.append({'frame_num': frame_idx, 'timestamp': timestamp, 'pitch': 0.0, 'yaw': 0.0, 'roll': 0.0, 'z_depth': 0.0, 'stiffness_score': 0.0, 'withdrawal_score': 0.0, 'is_nodding': False, 'is_shaking': False, 'pose_axes': pose_axes, 'calibrating': True})
+                self.write_overlay(frame, landmarks)
+                return
+
+            if self.auto_calib and not self.calib_ended:
+                self.calib_ended = True
+                self.baseline_depth = float(np.mean(self.calib_depths)) if self.calib_depths else z_depth
+                self.baseline_pitch = float(np.mean(self.calib_pitches)) if self.calib_pitches else pitch
+                self.baseline_yaw = float(np.mean(self.calib_yaws)) if self.calib_yaws else yaw
+                self.baseline_roll = float(np.mean(self.calib_rolls)) if self.calib_rolls else roll
+
+            if self.baseline_depth:
+                withdrawal = max(0.0, min(100.0, ((z_depth - self.baseline_depth) / self.baseline_depth) * self.withdrawal_scale))
+
+            self.p_win.push(pitch); self.y_win.push(yaw); self.r_win.push(roll)
+            if len(self.p_win) >= 2: stiffness = self._stiffness(self.p_win.std(), self.y_win.std(), self.r_win.std())
+
+            pv = pitch - self.prev_p if self.prev_p is not None else 0.0
+            yv = yaw - self.prev_y if self.prev_y is not None else 0.0
+            self.prev_p, self.prev_y = pitch, yaw
+            pv_hist.push(pv); yv_hist.push(yv); pval_hist.push(pitch); yval_hist.push(yaw)
+
+            if len(pv_hist) >= 3:
+                is_nodding = pv_hist.crossings() >= self.nodding_zero_cross_thresh and pval_hist.ptp() >= self.nodding_amplitude_thresh
+                is_shaking = yv_hist.crossings() >= self.nodding_zero_cross_thresh and yval_hist.ptp() >= self.nodding_amplitude_thresh
+
+            pose_axes = axes[0]
+
+        self.frame_data.append({'frame_num': frame_idx, 'timestamp': timestamp, 'pitch': round(float(pitch), 2), 'yaw': round(float(yaw), 2), 'roll': round(float(roll), 2), 'z_depth': round(float(z_depth), 2), 'stiffness_score': round(float(stiffness), 2), 'withdrawal_score': round(float(withdrawal), 2), 'is_nodding': bool(is_nodding), 'is_shaking': bool(is_shaking), 'pose_axes': pose_axes, 'calibrating': False})
+        self.write_overlay(frame, landmarks)
+
+    def process_landmarks(self, store):
+        """Whole-segment form of process_frame: batched pose estimation, then
+        the window statistics over the whole angle arrays at once."""
+        nums, present = store.frame_nums, store.present
+        keep = (nums >= self.start_frame) & (nums <= self.end_frame)
+        nums, present, coords = nums[keep], present[keep], store.coords[keep]
+        n = len(nums)
+        angles = np.zeros((n, 3))
+        z_depth = np.full(n, 500.0)
+        pose_axes = np.full((n, 4, 2), np.nan, dtype=np.float32)
+        valid = np.zeros(n, dtype=bool)
+        ok, face_angles, face_depth, face_axes = self._poses(coords[present])
+        face = np.flatnonzero(present)[ok]
+        valid[face] = True
+        angles[face], z_depth[face], pose_axes[face] = face_angles[ok], face_depth[ok], face_axes[ok]
+
+        calibrating = np.zeros(n, dtype=bool)
+        if self.auto_calib and not self.calib_ended:
+            calibrating = valid & (nums / self.fps <= self.calib_duration)
+            self.calib_depths += z_depth[calibrating].tolist()
+            self.calib_pitches += angles[calibrating, 0].tolist()
+            self.calib_yaws += angles[calibrating, 1].tolist()
+            self.calib_rolls += angles[calibrating, 2].tolist()
+        live = valid & ~calibrating
+        if self.auto_calib and not self.calib_ended and live.any():
+            first = np.flatnonzero(live)[0]
+            self.calib_ended = True
+            self.baseline_depth = float(np.mean(self.calib_depths)) if self.calib_depths else float(z_depth[first])
+            self.baseline_pitch = float(np.mean(self.calib_pitches)) if self.calib_pitches else float(angles[first, 0])
+            self.baseline_yaw = float(np.mean(self.calib_yaws)) if self.calib_yaws else float(angles[first, 1])
+            self.baseline_roll = float(np.mean(self.calib_rolls)) if self.calib_rolls else float(angles[first, 2])
+        angles[calibrating] = 0.0
+        z_depth[calibrating] = 0.0
+        pose_axes[calibrating] = np.nan
+
+        withdrawal, stiffness = np.zeros(n), np.zeros(n)
+        is_nodding, is_shaking = np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+        if self.baseline_depth:
+            withdrawal[live] = np.clip(((z_depth[live] - self.baseline_depth) / self.baseline_depth) * self.withdrawal_scale, 0.0, 100.0)
+        if live.any():
+            p, y, r = angles[live].T
+            steps = np.arange(1, len(p) + 1)
+            size = self.p_win.size
+            stiff = self._stiffness(rolling_std(p, size, self.p_win.values()),
+                                    rolling_std(y, size, self.y_win.values()),
+                                    rolling_std(r, size, self.r_win.values()))
+            stiffness[live] = np.where(np.minimum(len(self.p_win) + steps, size) >= 2, stiff, 0.0)
+
+            pv = np.diff(p, prepend=self.prev_p if self.prev_p is not None else p[0])
+            yv = np.diff(y, prepend=self.prev_y if self.prev_y is not None else y[0])
+            size = self.pv_hist.size
+            filled = np.minimum(len(self.pv_hist) + steps, size) >= 3
+            is_nodding[live] = filled & (rolling_crossings(pv, size, self.pv_hist.values()) >= self.nodding_zero_cross_thresh) \
+                & (rolling_ptp(p, size, self.pval_hist.values()) >= self.nodding_amplitude_thresh)
+            is_shaking[live] = filled & (rolling_crossings(yv, size, self.yv_hist.values()) >= self.nodding_zero_cross_thresh) \
+                & (rolling_ptp(y, size, self.yval_hist.values()) >= self.nodding_amplitude_thresh)
+
+            # Carry the windows over to the next call
+            for win, x in ((self.p_win, p), (self.y_win, y), (self.r_win, r),
+                           (self.pv_hist, pv), (self.yv_hist, yv), (self.pval_hist, p), (self.yval_hist, y)):
+                for v in x[-win.size:]:
+                    win.push(v)
+            self.prev_p, self.prev_y = float(p[-1]), float(y[-1])
+
+        self.frame_data.extend({
+            'frame_num': nums,
+            'pitch': np.round(angles[:, 0], 2), 'yaw': np.round(angles[:, 1], 2), 'roll': np.round(angles[:, 2], 2),
+            'z_depth': np.round(z_depth, 2),
+            'stiffness_score': np.round(stiffness, 2), 'withdrawal_score': np.round(withdrawal, 2),
+            'is_nodding': is_nodding, 'is_shaking': is_shaking,
+            'pose_axes': pose_axes, 'calibrating': calibrating,
+        })
+        if self.verbose: print(f"Head Pose Processed: {n} frames")
+
+    def draw_overlay(self, frame, rec, landmarks=None):
+        if rec['calibrating']:
+            cv2.putText(frame, "Scanning Signal...", (10, 30), 0, 0.8, (0, 255, 255), 2)
+            return
+        axes = rec['pose_axes']
+        if not np.isfinite(axes).all(): return
+        height, width = frame.shape[:2]
+        nose_img, x_end, y_end, z_end = [tuple(p) for p in (axes * (width, height)).astype(int).tolist()]
+        cv2.line(frame, nose_img, x_end, (0,0,255), 2)
+        cv2.line(frame, nose_img, y_end, (0,255,0), 2)
+        cv2.line(frame, nose_img, z_end, (255,0,0), 2)
+        stext = f"P:{rec['pitch']:.1f} Y:{rec['yaw']:.1f} R:{rec['roll']:.1f} Stiff:{rec['stiffness_score']:.0f}%"
+        cv2.putText(frame, stext, (10, 20), 0, 0.45, (255, 255, 255), 1, cv2.LINE_AA)
 
     def get_summary(self, data):
         if not data: return {}
-        eval_data = [d for d in data if d['pitch'] != 0 or d['yaw'] != 0]
-        if not eval_data: return {"total_frames": len(data), "frames": data}
+        eval_data = data[(data.col('pitch') != 0) | (data.col('yaw') != 0)]
+        if not eval_data: return {"total_frames": len(data), "frames": data.to_records()}
         return {
             "total_frames": len(data),
             "averages": {
-                "pitch": round(float(np.mean([d['pitch'] for d in eval_data])), 2),
-                "yaw": round(float(np.mean([d['yaw'] for d in eval_data])), 2),
-                "roll": round(float(np.mean([d['roll'] for d in eval_data])), 2),
-                "stiffness": round(float(np.mean([d['stiffness_score'] for d in eval_data])), 1),
-                "withdrawal": round(float(np.mean([d['withdrawal_score'] for d in eval_data])), 1)
+                "pitch": round(eval_data.mean('pitch'), 2),
+                "yaw": round(eval_data.mean('yaw'), 2),
+                "roll": round(eval_data.mean('roll'), 2),
+                "stiffness": round(eval_data.mean('stiffness_score'), 1),
+                "withdrawal": round(eval_data.mean('withdrawal_score'), 1)
             },
             "dynamics": {
-                "nodding_percent": round((sum(1 for d in eval_data if d['is_nodding']) / len(eval_data)) * 100, 1),
-                "shaking_percent": round((sum(1 for d in eval_data if d['is_shaking']) / len(eval_data)) * 100, 1)
+                "nodding_percent": round(eval_data.percent(eval_data.col('is_nodding')), 1),
+                "shaking_percent": round(eval_data.percent(eval_data.col('is_shaking')), 1)
             },
-            "frames": data
+            "frames": data.to_records()
         }
 
     def _print_report(self, data):
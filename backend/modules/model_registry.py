@@ -0,0 +1,195 @@
+"""
+model_registry.py
+
+Process-wide registry of the heavy models (Whisper, HSEmotion, pyannote).
+Analyzers and routes used to load their own copy on construction, so every
+consumer (segment manager, voice analyzer, each route, every pipeline
+request) added another Whisper "base" and emotion model to the process.
+Consumers now acquire models here instead: the first acquire of a key loads
+it, later ones get the same instance, and release() drops the reference.
+
+Models stay loaded once their last reference is released, so a new
+per-request pipeline finds them warm; DECEPTRON_MODEL_KEEP_WARM=0 unloads
+them at the last release instead, and unload_unused() frees idle ones.
+
+Models that are not safe to run from several threads at once (Whisper's
+decoder hooks its KV cache onto the shared modules) are used under
+MODELS.guard(model).
+
+Class:
+    ModelRegistry
+        register(kind, loader)
+        acquire(kind, *args) -> model, release(model), use(kind, *args) (context manager)
+        guard(model) -> threading.Lock
+        loaded() -> {key: reference count}, unload_unused()
+    MODELS - the process-wide registry, with loaders for
+        'whisper' (size), 'hsemotion' (model_name, device),
+        'emotion-onnx' (model_name, quantized), 'pyannote' (device)
+"""
+
+import os
+import sys
+import threading
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def local_models_dir(name):
+    """myenv/local_models/<name> of the source tree, or of the bundle / next to the EXE when frozen."""
+    if getattr(sys, 'frozen', False):
+        # Prioritize internal bundled models for portability
+        path = Path(sys._MEIPASS) / "myenv" / "local_models" / name
+        if not path.exists():
+            path = Path(sys.executable).parent / "myenv" / "local_models" / name
+        return path
+    return Path(__file__).resolve().parent.parent / "myenv" / "local_models" / name
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()   # held while the model loads
+        self.model = None
+        self.refs = 0
+
+
+class ModelRegistry:
+    """Lazily loaded, reference-counted models shared by every consumer in the process."""
+
+    def __init__(self, keep_warm=None):
+        if keep_warm is None:
+            keep_warm = os.environ.get("DECEPTRON_MODEL_KEEP_WARM", "1").strip().lower() not in ("0", "false", "no", "off")
+        self.keep_warm = keep_warm
+        self._loaders = {}
+        self._entries = {}
+        self._keys = {}                # id(model) -> key
+        self._guards = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def register(self, kind, loader):
+        """loader(*args) builds the model of kind for one argument tuple."""
+        self._loaders[kind] = loader
+
+    def acquire(self, kind, *args):
+        """The shared model for (kind, *args), loaded on first use; pair with release()."""
+        if kind not in self._loaders:
+            raise KeyError(f"Unknown model kind: {kind}")
+        key = (kind,) + args
+        with self._lock:
+            entry = self._entries.setdefault(key, _Entry())
+            entry.refs += 1
+        try:
+            # Loads of different models run in parallel; the same one loads once
+            with entry.lock:
+                if entry.model is None:
+                    entry.model = self._loaders[kind](*args)
+                    with self._lock:
+                        self._keys[id(entry.model)] = key
+        except Exception:
+            with self._lock:
+                entry.refs -= 1
+                if not entry.refs and entry.model is None:
+                    self._entries.pop(key, None)
+            raise
+        return entry.model
+
+    def release(self, model):
+        """Drop one reference to a model returned by acquire()."""
+        if model is None:
+            return
+        with self._lock:
+            key = self._keys.get(id(model))
+            entry = self._entries.get(key)
+            if entry is None or entry.refs <= 0:
+                return
+            entry.refs -= 1
+            if not entry.refs and not self.keep_warm:
+                self._drop(key)
+
+    @contextmanager
+    def use(self, kind, *args):
+        model = self.acquire(kind, *args)
+        try:
+            yield model
+        finally:
+            self.release(model)
+
+    def guard(self, model):
+        """Lock serializing inference on one model instance."""
+        with self._lock:
+            lock = self._guards.get(model)
+            if lock is None:
+                lock = self._guards[model] = threading.Lock()
+            return lock
+
+    def loaded(self):
+        with self._lock:
+            return {key: entry.refs for key, entry in self._entries.items() if entry.model is not None}
+
+    def unload_unused(self):
+        """Free every loaded model nobody holds a reference to."""
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if not e.refs and e.model is not None]:
+                self._drop(key)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._keys.pop(id(entry.model), None)
+        entry.model = None
+
+
+# Loaders (heavy imports stay inside them)
+def _load_whisper(size):
+    import whisper
+    models_dir = local_models_dir("whisper")
+    print(f"Loading Whisper model '{size}' from {models_dir} …")
+    try:
+        return whisper.load_model(size, download_root=str(models_dir))
+    except Exception:
+        return whisper.load_model(size)
+
+
+def _load_hsemotion(model_name, device):
+    import torch
+    from hsemotion.facial_emotions import HSEmotionRecognizer
+    print(f"Loading Emotion Detection Model ({model_name}) on {device}...")
+    try:
+        return HSEmotionRecognizer(model_name=model_name, device=device)
+    except Exception as e:
+        if "WeightsUnpickler" in str(e) or "unpickle" in str(e):
+            print("Patching torch.load for compatibility...")
+            original_load = torch.load
+            torch.load = lambda *args, **kwargs: original_load(*args, **{**kwargs, 'weights_only': False})
+            try:
+                return HSEmotionRecognizer(model_name=model_name, device=device)
+            finally:
+                torch.load = original_load
+        raise
+
+
+def _load_emotion_onnx(model_name, quantized):
+    from emotion_onnx import OnnxEmotionRecognizer
+    return OnnxEmotionRecognizer(model_name, quantized=quantized)
+
+
+def _load_pyannote(device):
+    import torch
+    from pyannote.audio import Pipeline
+    local_config = local_models_dir("diarizer") / "config.yaml"
+    if not local_config.exists():
+        raise FileNotFoundError(
+            f"Local models not found at {local_config}. "
+            "Ensure models are bundled or placed in 'myenv/local_models' next to the EXE."
+        )
+    print(f"Loading Pyannote Diarization from {local_config}...")
+    pipeline = Pipeline.from_pretrained(str(local_config))
+    pipeline.to(torch.device(device))
+    print("Pyannote loaded successfully.")
+    return pipeline
+
+
+MODELS = ModelRegistry()
+MODELS.register('whisper', _load_whisper)
+MODELS.register('hsemotion', _load_hsemotion)
+MODELS.register('emotion-onnx', _load_emotion_onnx)
+MODELS.register('pyannote', _load_pyannote)
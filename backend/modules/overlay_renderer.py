@@ -0,0 +1,178 @@
+"""
+overlay_renderer.py
+
+Render stage for the annotated module videos.
+Analysis runs do not draw or encode anything; each module's overlay is
+replayed afterwards from the cached per-frame results and landmarks of a
+SessionStore, and only for the videos that are actually requested.
+
+The presentation video is composited in the same single pass: every tile
+is drawn into one canvas per frame and the raw canvas is piped straight
+into one ffmpeg encoder (with the session audio muxed in), so no
+intermediate per-module MP4 is written or decoded again.
+
+Classes / functions:
+    OverlayTrack(analyzer, frame_data, landmarks)
+        FrameAnalyzer that draws one module's cached records onto the frames
+    CompositeTrack(tracks, output_path, audio_path=None, cols=2)
+        FrameAnalyzer that tiles several OverlayTracks into one ffmpeg stream
+    render_overlays(store, analyzers, outputs, max_height=720) -> {name: output_path}
+    render_composite(store, tiles, output_path, audio_path=None, max_height=720) -> bool
+"""
+
+import subprocess
+
+import cv2
+import numpy as np
+
+from frame_source import FrameAnalyzer, FrameSource
+
+
+class OverlayTrack(FrameAnalyzer):
+    """Replays the cached results of one analyzer as an annotated video."""
+
+    def __init__(self, analyzer, frame_data, landmarks=None):
+        self.analyzer = analyzer
+        self.data = frame_data
+        self.landmarks = landmarks
+
+    def reset(self, start_frame):
+        self._frame_nums = self.data.col('frame_num')
+
+    def draw(self, frame_idx, frame):
+        """Annotated copy of frame (unannotated if the frame has no record)."""
+        frame = frame.copy()
+        i = int(np.searchsorted(self._frame_nums, frame_idx))
+        if i < len(self._frame_nums) and self._frame_nums[i] == frame_idx:
+            lms = self.landmarks.get(frame_idx) if self.landmarks is not None else None
+            self.analyzer.draw_overlay(frame, self.data.row(i), lms)
+        return frame
+
+    def process_frame(self, frame_idx, frame, rgb, landmarks=None):
+        self.write_frame(self.draw(frame_idx, frame))
+
+
+class CompositeTrack(FrameAnalyzer):
+    """Draws several overlays into one grid canvas and pipes it to ffmpeg."""
+
+    def __init__(self, tracks, output_path, audio_path=None, cols=2):
+        self.tracks = tracks
+        self.output_path = output_path
+        self.audio_path = audio_path
+        self.cols = cols
+        self._proc = None
+
+    def begin(self, meta, start_frame, end_frame, output_path=None, scale=1.0, verbose=False):
+        super().begin(meta, start_frame, end_frame, verbose=verbose)
+        # libx264/yuv420p needs even dimensions
+        tile_w = max(2, int(meta.width * scale) // 2 * 2)
+        tile_h = max(2, int(meta.height * scale) // 2 * 2)
+        rows = (len(self.tracks) + self.cols - 1) // self.cols
+        self._tile = (tile_w, tile_h)
+        self._canvas = np.zeros((rows * tile_h, self.cols * tile_w, 3), dtype=np.uint8)
+        for t in self.tracks:
+            t.reset(start_frame)
+
+        cmd = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24",
+            "-s", f"{self._canvas.shape[1]}x{self._canvas.shape[0]}",
+            "-r", f"{meta.fps}", "-i", "-"
+        ]
+        if self.audio_path:
+            cmd += ["-i", self.audio_path, "-map", "0:v", "-map", "1:a",
+                    "-c:a", "aac", "-b:a", "128k", "-shortest"]
+        cmd += ["-c:v", "libx264", "-preset", "fast", "-crf", "23",
+                "-pix_fmt", "yuv420p", self.output_path]
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def process_frame(self, frame_idx, frame, rgb, landmarks=None):
+        tile_w, tile_h = self._tile
+        for n, track in enumerate(self.tracks):
+            r, c = divmod(n, self.cols)
+            tile = cv2.resize(track.draw(frame_idx, frame), (tile_w, tile_h))
+            self._canvas[r * tile_h:(r + 1) * tile_h, c * tile_w:(c + 1) * tile_w] = tile
+        self._proc.stdin.write(self._canvas.tobytes())
+
+    def finish(self):
+        proc, self._proc = self._proc, None
+        if proc is not None:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+            err = proc.stderr.read().decode(errors='replace')
+            if proc.wait() != 0:
+                raise RuntimeError(f"ffmpeg error: {err.strip()}")
+        return self.frame_data
+
+
+def render_overlays(store, analyzers, outputs, max_height=720):
+    """Render the annotated videos of several modules over one decode.
+
+    Args:
+        store: SessionStore holding the modules' results (and landmarks)
+        analyzers: {name: analyzer} used for drawing (draw_overlay only)
+        outputs: {name: output video path}
+        max_height: output videos are scaled down to at most this height
+
+    Returns:
+        dict: {name: output_path} of the videos that were written
+    """
+    names = [n for n in outputs if store.has(n)]
+    for n in outputs:
+        if n not in names:
+            print(f"  No cached results for {n}, video not rendered.")
+    if not names:
+        return {}
+
+    source = FrameSource(store.video_path)
+    h = source.meta.height
+    scale = min(float(max_height) / h, 1.0) if h > 0 and max_height else 1.0
+    start, end = None, None
+    for name in names:
+        nums = store.get(name).col('frame_num')
+        if len(nums):
+            start = int(nums[0]) if start is None else min(start, int(nums[0]))
+            end = int(nums[-1]) if end is None else max(end, int(nums[-1]))
+        source.register(name, OverlayTrack(analyzers[name], store.get(name), store.landmarks),
+                        output_path=outputs[name], scale=scale)
+    source.run(start, end)
+    for name, e in source.errors.items():
+        print(f"  Overlay rendering failed ({name}): {e}")
+    return {name: outputs[name] for name in names if name not in source.errors}
+
+
+def render_composite(store, tiles, output_path, audio_path=None, max_height=720):
+    """Render a grid presentation video (two tiles per row) in a single pass.
+
+    Args:
+        store: SessionStore holding the modules' results (and landmarks)
+        tiles: [(name, analyzer)] in row-major order
+        output_path: combined MP4 to write
+        audio_path: optional audio track muxed into the output
+        max_height: each tile is scaled down to at most this height
+
+    Returns:
+        bool: True if the video was written
+    """
+    missing = [name for name, _ in tiles if not store.has(name)]
+    if missing:
+        print(f"  No cached results for {', '.join(missing)}, combined video not rendered.")
+        return False
+
+    source = FrameSource(store.video_path)
+    h = source.meta.height
+    scale = min(float(max_height) / h, 1.0) if h > 0 and max_height else 1.0
+    tracks = [OverlayTrack(analyzer, store.get(name), store.landmarks) for name, analyzer in tiles]
+    nums = [store.get(name).col('frame_num') for name, _ in tiles]
+    nums = [n for n in nums if len(n)]
+    start = min(int(n[0]) for n in nums) if nums else None
+    end = max(int(n[-1]) for n in nums) if nums else None
+
+    source.register('composite', CompositeTrack(tracks, output_path, audio_path), scale=scale)
+    source.run(start, end)
+    if 'composite' in source.errors:
+        print(f"  Combined video rendering failed: {source.errors['composite']}")
+        return False
+    return True
@@ -0,0 +1,160 @@
+"""
+rolling_stats.py
+
+Sliding-window statistics for per-frame signals (head angles, velocities).
+RollingWindow is the streaming form: each push() updates running sums, a
+monotonic min/max queue and a sign-change counter in O(1), so std, range
+and zero-crossing counts over the last `size` samples no longer rescan the
+window every frame. The rolling_* functions are the batch form over a whole
+array: value i is the statistic of the window ending at sample i (shorter
+at the start, like a window that is still filling up).
+
+Sign changes follow the nodding rule: sample i counts when its sign
+differs from sample i-1 and it is non-zero.
+
+Class / functions:
+    RollingWindow(size)
+        push(value), values(), std(), ptp(), crossings()
+    rolling_std(x, size, history=None)
+    rolling_ptp(x, size, history=None)
+    rolling_crossings(x, size, history=None)
+"""
+
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class RollingWindow:
+    """The last `size` samples of a signal with O(1) std, range and sign-change count."""
+
+    def __init__(self, size):
+        self.size = max(2, int(size))
+        self._vals = deque()
+        self._flags = deque()      # flag i: sample i changed sign against sample i-1
+        self._crossings = 0        # flags inside the window, the first sample's excluded
+        self._maxq = deque()       # indices of decreasing values
+        self._minq = deque()       # indices of increasing values
+        self._pushed = 0
+        # Sums are kept relative to a reference value to avoid cancellation,
+        # and rebuilt from the window every `size` pushes so no error builds up
+        self._ref = 0.0
+        self._sum = 0.0
+        self._sumsq = 0.0
+
+    def __len__(self):
+        return len(self._vals)
+
+    def push(self, value):
+        value = float(value)
+        flag = bool(self._vals) and value != 0 and np.sign(self._vals[-1]) != np.sign(value)
+        if len(self._vals) == self.size:
+            old = self._vals.popleft()
+            self._flags.popleft()
+            # The new first sample's flag points outside the window now
+            self._crossings -= self._flags[0]
+            d = old - self._ref
+            self._sum -= d
+            self._sumsq -= d * d
+        if self._vals:
+            self._crossings += flag
+        self._vals.append(value)
+        self._flags.append(flag)
+
+        i = self._pushed
+        self._pushed += 1
+        while self._maxq and self._maxq[-1][1] <= value:
+            self._maxq.pop()
+        self._maxq.append((i, value))
+        while self._minq and self._minq[-1][1] >= value:
+            self._minq.pop()
+        self._minq.append((i, value))
+        first = self._pushed - len(self._vals)
+        if self._maxq[0][0] < first: self._maxq.popleft()
+        if self._minq[0][0] < first: self._minq.popleft()
+
+        if self._pushed % self.size == 1:
+            self._rebuild()
+        else:
+            d = value - self._ref
+            self._sum += d
+            self._sumsq += d * d
+
+    def _rebuild(self):
+        self._ref = self._vals[-1]
+        d = np.fromiter(self._vals, dtype=np.float64, count=len(self._vals)) - self._ref
+        self._sum, self._sumsq = float(d.sum()), float(np.dot(d, d))
+
+    def values(self):
+        return np.fromiter(self._vals, dtype=np.float64, count=len(self._vals))
+
+    def std(self):
+        """Population standard deviation (np.std) of the window."""
+        n = len(self._vals)
+        if not n:
+            return 0.0
+        mean = self._sum / n
+        return float(np.sqrt(max(0.0, self._sumsq / n - mean * mean)))
+
+    def ptp(self):
+        """max - min of the window."""
+        return self._maxq[0][1] - self._minq[0][1] if self._vals else 0.0
+
+    def crossings(self):
+        return self._crossings
+
+
+def _windows(x, size, history):
+    """x with the history prepended, padded at the front so every sample gets a full window.
+
+    Returns (windows (len(x), size), valid (len(x), size) mask of real samples).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    h = np.asarray(history if history is not None else [], dtype=np.float64)[-(size - 1):] if size > 1 else np.empty(0)
+    pad = size - 1 - len(h)
+    full = np.concatenate([np.zeros(pad), h, x])
+    valid = np.concatenate([np.zeros(pad, dtype=bool), np.ones(len(h) + len(x), dtype=bool)])
+    return sliding_window_view(full, size), sliding_window_view(valid, size)
+
+
+def rolling_std(x, size, history=None):
+    """np.std of the window ending at each sample (history: samples before x)."""
+    if not len(x):
+        return np.zeros(0)
+    win, valid = _windows(x, size, history)
+    n = valid.sum(axis=1)
+    full = n == size
+    out = np.empty(len(win))
+    out[full] = np.std(win[full], axis=1)
+    # Windows still filling up (at most size - 1 of them)
+    for i in np.flatnonzero(~full):
+        out[i] = np.std(win[i, size - n[i]:])
+    return out
+
+
+def rolling_ptp(x, size, history=None):
+    """max - min of the window ending at each sample."""
+    if not len(x):
+        return np.zeros(0)
+    win, valid = _windows(x, size, history)
+    hi = np.where(valid, win, -np.inf).max(axis=1)
+    lo = np.where(valid, win, np.inf).min(axis=1)
+    return hi - lo
+
+
+def rolling_crossings(x, size, history=None):
+    """Sign changes inside the window ending at each sample (see module doc)."""
+    x = np.asarray(x, dtype=np.float64)
+    if not len(x):
+        return np.zeros(0, dtype=np.int64)
+    h = np.asarray(history if history is not None else [], dtype=np.float64)[-(size - 1):]
+    full = np.concatenate([h, x])
+    sign = np.sign(full)
+    flags = np.zeros(len(full), dtype=np.int64)
+    flags[1:] = (sign[1:] != sign[:-1]) & (full[1:] != 0)
+    csum = np.concatenate([[0], np.cumsum(flags)])
+    end = np.arange(len(h), len(full)) + 1                   # window is [start, end)
+    start = np.maximum(end - size, 0)
+    # The first sample's own flag looks outside the window
+    return csum[end] - csum[start + 1]
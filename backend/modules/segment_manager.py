@@ -5,19 +5,23 @@ Extracts suspect answer segments from a full interview video/audio.
 Uses speaker diarization and OpenAI Whisper for transcription.
 Identifies both suspect and interviewer speakers, links questions to answers.
 
+The session audio is decoded once (SessionAudio) and sliced by sample
+index for diarization, silence splitting and transcription; segments
+refer to it by sample range, so no temporary audio files are written.
+
 Class:
     SegmentManager
-        get_suspect_segments(video_path, audio_path, suspect_label=None)
+        get_suspect_segments(audio, suspect_label=None)
+        close()
 """
 
-import os
-import sys
-import tempfile
-import subprocess
-from pathlib import Path
-from pydub import AudioSegment
+from session_audio import SessionAudio, detect_nonsilent
 from speaker_diarizer import SpeakerDiarizer
-import whisper
+from whisper_strategy import WhisperTranscriber
+from model_registry import MODELS
+
+# pydub's int16 RMS of 50, on float samples
+MIN_SUB_SEGMENT_RMS = 50 / 32768
 
 
 class SegmentManager:
@@ -25,33 +29,37 @@ class SegmentManager:
 
     def __init__(self, device="cpu"):
         self.diarizer = SpeakerDiarizer(device=device)
-        # Load whisper from local cache (same location as ForensicVoiceAnalyzer)
-        if getattr(sys, 'frozen', False):
-            base_path = Path(sys._MEIPASS)
-        else:
-            base_path = Path(__file__).resolve().parent.parent
-        models_dir = base_path / "myenv" / "local_models" / "whisper"
-        if models_dir.exists():
-            self.whisper_model = whisper.load_model("base", download_root=str(models_dir))
-        else:
-            self.whisper_model = whisper.load_model("base")
-
-    def get_suspect_segments(self, audio_path, suspect_label=None):
+        # Same shared instance as the voice analyzer's (model_registry.py)
+        self.whisper_model = MODELS.acquire('whisper', "base")
+        self.transcriber = WhisperTranscriber(self.whisper_model)
+
+    def close(self):
+        """Release the shared Whisper and diarization models."""
+        MODELS.release(self.whisper_model)
+        self.whisper_model = self.transcriber = None
+        self.diarizer.close()
+
+    def get_suspect_segments(self, audio, suspect_label=None):
         """Identify suspect speaking turns, linked to interviewer questions.
 
         Long suspect responses (>15s) are split into smaller sub-segments
         using silence-based VAD for more granular analysis.
 
+        Args:
+            audio: SessionAudio of the session, or a path to load it from.
+
         Returns:
-            list of dicts: [{'start': float, 'end': float, 'audio_file': str,
+            list of dicts: [{'start': float, 'end': float,
+                            'start_sample': int, 'end_sample': int,
                             'question': dict or None}, ...]
+            start_sample/end_sample index audio.samples at audio.sample_rate.
             Each question dict: {'start': float, 'end': float, 'text': str}
         """
-        if not os.path.exists(audio_path):
-            raise FileNotFoundError(f"Audio not found: {audio_path}")
+        if not isinstance(audio, SessionAudio):
+            audio = SessionAudio.load(audio)
 
         # Step 1: Diarize
-        segments = self.diarizer.diarize(audio_path)
+        segments = self.diarizer.diarize(audio)
 
         # Step 2: Identify suspect and interviewer speaker labels
         speaker_durations = {}
@@ -85,14 +93,13 @@ class SegmentManager:
         # Merge nearby suspect turns, then check for the preceding question
         merged = self._merge_segments(suspect_segments, gap=0.5)
 
-        full_audio = AudioSegment.from_file(audio_path)
         result = []
 
         # Pre-compute question text for all interviewer merged blocks
         question_texts = {}
         if interviewer_merged:
-            for qi, (q_start, q_end) in enumerate(interviewer_merged):
-                q_text = self._transcribe_block(full_audio, q_start, q_end, f"_question_{qi}")
+            for q_start, q_end in interviewer_merged:
+                q_text = self._transcribe_block(audio.slice(q_start, q_end), audio.sample_rate)
                 if len(q_text) >= 3:
                     question_texts[(q_start, q_end)] = q_text
 
@@ -122,25 +129,20 @@ class SegmentManager:
                 print(f"  Segment {i+1} ({start:.1f}s-{end:.1f}s): [no preceding question, using default]")
 
             # Split long segments using VAD
-            sub_segments = self._split_by_silence(full_audio, start, end, max_duration=15.0)
+            sub_segments = self._split_by_silence(audio, start, end, max_duration=15.0)
 
             for si, (sub_start, sub_end) in enumerate(sub_segments):
                 # Double-check sub-segment has energy (skip near-silence)
-                sub_duration = sub_end - sub_start
-                sub_audio_check = full_audio[sub_start * 1000:sub_end * 1000]
-                sub_rms = sub_audio_check.rms
-                if sub_rms < 50 and si > 0:
-                    print(f"  Sub-segment {si+1} ({sub_start:.1f}s-{sub_end:.1f}s) low energy ({sub_rms:.1f}), skipping.")
+                sub_rms = audio.rms(sub_start, sub_end)
+                if sub_rms < MIN_SUB_SEGMENT_RMS and si > 0:
+                    print(f"  Sub-segment {si+1} ({sub_start:.1f}s-{sub_end:.1f}s) low energy ({sub_rms:.5f}), skipping.")
                     continue
-                sub_dur = round(sub_end - sub_start, 2)
-                sub_file = os.path.join(tempfile.gettempdir(), f"_segment_{i+1}_{si+1}.wav")
-                sub_audio = full_audio[sub_start*1000:sub_end*1000]
-                sub_audio.export(sub_file, format="wav")
 
                 result.append({
                     'start': sub_start,
                     'end': sub_end,
-                    'audio_file': os.path.abspath(sub_file),
+                    'start_sample': audio.index(sub_start),
+                    'end_sample': audio.index(sub_end),
                     'question': question_info
                 })
 
@@ -150,41 +152,32 @@ class SegmentManager:
             print(f"  Linked {linked}/{len(result)} to interviewer questions.")
         return result
 
-    def _transcribe_block(self, full_audio, start_sec, end_sec, label):
-        """Transcribe a block of audio; returns text or empty string on failure."""
-        dur = end_sec - start_sec
-        if dur < 0.3:
+    def _transcribe_block(self, samples, sample_rate):
+        """Transcribe a block of session samples; returns text or empty string on failure."""
+        if len(samples) < 0.3 * sample_rate:
             return ""
-        temp = os.path.join(tempfile.gettempdir(), f"{label}.wav")
         try:
-            block = full_audio[start_sec*1000:end_sec*1000]
-            block.export(temp, format="wav")
-            res = self.whisper_model.transcribe(temp, task="transcribe")
-            text = res['text'].strip()
+            # Whisper takes 16 kHz float32 arrays directly; questions need no translation
+            text = self.transcriber.transcribe(samples, translate=False)['text']
             if len(text) < 3:
                 text = ""
             return text
         except Exception:
             return ""
-        finally:
-            try:
-                os.remove(temp)
-            except Exception:
-                pass
 
-    def _split_by_silence(self, full_audio, start_sec, end_sec, max_duration=15.0, min_duration=2.0):
+    def _split_by_silence(self, audio, start_sec, end_sec, max_duration=15.0, min_duration=2.0):
         """Split a long segment into sub-segments at silence boundaries.
 
-        Uses pydub's detect_nonsilent to find natural pause points.
+        Uses detect_nonsilent (pydub's rule on the session samples) to find
+        natural pause points.
         Returns list of (start_sec, end_sec) tuples.
         """
         duration = end_sec - start_sec
         if duration <= max_duration:
             return [(start_sec, end_sec)]
 
-        segment_ms = full_audio[start_sec * 1000:end_sec * 1000]
-        from pydub.silence import detect_nonsilent
-        nonsilent = detect_nonsilent(segment_ms, min_silence_len=400, silence_thresh=-40)
+        nonsilent = detect_nonsilent(audio.slice(start_sec, end_sec), audio.sample_rate,
+                                     min_silence_len=400, silence_thresh=-40)
 
         if not nonsilent:
             return [(start_sec, end_sec)]
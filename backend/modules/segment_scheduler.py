@@ -0,0 +1,150 @@
+"""
+segment_scheduler.py
+
+Dependency-graph scheduler for the per-segment pipeline stages.
+Stages are added as tasks with explicit dependencies; a task starts as
+soon as everything it depends on has finished and enough of the CPU
+budget is free. This lets Whisper for segment N+1, face aggregation for
+segment N and the LLM calls for segment N-1 run at the same time instead
+of strictly one segment after another.
+
+CPU-bound tasks hold `cpu` slots of the budget while they run; I/O-bound
+tasks (cpu=0, e.g. Groq requests) only count against io_workers.
+
+After run(), critical_path() walks back from the last task to finish,
+always through the dependency that finished last, and report() gives the
+achieved wall time, summed task time and that path.
+
+Class:
+    TaskGraph(cpu_budget=None, io_workers=4)
+        add(name, fn, deps=(), cpu=1) -> name
+        run() -> {name: result}
+        result(name)
+        critical_path() -> [name]
+        report() -> dict
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class _Task:
+    def __init__(self, name, fn, deps, cpu):
+        self.name = name
+        self.fn = fn
+        self.deps = list(deps)
+        self.cpu = cpu
+        self.result = None
+        self.error = None
+        self.start = None
+        self.end = None
+
+
+class TaskGraph:
+    """Runs named tasks in dependency order under a CPU slot budget."""
+
+    def __init__(self, cpu_budget=None, io_workers=4):
+        self.cpu_budget = max(1, cpu_budget or os.cpu_count() or 1)
+        self.io_workers = max(1, io_workers)
+        self.tasks = {}
+        self._t0 = None
+        self._t1 = None
+
+    def add(self, name, fn, deps=(), cpu=1):
+        """Add task `name` running fn() after all `deps`; cpu=0 marks I/O-bound work."""
+        if name in self.tasks:
+            raise ValueError(f"Duplicate task: {name}")
+        for d in deps:
+            if d not in self.tasks:
+                raise ValueError(f"Task {name} depends on unknown task {d}")
+        self.tasks[name] = _Task(name, fn, deps, cpu)
+        return name
+
+    def result(self, name):
+        return self.tasks[name].result
+
+    def run(self):
+        """Execute every task; the first task error is re-raised once running tasks finish.
+
+        Returns:
+            dict: {name: return value of the task's fn}
+        """
+        pending = list(self.tasks.values())  # insertion order is the tie-break
+        running = {}
+        cpu_used, io_used = 0, 0
+        error = None
+        self._t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.cpu_budget + self.io_workers) as pool:
+            while pending or running:
+                if error is None:
+                    for task in list(pending):
+                        if not all(self.tasks[d].end is not None for d in task.deps):
+                            continue
+                        if task.cpu:
+                            # A task larger than the whole budget runs on its own
+                            cost = min(task.cpu, self.cpu_budget)
+                            if cpu_used + cost > self.cpu_budget:
+                                continue
+                            cpu_used += cost
+                        else:
+                            if io_used >= self.io_workers:
+                                continue
+                            io_used += 1
+                        pending.remove(task)
+                        task.start = time.perf_counter()
+                        running[pool.submit(task.fn)] = task
+                elif not running:
+                    break
+                if not running:
+                    raise RuntimeError(f"Unsatisfiable task dependencies: {[t.name for t in pending]}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    task.end = time.perf_counter()
+                    if task.cpu:
+                        cpu_used -= min(task.cpu, self.cpu_budget)
+                    else:
+                        io_used -= 1
+                    try:
+                        task.result = future.result()
+                    except Exception as e:
+                        task.error = e
+                        if error is None:
+                            error = e
+        self._t1 = time.perf_counter()
+        if error is not None:
+            raise error
+        return {name: t.result for name, t in self.tasks.items()}
+
+    def critical_path(self):
+        """Task names on the chain that determined the finish time, first to last."""
+        finished = [t for t in self.tasks.values() if t.end is not None]
+        if not finished:
+            return []
+        task = max(finished, key=lambda t: t.end)
+        path = [task.name]
+        while task.deps:
+            task = max((self.tasks[d] for d in task.deps), key=lambda t: t.end)
+            path.append(task.name)
+        return path[::-1]
+
+    def report(self):
+        """Achieved schedule: wall time, summed task time and the critical path."""
+        if self._t0 is None:
+            return {}
+        finished = [t for t in self.tasks.values() if t.end is not None]
+        wall = self._t1 - self._t0
+        busy = sum(t.end - t.start for t in finished)
+        path = [self.tasks[n] for n in self.critical_path()]
+        return {
+            'cpu_budget': self.cpu_budget,
+            'wall_sec': round(wall, 3),
+            'task_sec': round(busy, 3),
+            'parallelism': round(busy / wall, 2) if wall > 0 else 0.0,
+            'critical_path_sec': round(sum(t.end - t.start for t in path), 3),
+            'critical_path': [{'task': t.name,
+                               'start_sec': round(t.start - self._t0, 3),
+                               'end_sec': round(t.end - self._t0, 3)} for t in path],
+        }
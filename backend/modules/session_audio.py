@@ -0,0 +1,115 @@
+"""
+session_audio.py
+
+Session audio buffer shared by the voice stages.
+The session WAV is decoded once (mono float32 at the analysis rate) and the
+diarizer, segment manager and voice analyzer all slice that array by
+sample index instead of each re-reading (and resampling) the file.
+
+Class / function:
+    SessionAudio(samples, sample_rate, path=None)
+        load(path, sample_rate=16000) -> SessionAudio
+        index(sec), slice(start_sec, end_sec), rms(start_sec, end_sec)
+        waveform() -> pyannote in-memory input {'waveform', 'sample_rate'}
+        duration
+    detect_nonsilent(samples, sample_rate, min_silence_len=1000, silence_thresh=-16, seek_step=1)
+"""
+
+import os
+
+import numpy as np
+import soundfile as sf
+
+ANALYSIS_RATE = 16000
+
+
+class SessionAudio:
+    """Mono float32 samples of one session at a fixed sample rate."""
+
+    def __init__(self, samples, sample_rate, path=None):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.path = path
+
+    @classmethod
+    def load(cls, path, sample_rate=ANALYSIS_RATE):
+        """Decode path to mono float32 at sample_rate (resampled only if needed)."""
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Audio not found: {path}")
+        y, orig_sr = sf.read(path, dtype='float32', always_2d=True)
+        y = y[:, 0] if y.shape[1] == 1 else y.mean(axis=1)
+        if orig_sr != sample_rate:
+            # Only resample is used from librosa (see forensic_voice_analyzer.py)
+            import librosa
+            y = librosa.resample(y, orig_sr=orig_sr, target_sr=sample_rate)
+        return cls(np.ascontiguousarray(y, dtype=np.float32), sample_rate, path=path)
+
+    def __len__(self):
+        return len(self.samples)
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sample_rate
+
+    def index(self, sec):
+        """Sample index of a time in seconds, clamped to the buffer."""
+        return min(max(int(sec * self.sample_rate), 0), len(self.samples))
+
+    def slice(self, start_sec, end_sec):
+        """View (no copy) of the samples in [start_sec, end_sec)."""
+        return self.samples[self.index(start_sec):self.index(end_sec)]
+
+    def rms(self, start_sec, end_sec):
+        seg = self.slice(start_sec, end_sec)
+        return float(np.sqrt(np.mean(np.square(seg, dtype=np.float64)))) if len(seg) else 0.0
+
+    def waveform(self):
+        """In-memory input for pyannote pipelines, sharing the sample buffer."""
+        import torch
+        return {'waveform': torch.from_numpy(self.samples).unsqueeze(0), 'sample_rate': self.sample_rate}
+
+
+def detect_nonsilent(samples, sample_rate, min_silence_len=1000, silence_thresh=-16, seek_step=1):
+    """Non-silent [start_ms, end_ms] ranges of float samples (full scale = 1.0).
+
+    Same rule as pydub.silence.detect_nonsilent: a window of min_silence_len
+    ms, moved in seek_step ms steps, is silent when its RMS is at or below
+    silence_thresh dBFS. The window RMS comes from one cumulative sum of
+    squares instead of one pass over the audio per step.
+    """
+    spm = sample_rate / 1000.0                       # samples per ms
+    seg_len = int(round(len(samples) / spm))
+    if seg_len < min_silence_len:
+        return [[0, seg_len]]
+
+    last_start = seg_len - min_silence_len
+    starts = np.arange(0, last_start + 1, seek_step)
+    if last_start % seek_step:
+        starts = np.append(starts, last_start)
+    csum = np.concatenate([[0.0], np.cumsum(np.square(samples, dtype=np.float64))])
+    lo = np.minimum((starts * spm).astype(np.int64), len(samples))
+    hi = np.minimum(((starts + min_silence_len) * spm).astype(np.int64), len(samples))
+    n = np.maximum(hi - lo, 1)
+    rms = np.sqrt(np.maximum(csum[hi] - csum[lo], 0.0) / n)
+    silent = starts[rms <= 10 ** (silence_thresh / 20.0)]
+    if not len(silent):
+        return [[0, seg_len]]
+
+    # Join silent windows into ranges: a new range starts after a gap
+    # longer than one window
+    breaks = np.flatnonzero((np.diff(silent) != seek_step) & (silent[1:] > silent[:-1] + min_silence_len))
+    range_starts = np.concatenate([[silent[0]], silent[breaks + 1]])
+    range_ends = np.concatenate([silent[breaks], [silent[-1]]]) + min_silence_len
+    silent_ranges = [[int(s), int(e)] for s, e in zip(range_starts, range_ends)]
+
+    if silent_ranges[0] == [0, seg_len]:
+        return []
+    nonsilent, prev_end = [], 0
+    for start, end in silent_ranges:
+        nonsilent.append([prev_end, start])
+        prev_end = end
+    if silent_ranges[-1][1] != seg_len:
+        nonsilent.append([prev_end, seg_len])
+    if nonsilent[0] == [0, 0]:
+        nonsilent.pop(0)
+    return nonsilent
@@ -0,0 +1,134 @@
+"""
+session_store.py
+
+Session-scoped store for the full-video analysis pass.
+The pipeline runs every face module over the whole video once; segment and
+baseline aggregation then slice the stored per-frame results instead of
+re-running the analyzers over ranges that were already covered.
+
+The store reads video_path (the analysis proxy of an upload, see
+analysis_proxy.py); source_path keeps the uploaded file it stands for.
+
+A store can be saved to a session directory and loaded back later, so the
+annotated module videos can be rendered on demand from the cached results
+(see overlay_renderer.py) without re-running any analysis.
+
+Class:
+    SessionStore
+        from_source(source, results) -> SessionStore of a finished FrameSource run
+        put(name, frame_data), has(name)
+        slice(name, start_frame, end_frame) -> FrameColumns view of that range
+        save(path), load(path, schemas)
+"""
+
+import json
+import os
+
+import numpy as np
+
+from face_landmarks import LandmarkStore
+from frame_columns import FrameColumns
+
+STORE_VERSION = 1
+
+
+class SessionStore:
+    """Per-frame results (and shared landmarks) of one pipeline session."""
+
+    def __init__(self, video_path, fps, total_frames):
+        self.video_path = video_path
+        # Uploaded file behind video_path; names the rendered videos
+        self.source_path = video_path
+        self.fps = fps
+        self.total_frames = total_frames
+        self.landmarks = None
+        self._data = {}
+
+    @classmethod
+    def from_source(cls, source, results):
+        store = cls(source.input_path, source.meta.fps, source.meta.total_frames)
+        store.landmarks = source.landmarks
+        for name, frame_data in results.items():
+            store.put(name, frame_data)
+        return store
+
+    def put(self, name, frame_data):
+        if frame_data is None:
+            return
+        self._data[name] = frame_data
+
+    def has(self, name):
+        return name in self._data
+
+    def get(self, name):
+        return self._data.get(name)
+
+    def names(self):
+        return list(self._data)
+
+    def slice(self, name, start_frame=None, end_frame=None):
+        """Frames of module `name` with start_frame <= frame_num <= end_frame."""
+        data = self._data.get(name)
+        if data is None:
+            return None
+        return data.slice_frames(start_frame, end_frame)
+
+    def save(self, path):
+        """Write results and landmarks to directory `path` (session.json + .npz files)."""
+        os.makedirs(path, exist_ok=True)
+        modules = {}
+        for name, data in self._data.items():
+            arrays, labels = data.state()
+            np.savez(os.path.join(path, f"{name}.npz"), **arrays)
+            modules[name] = {'labels': labels}
+
+        landmarks = None
+        if self.landmarks is not None and len(self.landmarks):
+            # x, y only at half precision: enough for drawing overlays
+            np.savez(os.path.join(path, "landmarks.npz"),
+                     coords=self.landmarks.coords[:, :, :2].astype(np.float16),
+                     present=self.landmarks.present)
+            landmarks = {'start_frame': self.landmarks.start_frame}
+
+        meta = {
+            'version': STORE_VERSION,
+            'video_path': self.video_path,
+            'source_path': self.source_path,
+            'fps': self.fps,
+            'total_frames': self.total_frames,
+            'modules': modules,
+            'landmarks': landmarks
+        }
+        with open(os.path.join(path, "session.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, path, schemas):
+        """Load a saved session.
+
+        Args:
+            path: session directory written by save()
+            schemas: {name: FRAME_SCHEMA}; saved modules not listed are skipped
+
+        Raises:
+            FileNotFoundError: no session at path
+            ValueError: session written by an incompatible version
+        """
+        with open(os.path.join(path, "session.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != STORE_VERSION:
+            raise ValueError(f"Unsupported session format in {path}")
+
+        store = cls(meta['video_path'], meta['fps'], meta['total_frames'])
+        store.source_path = meta.get('source_path', store.video_path)
+        for name, info in meta['modules'].items():
+            if name not in schemas:
+                continue
+            with np.load(os.path.join(path, f"{name}.npz")) as arrays:
+                store.put(name, FrameColumns.from_state(schemas[name], store.fps, dict(arrays), info['labels']))
+
+        if meta.get('landmarks'):
+            with np.load(os.path.join(path, "landmarks.npz")) as arrays:
+                store.landmarks = LandmarkStore.from_arrays(
+                    meta['landmarks']['start_frame'], arrays['coords'].astype(np.float32), arrays['present'])
+        return store
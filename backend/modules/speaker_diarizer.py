@@ -6,58 +6,45 @@ Uses pyannote.audio pretrained pipeline.
 
 Class:
     SpeakerDiarizer
-        diarize(audio_path) -> list of dicts
+        diarize(audio) -> list of dicts (audio: SessionAudio or WAV path)
+        close()
 """
 
 import os
-import json
 import torch
-from pyannote.audio import Pipeline
+from session_audio import SessionAudio
+from model_registry import MODELS
 
 
 class SpeakerDiarizer:
     """Splits an audio file into speaker‑labelled segments."""
 
     def __init__(self, device="cpu"):
-        """Initialize the diarization pipeline for 100% OFFLINE use.
+        """Use the shared diarization pipeline for 100% OFFLINE use.
+
+        The pipeline is loaded once per process from myenv/local_models
+        (bundled or next to the EXE) by the model registry.
 
         Args:
             device: 'cpu' or 'cuda'.
         """
         self.device = torch.device(device)
-        
-        # Resolve base directory (Handles PyInstaller .exe mode)
-        import sys
-        from pathlib import Path
-        if getattr(sys, 'frozen', False):
-            # Prioritize internal bundled models for portability
-            base_dir = Path(sys._MEIPASS)
-        else:
-            base_dir = Path(__file__).resolve().parent.parent
-            
-        local_config = base_dir / "myenv" / "local_models" / "diarizer" / "config.yaml"
-        
-        # Fallback to external directory if not found inside EXE
-        if not local_config.exists() and getattr(sys, 'frozen', False):
-            local_config = Path(sys.executable).parent / "myenv" / "local_models" / "diarizer" / "config.yaml"
-        
-        if not local_config.exists():
-            raise FileNotFoundError(
-                f"Local models not found at {local_config}. "
-                "Ensure models are bundled or placed in 'myenv/local_models' next to the EXE."
-            )
-            
         try:
-            print(f"Loading Pyannote Diarization from {local_config}...")
-            self.pipeline = Pipeline.from_pretrained(str(local_config))
-            self.pipeline.to(self.device)
-            print("Pyannote loaded successfully.")
+            self.pipeline = MODELS.acquire('pyannote', device)
         except Exception as e:
             print(f"Could not load offline diarization pipeline: {e}")
             raise
 
-    def diarize(self, audio_path):
-        """Run diarization on a WAV file and return segments.
+    def close(self):
+        """Release the shared pipeline."""
+        MODELS.release(self.pipeline)
+        self.pipeline = None
+
+    def diarize(self, audio):
+        """Run diarization on the session audio (or a WAV file) and return segments.
+
+        A SessionAudio is passed to pyannote in memory, so the file is not
+        decoded again.
 
         Returns:
             list of dicts: [
@@ -65,11 +52,16 @@ class SpeakerDiarizer:
                 ...
             ]
         """
-        if not os.path.exists(audio_path):
-            raise FileNotFoundError(f"Audio file not found: {audio_path}")
-
-        print(f"Running speaker diarization on {audio_path}...")
-        diarization = self.pipeline(audio_path)
+        if isinstance(audio, SessionAudio):
+            print(f"Running speaker diarization on {audio.path or 'session audio'}...")
+            with MODELS.guard(self.pipeline):
+                diarization = self.pipeline(audio.waveform())
+        else:
+            if not os.path.exists(audio):
+                raise FileNotFoundError(f"Audio file not found: {audio}")
+            print(f"Running speaker diarization on {audio}...")
+            with MODELS.guard(self.pipeline):
+                diarization = self.pipeline(audio)
         segments = []
         for turn, _, speaker in diarization.itertracks(yield_label=True):
             segments.append({
@@ -0,0 +1,110 @@
+"""
+whisper_strategy.py
+
+Transcription strategy shared by the voice stages.
+The analyzers need the original-language transcript of a clip and its
+English translation. Calling whisper's transcribe() twice (task
+"transcribe", then "translate") computes the mel spectrogram, runs the
+audio encoder and detects the language twice. For clips that fit in one
+30 s Whisper window (every VAD-split segment) the strategy here does that
+work once:
+
+    mel -> embed_audio() -> detect_language() -> decode("transcribe")
+                                              -> decode("translate"), skipped for English
+
+Both decodes reuse the encoder output and follow transcribe()'s temperature
+fallback and no-speech rules. Longer clips still go through transcribe(),
+but with the language detected once and the translation skipped for English.
+
+The model is the registry's shared instance; decoding installs KV-cache
+hooks on its modules, so calls on one model run under MODELS.guard(model).
+
+Class:
+    WhisperTranscriber(model)
+        transcribe(audio, translate=True) -> {'text', 'english', 'language'}
+"""
+
+import numpy as np
+import torch
+import whisper
+from whisper.audio import N_FRAMES, N_SAMPLES, log_mel_spectrogram, pad_or_trim
+from model_registry import MODELS
+
+# transcribe() defaults
+TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+
+class WhisperTranscriber:
+    """Transcript and English translation of 16 kHz clips from one encoder pass."""
+
+    def __init__(self, model):
+        self.model = model
+        self.fp16 = model.device.type != "cpu"
+
+    def transcribe(self, audio, translate=True):
+        """Transcribe a float32 16 kHz clip.
+
+        Returns:
+            dict: {'text': original-language transcript,
+                   'english': translation (the transcript itself for English
+                              speech; None when translate is False),
+                   'language': detected language code}
+        """
+        audio = np.asarray(audio, dtype=np.float32)
+        if not len(audio):
+            return {'text': "", 'english': "" if translate else None, 'language': None}
+        if len(audio) > N_SAMPLES:
+            return self._transcribe_long(audio, translate)
+
+        with MODELS.guard(self.model), torch.no_grad():
+            features = self._encode(audio)
+            language = self._language(features)
+            text = self._decode(features, "transcribe", language)
+            english = None
+            if translate:
+                english = text if language == "en" else self._decode(features, "translate", language)
+        return {'text': text, 'english': english, 'language': language}
+
+    def _encode(self, audio):
+        """Audio features of a clip of at most 30 s, padded like transcribe() pads its window."""
+        mel = log_mel_spectrogram(audio, self.model.dims.n_mels, padding=N_SAMPLES)
+        segment = pad_or_trim(mel[:, :mel.shape[-1] - N_FRAMES], N_FRAMES)
+        segment = segment.to(self.model.device).to(torch.float16 if self.fp16 else torch.float32)
+        return self.model.embed_audio(segment.unsqueeze(0))
+
+    def _language(self, features):
+        if not self.model.is_multilingual:
+            return "en"
+        _, probs = self.model.detect_language(features)
+        return max(probs[0], key=probs[0].get)
+
+    def _decode(self, features, task, language):
+        """One window decode with transcribe()'s temperature fallback; "" for a silent window."""
+        result = None
+        for t in TEMPERATURES:
+            options = whisper.DecodingOptions(task=task, language=language, temperature=t, fp16=self.fp16)
+            result = self.model.decode(features, options)[0]
+            needs_fallback = (result.compression_ratio > COMPRESSION_RATIO_THRESHOLD
+                              or result.avg_logprob < LOGPROB_THRESHOLD)
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+                needs_fallback = False  # silence
+            if not needs_fallback:
+                break
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob <= LOGPROB_THRESHOLD:
+            return ""
+        return result.text.strip()
+
+    def _transcribe_long(self, audio, translate):
+        """Clips over 30 s need transcribe()'s sliding window; only the language is shared."""
+        with MODELS.guard(self.model):
+            with torch.no_grad():
+                language = self._language(self._encode(audio[:N_SAMPLES]))
+            text = self.model.transcribe(audio, task="transcribe", language=language, fp16=self.fp16)['text'].strip()
+            english = None
+            if translate:
+                english = text if language == "en" else self.model.transcribe(
+                    audio, task="translate", language=language, fp16=self.fp16)['text'].strip()
+        return {'text': text, 'english': english, 'language': language}
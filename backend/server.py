@@ -67,6 +67,9 @@ async def status():
     }
 
 if __name__ == "__main__":
+    # Face worker processes (DECEPTRON_FACE_BACKEND=process) are spawned from the frozen exe
+    import multiprocessing
+    multiprocessing.freeze_support()
     import uvicorn
     print("\n" + "="*50)
     print("DECEPTRON MODULAR BACKEND IS READY")